@@ -1 +1,100 @@
 #include "chessplusplus.h"
+
+#include <cstring>
+
+// A C interface to the board, so that it can be loaded with ctypes by hichess.native.
+// Moves are encoded as from_square | to_square << 6 | promotion << 12, where promotion
+// is the piece type of python-chess (2 for a knight to 5 for a queen) or 0.
+
+namespace
+{
+
+uint16_t encode_move(const chess::Move &move)
+{
+    int promotion = move.promotion == chess::_no_piece ? 0 : move.promotion + 1;
+    return static_cast<uint16_t>(move.from_square | move.to_square << 6 | promotion << 12);
+}
+
+}
+
+extern "C"
+{
+
+CHESSPLUSPLUS_EXPORT void* chessplusplus_board_new()
+{
+    return new chess::Board();
+}
+
+CHESSPLUSPLUS_EXPORT void chessplusplus_board_free(void *board)
+{
+    delete static_cast<chess::Board*>(board);
+}
+
+// Returns 0 on success and -1 if the fen is invalid, in which case the board isn't changed.
+CHESSPLUSPLUS_EXPORT int chessplusplus_board_set_fen(void *board, const char *fen)
+{
+    try
+    {
+        static_cast<chess::Board*>(board)->set_fen(fen);
+    }
+    catch (const std::invalid_argument &)
+    {
+        return -1;
+    }
+    return 0;
+}
+
+// The bitboards are those of chessplusplus_board_bitboards.
+CHESSPLUSPLUS_EXPORT void chessplusplus_board_set_position(void *board, const uint64_t *bitboards, int turn,
+                                                           uint64_t castling_rights, int ep_square,
+                                                           int halfmove_clock, int fullmove_number)
+{
+    auto b = static_cast<chess::Board*>(board);
+
+    std::array<chess::Bitboard, 8> bbs;
+    std::copy(bitboards, bitboards + 8, bbs.begin());
+    b->set_bitboards(bbs);
+    b->turn = turn != 0;
+    b->castling_rights = castling_rights;
+    b->ep_square = ep_square;
+    b->halfmove_clock = halfmove_clock;
+    b->fullmove_number = fullmove_number;
+}
+
+// Writes the white pieces, the black pieces, the pawns, the knights, the bishops, the rooks,
+// the queens and the kings to the given array of 8 bitboards.
+CHESSPLUSPLUS_EXPORT void chessplusplus_board_bitboards(const void *board, uint64_t *bitboards)
+{
+    auto bbs = static_cast<const chess::Board*>(board)->bitboards();
+    std::copy(bbs.begin(), bbs.end(), bitboards);
+}
+
+CHESSPLUSPLUS_EXPORT int chessplusplus_board_turn(const void *board)
+{
+    return static_cast<const chess::Board*>(board)->turn;
+}
+
+CHESSPLUSPLUS_EXPORT int chessplusplus_board_is_check(const void *board)
+{
+    return static_cast<const chess::Board*>(board)->is_check();
+}
+
+// Writes at most `size` legal moves to `moves` and returns the number of legal moves.
+CHESSPLUSPLUS_EXPORT int chessplusplus_board_legal_moves(const void *board, uint16_t *moves, int size)
+{
+    std::vector<chess::Move> legal_moves;
+    legal_moves.reserve(64);
+    static_cast<const chess::Board*>(board)->generate_legal_moves(legal_moves);
+
+    int n = static_cast<int>(legal_moves.size());
+    for (int i = 0; i < n && i < size; i++)
+        moves[i] = encode_move(legal_moves[i]);
+    return n;
+}
+
+CHESSPLUSPLUS_EXPORT uint64_t chessplusplus_board_perft(const void *board, int depth)
+{
+    return static_cast<const chess::Board*>(board)->perft(depth);
+}
+
+}
@@ -8,6 +8,14 @@
 #include <sstream>
 #include <algorithm>
 #include <iterator>
+#include <initializer_list>
+#include <stdexcept>
+#include <cctype>
+#include <cstdint>
+
+#if defined(_MSC_VER)
+#  include <intrin.h>
+#endif
 
 namespace chess
 {
@@ -16,8 +24,8 @@ using Color = bool;
 constexpr Color _white = true;
 constexpr Color _black = false;
 
-std::array<char, 8> _filenames = {'a', 'b', 'c', 'd', 'e', 'f', 'g', 'h'};
-std::array<int, 8> _ranknames = {'1', '2', '3', '4', '5', '6', '7', '8'};
+constexpr std::array<char, 8> _filenames = {'a', 'b', 'c', 'd', 'e', 'f', 'g', 'h'};
+constexpr std::array<char, 8> _ranknames = {'1', '2', '3', '4', '5', '6', '7', '8'};
 
 using PieceType = int;
 
@@ -31,15 +39,17 @@ enum _piecetypes: PieceType
     _king
 };
 
+constexpr PieceType _no_piece = -1;
+
 constexpr std::array<char, 6> _piecesymbols = {'p', 'n', 'b', 'r', 'q', 'k'};
-constexpr std::array<const char*, 6> _piecenames = {"pawn", "knight", "bishop", "rook", "queen", "knight"};
+constexpr std::array<const char*, 6> _piecenames = {"pawn", "knight", "bishop", "rook", "queen", "king"};
 
-char _piecesymbol(PieceType t)
+inline char _piecesymbol(PieceType t)
 {
     return _piecesymbols[t];
 }
 
-const char* _piecename(PieceType t)
+inline const char* _piecename(PieceType t)
 {
     return _piecenames[t];
 }
@@ -61,6 +71,8 @@ enum _squares: Square
     A8, B8, C8, D8, E8, F8, G8, H8=63
 };
 
+constexpr Square _no_square = -1;
+
 constexpr std::array<const char*, 64> _square_names =
 {
     "A1", "B1", "C1", "D1", "E1", "F1", "G1", "H1",
@@ -73,160 +85,600 @@ constexpr std::array<const char*, 64> _square_names =
     "A8", "B8", "C8", "D8", "E8", "F8", "G8", "H8"
 };
 
-// TODO
-// Create basic board
+using Bitboard = uint64_t;
+
+#define BB_SQUARE(sq) (uint64_t(1) << (sq))
+
+constexpr Bitboard _bb_empty = 0;
+constexpr Bitboard _bb_full = 0xffffffffffffffff;
+constexpr Bitboard _bb_file_a = 0x0101010101010101;
+constexpr Bitboard _bb_rank_1 = 0xff;
+
+inline Bitboard _bb_file(int file)
+{
+    return _bb_file_a << file;
+}
+
+inline Bitboard _bb_rank(int rank)
+{
+    return _bb_rank_1 << (8 * rank);
+}
+
+inline Square square_at(int rank, int file)
+{
+    return rank * 8 + file;
+}
+
+inline int square_rank(Square square)
+{
+    return square >> 3;
+}
 
-#define BB_SQUARE(sq) (uint64_t(1) << sq)
+inline int square_file(Square square)
+{
+    return square & 7;
+}
+
+inline Square _lsb(Bitboard bb)
+{
+#if defined(_MSC_VER)
+    unsigned long index;
+    _BitScanForward64(&index, bb);
+    return static_cast<Square>(index);
+#else
+    return __builtin_ctzll(bb);
+#endif
+}
 
-#define BB BB_SQUARE
-constexpr std::array<uint64_t, 8> _bb_ranks =
+inline Square _pop_lsb(Bitboard &bb)
 {
-    BB(A1) & BB(A2) & BB(A3) & BB(A4) & BB(A5) & BB(A6) & BB(A7) & BB(A8),
-    BB(B1) & BB(B2) & BB(B3) & BB(B4) & BB(B5) & BB(B6) & BB(B7) & BB(B8),
-    BB(C1) & BB(C2) & BB(C3) & BB(C4) & BB(C5) & BB(C6) & BB(C7) & BB(C8),
-    BB(D1) & BB(D2) & BB(D3) & BB(D4) & BB(D5) & BB(D6) & BB(D7) & BB(D8),
-    BB(E1) & BB(E2) & BB(E3) & BB(E4) & BB(E5) & BB(E6) & BB(E7) & BB(E8),
-    BB(F1) & BB(F2) & BB(F3) & BB(F4) & BB(F5) & BB(F6) & BB(F7) & BB(F8),
-    BB(G1) & BB(G2) & BB(G3) & BB(G4) & BB(G5) & BB(G6) & BB(G7) & BB(G8),
-    BB(H1) & BB(H2) & BB(H3) & BB(H4) & BB(H5) & BB(H6) & BB(H7) & BB(H8)
+    Square square = _lsb(bb);
+    bb &= bb - 1;
+    return square;
+}
+
+inline Bitboard _step_attacks(Square square, const int (*deltas)[2], int n)
+{
+    Bitboard attacks = _bb_empty;
+    for (int i = 0; i < n; i++)
+    {
+        int rank = square_rank(square) + deltas[i][0];
+        int file = square_file(square) + deltas[i][1];
+        if (0 <= rank && rank < 8 && 0 <= file && file < 8)
+            attacks |= BB_SQUARE(square_at(rank, file));
+    }
+    return attacks;
+}
+
+inline Bitboard _sliding_attacks(Square square, Bitboard occupied, const int (*deltas)[2], int n)
+{
+    Bitboard attacks = _bb_empty;
+    for (int i = 0; i < n; i++)
+    {
+        int rank = square_rank(square) + deltas[i][0];
+        int file = square_file(square) + deltas[i][1];
+        while (0 <= rank && rank < 8 && 0 <= file && file < 8)
+        {
+            Bitboard bb = BB_SQUARE(square_at(rank, file));
+            attacks |= bb;
+            if (occupied & bb)
+                break;
+            rank += deltas[i][0];
+            file += deltas[i][1];
+        }
+    }
+    return attacks;
+}
+
+constexpr int _knight_deltas[8][2] = {{1, 2}, {2, 1}, {2, -1}, {1, -2}, {-1, -2}, {-2, -1}, {-2, 1}, {-1, 2}};
+constexpr int _king_deltas[8][2] = {{1, 0}, {1, 1}, {0, 1}, {-1, 1}, {-1, 0}, {-1, -1}, {0, -1}, {1, -1}};
+constexpr int _bishop_deltas[4][2] = {{1, 1}, {1, -1}, {-1, 1}, {-1, -1}};
+constexpr int _rook_deltas[4][2] = {{1, 0}, {-1, 0}, {0, 1}, {0, -1}};
+constexpr int _white_pawn_deltas[2][2] = {{1, -1}, {1, 1}};
+constexpr int _black_pawn_deltas[2][2] = {{-1, -1}, {-1, 1}};
+
+struct _AttackTables
+{
+    std::array<Bitboard, 64> knight {};
+    std::array<Bitboard, 64> king {};
+    std::array<std::array<Bitboard, 64>, 2> pawn {};
+
+    _AttackTables()
+    {
+        for (Square square = A1; square <= H8; square++)
+        {
+            knight[square] = _step_attacks(square, _knight_deltas, 8);
+            king[square] = _step_attacks(square, _king_deltas, 8);
+            pawn[_white][square] = _step_attacks(square, _white_pawn_deltas, 2);
+            pawn[_black][square] = _step_attacks(square, _black_pawn_deltas, 2);
+        }
+    }
 };
-#undef BB
 
-constexpr uint64_t _bb_empty = 0;
-constexpr uint64_t _bb_full = 0xffffffffffffffff;
+inline const _AttackTables& _attack_tables()
+{
+    static const _AttackTables tables;
+    return tables;
+}
 
+inline Bitboard _bishop_attacks(Square square, Bitboard occupied)
+{
+    return _sliding_attacks(square, occupied, _bishop_deltas, 4);
+}
 
-Square square_at(int rank, int file)
+inline Bitboard _rook_attacks(Square square, Bitboard occupied)
 {
-    return rank * 8 + file;
+    return _sliding_attacks(square, occupied, _rook_deltas, 4);
 }
 
+struct Move
+{
+    Square from_square;
+    Square to_square;
+    PieceType promotion;
+
+    Move(Square from_square, Square to_square, PieceType promotion = _no_piece)
+        : from_square(from_square), to_square(to_square), promotion(promotion)
+    {}
+};
+
 
 class Board
 {
-    std::array<std::array<uint64_t, 6>, 2> bb_board {};
+    std::array<std::array<Bitboard, 6>, 2> bb_board {};
     std::string board_fen = "";
 
 public:
-    Board(const std::string &fen = _starting_board_fen)
-        : board_fen(fen)
+    Color turn = _white;
+    // The squares of the rooks that can castle, as in python-chess.
+    Bitboard castling_rights = _bb_empty;
+    Square ep_square = _no_square;
+    int halfmove_clock = 0;
+    int fullmove_number = 1;
+
+    Board(const std::string &fen = _starting_fen)
     {
         if (fen.empty())
             clear();
-        else if (fen == _starting_board_fen)
-            reset_board();
         else
-            set_board_fen(fen);
+            set_fen(fen);
     }
 
     auto reset_board() -> void
     {
-        board_fen = _starting_board_fen;
-
-        bb_board[_white][_pawn] = _bb_ranks[1];
-        bb_board[_white][_knight] = BB_SQUARE(B1) & BB_SQUARE(G1);
-        bb_board[_white][_bishop] = BB_SQUARE(C1) & BB_SQUARE(F1);
-        bb_board[_white][_rook] = BB_SQUARE(A1) & BB_SQUARE(H1);
-        bb_board[_white][_queen] = BB_SQUARE(D1);
-        bb_board[_white][_king] = BB_SQUARE(E1);
+        set_board_fen(_starting_board_fen);
+    }
 
-        bb_board[_black][_pawn] = _bb_ranks[7];
-        bb_board[_black][_knight] = BB_SQUARE(B8) & BB_SQUARE(G8);
-        bb_board[_black][_bishop] = BB_SQUARE(C8) & BB_SQUARE(F8);
-        bb_board[_black][_rook] = BB_SQUARE(A8) & BB_SQUARE(H8);
-        bb_board[_black][_queen] = BB_SQUARE(D8);
-        bb_board[_black][_king] = BB_SQUARE(E8);
+    auto reset() -> void
+    {
+        set_fen(_starting_fen);
     }
 
     void clear()
     {
-        board_fen = std::string(8, '/');
+        board_fen = "8/8/8/8/8/8/8/8";
         bb_board[_white] = {0,0,0,0,0,0};
         bb_board[_black] = {0,0,0,0,0,0};
+        turn = _white;
+        castling_rights = _bb_empty;
+        ep_square = _no_square;
+        halfmove_clock = 0;
+        fullmove_number = 1;
     }
 
     void set_board_fen(const std::string &fen)
     {
-        board_fen = fen;
-
-        if (board_fen.empty())
+        if (fen.empty())
             throw std::invalid_argument("fen is empty");
 
-        if (board_fen.find(' ') != std::string::npos)
-            throw std::invalid_argument(std::string("expected position part, got multiple parts: ") + board_fen);
+        if (fen.find(' ') != std::string::npos)
+            throw std::invalid_argument(std::string("expected position part, got multiple parts: ") + fen);
 
-        std::istringstream split(board_fen);
+        std::istringstream split(fen);
         std::vector<std::string> rows;
 
         for (std::string row; std::getline(split, row, '/');)
             rows.push_back(row);
 
-        if (rows.empty())
-            throw std::invalid_argument("rows aren't separated with slashes('/') in the fen: " + board_fen);
-        else if (rows.size() != 8)
-            throw std::invalid_argument("the fen has to contain 8 rows and not" + std::to_string(rows.size()) + ": " + board_fen);
+        if (rows.size() != 8)
+            throw std::invalid_argument("the fen has to contain 8 rows and not " + std::to_string(rows.size()) + ": " + fen);
 
-        clear();
+        std::array<std::array<Bitboard, 6>, 2> tmp_bb_board {};
 
-        std::array<std::array<uint64_t, 6>, 2> tmp_bb_board {};
-
-        for (auto row_it = rows.rbegin(); row_it != rows.rend(); row_it++)
+        // the first row of the fen is the eighth rank
+        for (int rank = 0; rank < 8; rank++)
         {
-            if (row_it->empty())
-                throw std::invalid_argument("rows in fen cannot be empty: " + board_fen);
+            const std::string &row = rows[7 - rank];
+            if (row.empty())
+                throw std::invalid_argument("rows in fen cannot be empty: " + fen);
 
-            int empty_cells = 0;
-            int occupied_cells = 0;
-            for (auto symbol_it = row_it->begin(); symbol_it < row_it->end(); symbol_it++)
+            int file = 0;
+            bool previous_was_digit = false;
+            for (char symbol : row)
             {
-                bool previous_was_digit = false;
-
-                if (isdigit(*symbol_it))
+                if (std::isdigit(static_cast<unsigned char>(symbol)))
                 {
-                    empty_cells += *symbol_it - '0';
-
                     if (previous_was_digit)
-                        throw std::invalid_argument("a row in the fen shouldn't contain two digits next to each other: " + board_fen);
+                        throw std::invalid_argument("a row in the fen shouldn't contain two digits next to each other: " + fen);
+                    if (symbol < '1' || symbol > '8')
+                        throw std::invalid_argument("invalid number of empty cells in the fen: " + fen);
 
+                    file += symbol - '0';
                     previous_was_digit = true;
+                    continue;
                 }
-                else
+
+                auto found = std::find(_piecesymbols.begin(), _piecesymbols.end(),
+                                       std::tolower(static_cast<unsigned char>(symbol)));
+                if (found == _piecesymbols.end())
+                    throw std::invalid_argument("invalid character(s)('" +
+                                                std::string(1, symbol) +
+                                                "') in the fen: " + fen);
+                if (file >= 8)
+                    throw std::invalid_argument("a fen row has to occupy exactly 8 cells: " + fen);
+
+                Color color = std::isupper(static_cast<unsigned char>(symbol)) != 0;
+                PieceType piece = static_cast<PieceType>(std::distance(_piecesymbols.begin(), found));
+                tmp_bb_board[color][piece] |= BB_SQUARE(square_at(rank, file));
+
+                file++;
+                previous_was_digit = false;
+            }
+
+            if (file != 8)
+                throw std::invalid_argument("a fen row has to occupy exactly 8 cells: " + fen);
+        }
+
+        bb_board = tmp_bb_board;
+        board_fen = fen;
+    }
+
+    void set_fen(const std::string &fen)
+    {
+        std::istringstream split(fen);
+        std::vector<std::string> parts;
+        for (std::string part; split >> part;)
+            parts.push_back(part);
+
+        if (parts.empty())
+            throw std::invalid_argument("fen is empty");
+        if (parts.size() > 6)
+            throw std::invalid_argument("fen string has more parts than expected: " + fen);
+
+        Color tmp_turn = _white;
+        if (parts.size() > 1)
+        {
+            if (parts[1] == "w")
+                tmp_turn = _white;
+            else if (parts[1] == "b")
+                tmp_turn = _black;
+            else
+                throw std::invalid_argument("expected 'w' or 'b' for turn part of fen: " + fen);
+        }
+
+        Bitboard tmp_castling_rights = _bb_empty;
+        if (parts.size() > 2 && parts[2] != "-")
+        {
+            for (char symbol : parts[2])
+            {
+                switch (symbol)
                 {
-                    auto found = std::find(_piecesymbols.begin(), _piecesymbols.end(),
-                                           std::tolower(*symbol_it));
-                    if (found != _piecesymbols.end())
-                    {
-                        int rank = std::distance(row_it, rows.rbegin());
-                        int file = std::distance(symbol_it, row_it->begin());
-
-                        if (previous_was_digit)
-                            file += *(symbol_it - 1) - '0';
-
-                        Color color = std::islower(*symbol_it);
-                        PieceType piece = static_cast<PieceType>(std::distance(found, _piecesymbols.begin()));
-
-                        tmp_bb_board[color][piece] |= square_at(rank, file);
-
-                        previous_was_digit = false;
-                    }
-                    else throw std::invalid_argument("invalid character(s)('" +
-                                                     std::string(1, *symbol_it) +
-                                                     "') in the fen: " + board_fen);
+                case 'K': tmp_castling_rights |= BB_SQUARE(H1); break;
+                case 'Q': tmp_castling_rights |= BB_SQUARE(A1); break;
+                case 'k': tmp_castling_rights |= BB_SQUARE(H8); break;
+                case 'q': tmp_castling_rights |= BB_SQUARE(A8); break;
+                default:
+                    throw std::invalid_argument("invalid castling part in fen: " + fen);
                 }
             }
+        }
 
-            if (empty_cells + occupied_cells != 8)
-                throw std::invalid_argument("a fen row has to occupy exactly 8 cells: " + board_fen);
+        Square tmp_ep_square = _no_square;
+        if (parts.size() > 3 && parts[3] != "-")
+        {
+            const std::string &ep = parts[3];
+            if (ep.size() != 2 || ep[0] < 'a' || ep[0] > 'h' || (ep[1] != '3' && ep[1] != '6'))
+                throw std::invalid_argument("invalid en passant part in fen: " + fen);
+            tmp_ep_square = square_at(ep[1] - '1', ep[0] - 'a');
         }
 
-        bb_board = tmp_bb_board;
+        int tmp_halfmove_clock = 0;
+        int tmp_fullmove_number = 1;
+        try
+        {
+            if (parts.size() > 4)
+                tmp_halfmove_clock = std::stoi(parts[4]);
+            if (parts.size() > 5)
+                tmp_fullmove_number = std::max(1, std::stoi(parts[5]));
+        }
+        catch (const std::logic_error &)
+        {
+            throw std::invalid_argument("invalid move counters in fen: " + fen);
+        }
+        if (tmp_halfmove_clock < 0)
+            throw std::invalid_argument("halfmove clock cannot be negative: " + fen);
+
+        set_board_fen(parts[0]);
+        turn = tmp_turn;
+        castling_rights = tmp_castling_rights;
+        ep_square = tmp_ep_square;
+        halfmove_clock = tmp_halfmove_clock;
+        fullmove_number = tmp_fullmove_number;
+        clean_castling_rights();
     }
 
+    // The bitboards are ordered as the attributes of python-chess: the white pieces,
+    // the black pieces, the pawns, the knights, the bishops, the rooks, the queens and the kings.
+    void set_bitboards(const std::array<Bitboard, 8> &bitboards)
+    {
+        for (PieceType piece = _pawn; piece <= _king; piece++)
+        {
+            bb_board[_white][piece] = bitboards[2 + piece] & bitboards[0];
+            bb_board[_black][piece] = bitboards[2 + piece] & bitboards[1];
+        }
+        board_fen.clear();
+    }
 
-};
+    auto bitboards() const -> std::array<Bitboard, 8>
+    {
+        std::array<Bitboard, 8> result {occupied_co(_white), occupied_co(_black)};
+        for (PieceType piece = _pawn; piece <= _king; piece++)
+            result[2 + piece] = bb_board[_white][piece] | bb_board[_black][piece];
+        return result;
+    }
+
+    auto pieces(Color color, PieceType piece) const -> Bitboard
+    {
+        return bb_board[color][piece];
+    }
+
+    auto occupied_co(Color color) const -> Bitboard
+    {
+        const auto &bb = bb_board[color];
+        return bb[_pawn] | bb[_knight] | bb[_bishop] | bb[_rook] | bb[_queen] | bb[_king];
+    }
+
+    auto occupied() const -> Bitboard
+    {
+        return occupied_co(_white) | occupied_co(_black);
+    }
+
+    auto piece_type_at(Square square) const -> PieceType
+    {
+        Bitboard bb = BB_SQUARE(square);
+        for (PieceType piece = _pawn; piece <= _king; piece++)
+            if ((bb_board[_white][piece] | bb_board[_black][piece]) & bb)
+                return piece;
+        return _no_piece;
+    }
+
+    auto king(Color color) const -> Square
+    {
+        Bitboard bb = bb_board[color][_king];
+        return bb ? _lsb(bb) : _no_square;
+    }
+
+    auto attackers_mask(Color color, Square square, Bitboard occupied) const -> Bitboard
+    {
+        const _AttackTables &tables = _attack_tables();
+        const auto &bb = bb_board[color];
+
+        Bitboard queens_and_rooks = bb[_queen] | bb[_rook];
+        Bitboard queens_and_bishops = bb[_queen] | bb[_bishop];
+
+        return (tables.knight[square] & bb[_knight])
+                | (tables.king[square] & bb[_king])
+                | (tables.pawn[!color][square] & bb[_pawn])
+                | (_rook_attacks(square, occupied) & queens_and_rooks)
+                | (_bishop_attacks(square, occupied) & queens_and_bishops);
+    }
+
+    auto is_attacked_by(Color color, Square square) const -> bool
+    {
+        return attackers_mask(color, square, occupied()) != _bb_empty;
+    }
+
+    auto is_check() const -> bool
+    {
+        Square king_square = king(turn);
+        return king_square != _no_square && is_attacked_by(!turn, king_square);
+    }
+
+    // Makes the given pseudo-legal move.
+    void push(const Move &move)
+    {
+        Bitboard from_bb = BB_SQUARE(move.from_square);
+        Bitboard to_bb = BB_SQUARE(move.to_square);
+
+        PieceType piece = piece_type_at(move.from_square);
+        PieceType captured = piece_type_at(move.to_square);
+
+        Square previous_ep_square = ep_square;
+        ep_square = _no_square;
+        halfmove_clock++;
+        if (turn == _black)
+            fullmove_number++;
+
+        bb_board[turn][piece] &= ~from_bb;
+        if (captured != _no_piece)
+        {
+            bb_board[!turn][captured] &= ~to_bb;
+            halfmove_clock = 0;
+        }
+
+        if (piece == _pawn)
+        {
+            halfmove_clock = 0;
+
+            int diff = move.to_square - move.from_square;
+            if (diff == 16 || diff == -16)
+                ep_square = move.from_square + diff / 2;
+            else if (move.to_square == previous_ep_square && captured == _no_piece && diff % 8 != 0)
+                bb_board[!turn][_pawn] &= ~BB_SQUARE(move.to_square + (turn == _white ? -8 : 8));
+        }
+        else if (piece == _king)
+        {
+            castling_rights &= ~_bb_rank(turn == _white ? 0 : 7);
+
+            int diff = move.to_square - move.from_square;
+            if (diff == 2 || diff == -2)
+            {
+                int rank = square_rank(move.from_square);
+                Square rook_from = square_at(rank, diff > 0 ? 7 : 0);
+                Square rook_to = square_at(rank, diff > 0 ? 5 : 3);
+                bb_board[turn][_rook] &= ~BB_SQUARE(rook_from);
+                bb_board[turn][_rook] |= BB_SQUARE(rook_to);
+            }
+        }
+
+        castling_rights &= ~from_bb & ~to_bb;
+        bb_board[turn][move.promotion != _no_piece ? move.promotion : piece] |= to_bb;
+        board_fen.clear();
+        turn = !turn;
+    }
+
+    void generate_pseudo_legal_moves(std::vector<Move> &moves) const
+    {
+        const _AttackTables &tables = _attack_tables();
+        const auto &bb = bb_board[turn];
+        Bitboard us = occupied_co(turn);
+        Bitboard them = occupied_co(!turn);
+        Bitboard all = us | them;
+
+        for (PieceType piece = _knight; piece <= _king; piece++)
+        {
+            for (Bitboard from = bb[piece]; from;)
+            {
+                Square from_square = _pop_lsb(from);
+                Bitboard targets;
+                switch (piece)
+                {
+                case _knight: targets = tables.knight[from_square]; break;
+                case _bishop: targets = _bishop_attacks(from_square, all); break;
+                case _rook: targets = _rook_attacks(from_square, all); break;
+                case _queen: targets = _bishop_attacks(from_square, all) | _rook_attacks(from_square, all); break;
+                default: targets = tables.king[from_square]; break;
+                }
+
+                for (targets &= ~us; targets;)
+                    moves.push_back({from_square, _pop_lsb(targets)});
+            }
+        }
+
+        generate_castling_moves(moves, all);
+
+        int forward = turn == _white ? 8 : -8;
+        Bitboard last_rank = _bb_rank(turn == _white ? 7 : 0);
+        Bitboard double_push_rank = _bb_rank(turn == _white ? 1 : 6);
+
+        Bitboard ep_bb = _bb_empty;
+        if (ep_square != _no_square && !(all & BB_SQUARE(ep_square))
+                && (bb_board[!turn][_pawn] & BB_SQUARE(ep_square - forward)))
+            ep_bb = BB_SQUARE(ep_square);
+
+        for (Bitboard from = bb[_pawn]; from;)
+        {
+            Square from_square = _pop_lsb(from);
+
+            Bitboard targets = tables.pawn[turn][from_square] & (them | ep_bb);
+            Square push_square = from_square + forward;
+            if (!(all & BB_SQUARE(push_square)))
+            {
+                targets |= BB_SQUARE(push_square);
+                if ((double_push_rank & BB_SQUARE(from_square)) && !(all & BB_SQUARE(push_square + forward)))
+                    targets |= BB_SQUARE(push_square + forward);
+            }
+
+            while (targets)
+            {
+                Square to_square = _pop_lsb(targets);
+                if (last_rank & BB_SQUARE(to_square))
+                {
+                    for (PieceType promotion : {_queen, _rook, _bishop, _knight})
+                        moves.push_back({from_square, to_square, promotion});
+                }
+                else moves.push_back({from_square, to_square});
+            }
+        }
+    }
+
+    void generate_legal_moves(std::vector<Move> &moves) const
+    {
+        std::vector<Move> pseudo_legal_moves;
+        pseudo_legal_moves.reserve(64);
+        generate_pseudo_legal_moves(pseudo_legal_moves);
+
+        for (const Move &move : pseudo_legal_moves)
+        {
+            Board board = *this;
+            board.push(move);
+            Square king_square = board.king(turn);
+            if (king_square == _no_square || !board.is_attacked_by(!turn, king_square))
+                moves.push_back(move);
+        }
+    }
+
+    auto legal_moves() const -> std::vector<Move>
+    {
+        std::vector<Move> moves;
+        generate_legal_moves(moves);
+        return moves;
+    }
+
+    auto perft(int depth) const -> uint64_t
+    {
+        if (depth < 1)
+            return 1;
 
-// TODO
-// create move system
+        std::vector<Move> moves;
+        generate_legal_moves(moves);
+        if (depth == 1)
+            return moves.size();
+
+        uint64_t nodes = 0;
+        for (const Move &move : moves)
+        {
+            Board board = *this;
+            board.push(move);
+            nodes += board.perft(depth - 1);
+        }
+        return nodes;
+    }
+
+private:
+    void clean_castling_rights()
+    {
+        // only the rights of rooks and kings on their initial squares are kept
+        Bitboard rights = _bb_empty;
+        if (bb_board[_white][_king] & BB_SQUARE(E1))
+            rights |= castling_rights & bb_board[_white][_rook] & (BB_SQUARE(A1) | BB_SQUARE(H1));
+        if (bb_board[_black][_king] & BB_SQUARE(E8))
+            rights |= castling_rights & bb_board[_black][_rook] & (BB_SQUARE(A8) | BB_SQUARE(H8));
+        castling_rights = rights;
+    }
+
+    void generate_castling_moves(std::vector<Move> &moves, Bitboard all) const
+    {
+        int rank = turn == _white ? 0 : 7;
+        Square king_square = square_at(rank, 4);
+        if (!(bb_board[turn][_king] & BB_SQUARE(king_square)))
+            return;
+
+        Bitboard rooks = castling_rights & bb_board[turn][_rook] & _bb_rank(rank);
+        if (!rooks || is_attacked_by(!turn, king_square))
+            return;
+
+        if ((rooks & BB_SQUARE(square_at(rank, 7)))
+                && !(all & (BB_SQUARE(square_at(rank, 5)) | BB_SQUARE(square_at(rank, 6))))
+                && !is_attacked_by(!turn, square_at(rank, 5)))
+            moves.push_back({king_square, square_at(rank, 6)});
+
+        if ((rooks & BB_SQUARE(square_at(rank, 0)))
+                && !(all & (BB_SQUARE(square_at(rank, 1)) | BB_SQUARE(square_at(rank, 2)) | BB_SQUARE(square_at(rank, 3))))
+                && !is_attacked_by(!turn, square_at(rank, 3)))
+            moves.push_back({king_square, square_at(rank, 2)});
+    }
+};
 }
 
 #endif // CHESSPLUSPLUS_H
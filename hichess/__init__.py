@@ -20,7 +20,62 @@
 Cross-platform Python chess GUI library based on PySide2 and python_chess.
 """
 
-from hichess.hichess import *
+import importlib
+
+
+# The names of the package are imported from their modules on first access (PEP 562),
+# so that e.g. the engine support or the board model can be used without loading Qt widgets.
+_MODULE_OF_NAME = {
+    "AccessibleSides": "hichess.boardmodel",
+    "NO_SIDE": "hichess.boardmodel",
+    "ONLY_WHITE_SIDE": "hichess.boardmodel",
+    "ONLY_BLACK_SIDE": "hichess.boardmodel",
+    "BOTH_SIDES": "hichess.boardmodel",
+    "BoardModel": "hichess.boardmodel",
+    "Callback": "hichess.callback",
+    "IllegalMove": "hichess.boardmodel",
+    "MoveRecord": "hichess.boardmodel",
+    "PositionStatus": "hichess.boardmodel",
+    "moveLogger": "hichess.boardmodel",
+    "readGames": "hichess.boardmodel",
+    "EngineCache": "hichess.engine",
+    "EnginePool": "hichess.engine",
+    "EngineWrapper": "hichess.engine",
+    "Instrumentation": "hichess.instrumentation",
+    "OperationStats": "hichess.instrumentation",
+    "hotPaths": "hichess.instrumentation",
+    "BoardWidget": "hichess.hichess",
+    "CellWidget": "hichess.hichess",
+    "MultiBoardView": "hichess.hichess",
+    "NotAKingError": "hichess.hichess",
+    "PiecePixmapCache": "hichess.hichess",
+    "RenderMode": "hichess.hichess",
+    "STYLESHEET_RENDERING": "hichess.hichess",
+    "PAINTER_RENDERING": "hichess.hichess",
+    "cellIndexOfSquare": "hichess.hichess",
+    "piecePixmapCache": "hichess.hichess",
+}
+
+_SUBMODULES = {"boardmodel", "callback", "engine", "hichess", "instrumentation", "native"}
+
+__all__ = list(_MODULE_OF_NAME)
+
+
+def __getattr__(name):
+    if name in _SUBMODULES:
+        return importlib.import_module(f"{__name__}.{name}")
+
+    # Other names, in particular the dunders probed by introspection tools, never import a module
+    if name not in _MODULE_OF_NAME:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+    value = getattr(importlib.import_module(_MODULE_OF_NAME[name]), name)
+    globals()[name] = value
+    return value
+
+
+def __dir__():
+    return sorted(set(globals()) | set(__all__) | _SUBMODULES)
 
 
 __author__ = "Haik Sargsian"
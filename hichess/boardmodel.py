@@ -0,0 +1,767 @@
+# -*- coding: utf-8 -*-
+#
+# This file is part of the hichesslib project.
+# Copyright (C) 2019-2020 Haik Sargsian <haiksargsian6@gmail.com>
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>.
+
+""" The game logic of `BoardWidget` without any dependency on Qt.
+`BoardModel` can be used on its own, e.g. on a server, without a `QApplication`.
+"""
+
+import io
+import logging
+import os
+import time
+from collections import deque, Counter, OrderedDict
+from enum import Enum
+from typing import Optional, Mapping, Callable, Any, Counter as CounterType, Deque, List, Tuple, Hashable, NamedTuple, \
+    Iterator, TextIO, Union
+
+import chess
+import chess.polyglot
+
+from hichess import native
+from hichess.callback import Callback
+from hichess.instrumentation import hotPaths
+
+
+moveLogger = logging.getLogger("hichess.moves")
+""" The logger to which a `MoveRecord` is logged at DEBUG level for every move made on a `BoardModel`.
+The record is attached to the log record as the attribute `moveRecord`.
+"""
+
+
+# pop and unpop restore the positions saved by python-chess on the stack of the board, which is
+# not part of its public API. The versions without it are supported through the public API.
+_BOARD_STATES = hasattr(chess, "_BoardState") and hasattr(chess.Board(), "_stack")
+
+if hasattr(chess.Board, "_transposition_key"):
+    _transpositionKey = chess.Board._transposition_key
+else:
+    _transpositionKey = chess.polyglot.zobrist_hash
+
+# the number of positions for which BoardModel remembers if NativeBoard supports them
+_NATIVE_SUPPORT_CACHE_SIZE = 256
+
+
+class IllegalMove(Exception):
+    pass
+
+
+class AccessibleSides(Enum):
+    NONE = 0
+    ONLY_WHITE = 1
+    ONLY_BLACK = 2
+    BOTH = 3
+
+
+NO_SIDE = AccessibleSides.NONE
+ONLY_WHITE_SIDE = AccessibleSides.ONLY_WHITE
+ONLY_BLACK_SIDE = AccessibleSides.ONLY_BLACK
+BOTH_SIDES = AccessibleSides.BOTH
+
+
+class MoveRecord(NamedTuple):
+    """ A compact record of a move made on a `BoardModel`. """
+
+    time: float
+    """ The time of the move as returned by `time.time`. """
+    ply: int
+    """ The number of half-moves on the board after the move. """
+    move: chess.Move
+    san: str
+    pushed: bool
+    """ Whether the move was made with `BoardModel.push`. """
+
+
+class PositionStatus(NamedTuple):
+    """ The status of the position on the board of a `BoardModel`, see `BoardModel.status`. """
+
+    legalMoves: Tuple[chess.Move, ...]
+    check: bool
+    insufficientMaterial: bool
+    repetitions: int
+    """ The number of times the position has occurred in the game, including the current one. """
+    halfmoveClock: int
+
+    @property
+    def checkmate(self) -> bool:
+        return self.check and not self.legalMoves
+
+    @property
+    def stalemate(self) -> bool:
+        return not self.check and not self.legalMoves
+
+    @property
+    def threefoldRepetition(self) -> bool:
+        return self.repetitions >= 3
+
+    @property
+    def fivefoldRepetition(self) -> bool:
+        return self.repetitions >= 5
+
+    @property
+    def fiftyMoves(self) -> bool:
+        return self.halfmoveClock >= 100
+
+    @property
+    def seventyFiveMoves(self) -> bool:
+        return self.halfmoveClock >= 150 and bool(self.legalMoves)
+
+
+def readGames(pgn: Union[os.PathLike, str, TextIO]) -> Iterator["chess.pgn.Game"]:
+    """ Reads the games of a PGN file one by one, so that files with many games are
+    processed lazily instead of being loaded as a whole.
+
+    Parameters
+    ----------
+    pgn : Union[os.PathLike, str, TextIO]
+        The path of the PGN file, e.g. a `pathlib.Path`, a PGN string or a text stream to read
+        the games from. As in `BoardModel.loadGame`, a str is PGN and not a path.
+        A file opened by path is closed once all its games have been read.
+
+    Examples
+    --------
+    >>> for game in readGames(pathlib.Path("games.pgn")):
+    ...     boardWidget.loadGame(game)
+    """
+
+    if isinstance(pgn, os.PathLike):
+        with open(pgn) as f:
+            yield from readGames(f)
+        return
+    if isinstance(pgn, str):
+        pgn = io.StringIO(pgn)
+
+    # chess.pgn imports chess.engine and asyncio, so it is only loaded when games are read
+    import chess.pgn
+    while True:
+        game = chess.pgn.read_game(pgn)
+        if game is None:
+            return
+        yield game
+
+
+class BoardModel:
+    """ Holds the state of a chess game and implements the rules by which `BoardWidget`
+    lets the user interact with it: making and validating moves, navigating through the
+    moves of the game, the accessible sides and the detection of the end of the game.
+
+    Attributes
+    ----------
+    board : `chess.Board`
+        Represents the actual board. Moves and their validation are
+        conducted through this object.
+
+    popStack : Deque[`chess.Move`]
+        The moves that are popped from the `board.move_stack` through the functions
+        `goToMove`, `pop` are stored in this deque.
+        The positions reached by the popped moves are remembered as well, so that
+        `unpop` and `goToMove` restore them directly instead of replaying the moves.
+
+    blockBoardOnPop : bool
+        If this attribute is True, no piece can be moved unless `popStack` is empty.
+
+    accessibleSides : `AccessibleSides`
+        Indicates pieces of which color can be moved.
+
+    nativeMoveGeneration : bool
+        If this attribute is True and the chessplusplus library is available (see `hichess.native`),
+        the legal moves of standard chess positions are generated by the library instead of
+        python-chess. The moves are the same, but they may be generated in a different order.
+
+    moveTrace : Optional[Deque[`MoveRecord`]]
+        If this attribute is not None, a `MoveRecord` is appended to it for every move made
+        with `makeMove` or `push`, e.g. `model.moveTrace = deque(maxlen=1000)`.
+
+    moveMade : `Callback`
+        Called with the san of the move whenever a move is made with `makeMove` or `push`.
+
+    movePushed : `Callback`
+        Called with the san of the move whenever a move is made with `push`.
+
+    checkmate : `Callback`
+        Called when it is checkmate on the board, with the color of the winning side.
+
+    draw : `Callback`
+        Called when it is a draw on the board.
+
+    stalemate : `Callback`
+        Called when it is stalemate on the board.
+
+    threefoldRepetition : `Callback`
+        Called when the position on the board has occurred at least three times, so a draw can be claimed.
+        It isn't called again while a draw can be claimed by repetition after each following move.
+
+    fivefoldRepetition : `Callback`
+        Called when the position on the board has occurred five times. The game is drawn, so `draw`
+        is called as well.
+
+    fiftyMoves : `Callback`
+        Called when no capture or pawn move has been made in the last fifty moves, so a draw can be claimed.
+        It is called once, on the hundredth half-move without a capture or a pawn move.
+
+    seventyFiveMoves : `Callback`
+        Called when no capture or pawn move has been made in the last seventy-five moves.
+        The game is drawn, so `draw` is called as well.
+
+    gameOver : `Callback`
+        Called when the game is over.
+    """
+
+    def __init__(self, fen: Optional[str] = chess.STARTING_FEN, sides: AccessibleSides = NO_SIDE):
+        self.board = chess.Board(fen)
+        self.popStack: Deque[chess.Move] = deque()
+        # For each move in popStack, the position after it as saved by pop, together with the
+        # number of moves and the key of the position it has to be unpopped from (see _unpopMoves).
+        self._popStates: Deque[Optional[Tuple[Optional[Tuple[int, Hashable]], chess._BoardState]]] = deque()
+
+        self.blockBoardOnPop = False
+        self.accessibleSides = sides
+        self.moveTrace: Optional[Deque[MoveRecord]] = None
+        self.nativeMoveGeneration = False
+        self._nativeBoard: Optional[native.NativeBoard] = None
+
+        self._legalMoves: Tuple[chess.Move, ...] = ()
+        self._check = False
+        self._legalTargets: List[Tuple[chess.Square, ...]] = []
+        self._legalMovesKey: Optional[Hashable] = None
+        # whether NativeBoard supports the recent positions, by the same keys as _legalMovesKey,
+        # so the validity of a position is checked only once when it is reached again
+        self._nativeSupport: "OrderedDict[Hashable, bool]" = OrderedDict()
+
+        # The keys of the positions of the game, from the root of the move stack to the
+        # positions after the moves in popStack, and how many times each of the positions up
+        # to the current one (at index _ply) has occurred.
+        self._positionKeys: List[Hashable] = []
+        self._positionCounts: CounterType[Hashable] = Counter()
+        self._ply = 0
+        self._pushing = False
+
+        self.moveMade = Callback()
+        self.movePushed = Callback()
+        self.checkmate = Callback()
+        self.draw = Callback()
+        self.stalemate = Callback()
+        self.threefoldRepetition = Callback()
+        self.fivefoldRepetition = Callback()
+        self.fiftyMoves = Callback()
+        self.seventyFiveMoves = Callback()
+        self.gameOver = Callback()
+
+    def setFen(self, fen: Optional[str]) -> None:
+        """ Replaces `board` with a new board with the given fen. """
+
+        self.board = chess.Board(fen)
+        self._popStates.clear()
+        self._positionKeys.clear()
+
+    def setPieceMap(self, pieces: Mapping[int, chess.Piece]) -> None:
+        """ Sets the piece map of `board`. """
+        self.board.set_piece_map(pieces)
+        self._popStates.clear()
+
+    def clear(self) -> None:
+        """ Clears `board` and `popStack`. """
+
+        self.board.clear()
+        self.popStack.clear()
+        self._popStates.clear()
+        self._positionKeys.clear()
+
+    def reset(self) -> None:
+        """ Resets `board` to the standard position and clears `popStack`. """
+
+        self.board.reset()
+        self.popStack.clear()
+        self._popStates.clear()
+        self._positionKeys.clear()
+
+    def loadGame(self, game: Union["chess.pgn.Game", os.PathLike, str, TextIO],
+                 ply: Optional[int] = None) -> "chess.pgn.Game":
+        """ Replaces `board` with the starting position of the given game and pushes its
+        mainline moves up to `ply`. The rest of the mainline is stored in `popStack`, so it
+        can be navigated with `unpop` and `goToMove`.
+
+        The moves are pushed onto `board` directly, without san generation and without
+        calling any of the callbacks.
+
+        Parameters
+        ----------
+        game : Union[`chess.pgn.Game`, os.PathLike, str, TextIO]
+            The game, the path of a PGN file, e.g. a `pathlib.Path`, a PGN string or a text stream.
+            The first game of the file or the next game of the stream is loaded. As in `readGames`,
+            a str is PGN and not a path.
+
+        ply : Optional[int]
+            The number of moves to play, by default the whole mainline.
+
+        Raises
+        ------
+        ValueError
+            If there is no game in the PGN.
+
+        IndexError
+            If `ply` is negative or greater than the number of mainline moves.
+
+        Returns
+        -------
+        chess.pgn.Game
+            The loaded game.
+        """
+
+        import chess.pgn
+        if isinstance(game, os.PathLike):
+            with open(game) as f:
+                return self.loadGame(f, ply)
+        if isinstance(game, str):
+            game = io.StringIO(game)
+        if not isinstance(game, chess.pgn.Game):
+            game = chess.pgn.read_game(game)
+            if game is None:
+                raise ValueError("no game in the PGN")
+
+        moves = list(game.mainline_moves())
+        if ply is None:
+            ply = len(moves)
+        if not 0 <= ply <= len(moves):
+            raise IndexError(f"cannot go to ply {ply} of a game of {len(moves)} moves")
+
+        board = game.board()
+        for move in moves:
+            board.push(move)
+
+        self.board = board
+        self.popStack.clear()
+        self._popStates.clear()
+        self._positionKeys.clear()
+        if ply < len(moves):
+            # pop remembers the positions, unpop restores them without replaying the moves
+            self.pop(len(moves) - ply)
+        return game
+
+    def setPieceAt(self, square: chess.Square, piece: Optional[chess.Piece]) -> None:
+        """ Sets the given piece at the given square of the board. """
+        self.board.set_piece_at(square, piece)
+
+    def removePieceAt(self, square: chess.Square) -> chess.Piece:
+        """ Removes the piece from the given square of the board.
+
+        Raises
+        ------
+        ValueError
+            If there is no piece on the given square.
+
+        Returns
+        -------
+        chess.Piece
+            The removed piece.
+        """
+
+        piece = self.board.remove_piece_at(square)
+        if piece is None:
+            raise ValueError(f"There is no piece at {square}")
+        return piece
+
+    def isAccessible(self, square: chess.Square) -> bool:
+        """ Indicates if the piece on the given square belongs to one of the `accessibleSides`. """
+
+        if self.accessibleSides == NO_SIDE:
+            return False
+        if self.accessibleSides == BOTH_SIDES:
+            return True
+
+        piece = self.board.piece_at(square)
+        if piece is None:
+            return False
+        if piece.color == chess.WHITE:
+            return self.accessibleSides == ONLY_WHITE_SIDE
+        return self.accessibleSides == ONLY_BLACK_SIDE
+
+    def canMoveFrom(self, square: chess.Square) -> bool:
+        """ Indicates if the piece on the given square can be moved, i.e. it is the turn of its
+        side, the side is accessible and the board isn't blocked by `blockBoardOnPop`.
+        """
+
+        piece = self.board.piece_at(square)
+        if piece is None or piece.color != self.board.turn or not self.isAccessible(square):
+            return False
+        return not (self.blockBoardOnPop and self.popStack)
+
+    def legalTargets(self, square: chess.Square) -> Tuple[chess.Square, ...]:
+        """ Returns the squares that the piece on the given square can be legally moved to,
+        in the order in which `board.legal_moves` generates them. Promotions to different
+        pieces are collapsed into a single target square.
+
+        The legal moves are generated once per position and indexed by their source squares,
+        so this method is a constant time lookup until the position on `board` changes.
+        """
+
+        self._generateLegalMoves()
+        return self._legalTargets[square]
+
+    def status(self) -> PositionStatus:
+        """ Returns the status of the position on the board.
+
+        The legal moves are generated once per position and shared with `legalTargets`,
+        checkmate and stalemate are derived from them. The number of repetitions of the
+        position is looked up in a table of the positions of the game, which is updated
+        as moves are made, popped and unpopped.
+        """
+
+        self._generateLegalMoves()
+        return PositionStatus(self._legalMoves, self._check, self.board.is_insufficient_material(),
+                              self.repetitions(), self.board.halfmove_clock)
+
+    def isCheck(self) -> bool:
+        """ Indicates if the side to move is in check. It is determined together with the legal moves. """
+
+        self._generateLegalMoves()
+        return self._check
+
+    def isPushing(self) -> bool:
+        """ Indicates if `moveMade` and `movePushed` are being called for a move made with `push`. """
+        return self._pushing
+
+    def repetitions(self) -> int:
+        """ Returns the number of times the position on the board has occurred in the game,
+        including the current one.
+        """
+
+        key = _transpositionKey(self.board)
+        if not self._isTracked(key):
+            self._trackPositions()
+        return self._positionCounts[key]
+
+    def isPseudoLegalPromotion(self, move: chess.Move) -> bool:
+        """ This method indicates if the given move can be a promotion. So would be if the piece
+        being moved were a pawn, and if it were being moved to the corresponding end of the board.
+
+        Warnings
+        --------
+        The result of this method is pseudo-true, as it doesn't do any move validation. It is the
+        caller's responsibility to validate the move.
+        """
+
+        piece = self.board.piece_at(move.from_square)
+
+        if piece is not None and piece.piece_type == chess.PAWN:
+            if piece.color == chess.WHITE:
+                return chess.A8 <= move.to_square <= chess.H8
+            elif piece.color == chess.BLACK:
+                return chess.A1 <= move.to_square <= chess.H1
+        return False
+
+    def makeMove(self, move: chess.Move) -> str:
+        """ Makes a move without move validation.
+        The move, though, should be pseudo-legal. Otherwise `chess.Board.push`
+        will raise an exception. Calls `moveMade` with the san of the move.
+
+        Returns
+        -------
+        str
+            The move in form of san.
+        """
+
+        san = self.board.san(move)
+        self.board.push(move)
+        self._traceMove(move, san, False)
+        self._popStates.clear()
+        self._trackMove()
+
+        self.moveMade.emit(san)
+        self._updateStatus()
+        return san
+
+    def push(self, move: chess.Move) -> str:
+        """ Pushes the given move and clears `popStack`.
+        Calls `moveMade` and `movePushed` with the san of the move. If it is
+        a checkmate, a draw or a stalemate the corresponding callback is called
+        together with `gameOver`.
+
+        Raises
+        ------
+        IllegalMove
+            If the move is illegal or null.
+
+        Returns
+        -------
+        str
+            The move in form of san.
+        """
+
+        if not self.board.is_legal(move) or move.null():
+            raise IllegalMove(f"illegal move {move} by ")
+
+        san = self.board.san(move)
+        self.board.push(move)
+        self._traceMove(move, san, True)
+        self.popStack.clear()
+        self._popStates.clear()
+        self._trackMove()
+
+        self._pushing = True
+        try:
+            self.moveMade.emit(san)
+            self.movePushed.emit(san)
+        finally:
+            self._pushing = False
+        self._updateStatus()
+        return san
+
+    def pop(self, n: int = 1) -> chess.Move:
+        """ Pops the move `n` times and stores the popped moves in `popStack`.
+
+        Raises
+        ------
+        IndexError
+            If the move stack has less than `n` moves.
+
+        Returns
+        -------
+        chess.Move
+            The last popped move.
+        """
+
+        moveStack = self.board.move_stack
+        if not 0 < n <= len(moveStack):
+            raise IndexError(f"cannot pop {n} moves from a move stack of {len(moveStack)} moves")
+
+        ply = len(moveStack) - n
+        moves = moveStack[ply:]
+        if _BOARD_STATES:
+            # The positions after the popped moves are the ones restored by unpop. The first of
+            # them is the current position, the others are already on the stack of the board.
+            stack = self.board._stack
+            states = stack[ply + 1:]
+            states.append(chess._BoardState(self.board))
+
+            stack[ply].restore(self.board)
+            del moveStack[ply:]
+            del stack[ply:]
+
+            # only the position the moves are unpopped from first is known yet
+            keys = [None] * n
+            keys[0] = (ply, _transpositionKey(self.board))
+            states = list(zip(keys, states))
+        else:
+            for _ in range(n):
+                self.board.pop()
+            # unpop pushes the moves again
+            states = [None] * n
+
+        self._alignPopStates()
+        if self._ply == ply + n and len(self._positionKeys) == ply + n + 1 + len(self.popStack):
+            self._positionCounts.subtract(self._positionKeys[ply + 1:ply + n + 1])
+            self._ply = ply
+        else:
+            self._positionKeys.clear()
+        self.popStack.extend(reversed(moves))
+        self._popStates.extend(reversed(states))
+        return moves[0]
+
+    def unpop(self, n: int = 1) -> chess.Move:
+        """ Unpops moves `n` times from `popStack`.
+
+        Raises
+        ------
+        IndexError
+            If `popStack` has less than `n` moves.
+
+        Returns
+        -------
+        chess.Move
+            The last unpopped move.
+        """
+
+        if not 0 < n <= len(self.popStack):
+            raise IndexError(f"cannot unpop {n} moves from a pop stack of {len(self.popStack)} moves")
+
+        self._alignPopStates()
+        if len(self._positionKeys) == self._ply + 1 + len(self.popStack) == len(self.board.move_stack) + 1 + len(self.popStack):
+            self._positionCounts.update(self._positionKeys[self._ply + 1:self._ply + n + 1])
+            self._ply += n
+        else:
+            self._positionKeys.clear()
+        moves = [self.popStack.pop() for _ in range(n)]
+        states = [self._popStates.pop() for _ in range(n)]
+        self._unpopMoves(moves, states)
+        return moves[-1]
+
+    def goToMove(self, n: int) -> bool:
+        """ Goes to the move with the given `id`.
+
+        Returns
+        -------
+        bool
+            True if a move with the given `id` exists. Otherwise returns False.
+        """
+
+        if n >= 0:
+            moveStackLen = len(self.board.move_stack)
+            if n <= (moveStackLen + len(self.popStack)):
+                if moveStackLen < n:
+                    self.unpop(n - moveStackLen)
+                    return True
+                if moveStackLen > n:
+                    self.pop(moveStackLen - n)
+                    return True
+        return False
+
+    def _traceMove(self, move: chess.Move, san: str, pushed: bool) -> None:
+        # nothing is recorded or formatted unless somebody is interested in the moves
+        logged = moveLogger.isEnabledFor(logging.DEBUG)
+        if self.moveTrace is None and not logged:
+            return
+
+        record = MoveRecord(time.time(), self.board.ply(), move, san, pushed)
+        if self.moveTrace is not None:
+            self.moveTrace.append(record)
+        if logged:
+            moveLogger.debug("%d. %s", record.ply, san, extra={"moveRecord": record})
+
+    def _updateStatus(self) -> None:
+        status = self.status()
+        if status.checkmate:
+            self.checkmate.emit(not self.board.turn)
+            self.gameOver.emit()
+        elif status.insufficientMaterial:
+            self.draw.emit()
+            self.gameOver.emit()
+        elif status.stalemate:
+            self.stalemate.emit()
+            self.gameOver.emit()
+        elif status.fivefoldRepetition:
+            self.fivefoldRepetition.emit()
+            self.draw.emit()
+            self.gameOver.emit()
+        elif status.seventyFiveMoves:
+            self.seventyFiveMoves.emit()
+            self.draw.emit()
+            self.gameOver.emit()
+        else:
+            # reported on the move by which a draw can be claimed, not again on the following moves
+            # as long as it can be, e.g. in a series of repetitions; status() tracked the positions
+            if status.threefoldRepetition and self._positionCounts[self._positionKeys[self._ply - 1]] < 3:
+                self.threefoldRepetition.emit()
+            if status.fiftyMoves and status.halfmoveClock == 100:
+                self.fiftyMoves.emit()
+
+    def _generateLegalMoves(self) -> None:
+        # the same pieces generate other moves in Chess960 or in a variant of python-chess
+        key = (type(self.board), self.board.chess960, _transpositionKey(self.board))
+        if key != self._legalMovesKey:
+            self._legalMoves, self._legalTargets, self._check = self._indexLegalMoves(key)
+            self._legalMovesKey = key
+
+    def _supportsNative(self, key: Hashable) -> bool:
+        supported = self._nativeSupport.get(key)
+        if supported is None:
+            supported = self._nativeSupport[key] = native.supports(self.board)
+            while len(self._nativeSupport) > _NATIVE_SUPPORT_CACHE_SIZE:
+                self._nativeSupport.popitem(last=False)
+        else:
+            self._nativeSupport.move_to_end(key)
+        return supported
+
+    def _indexLegalMoves(self, key: Hashable) -> Tuple[Tuple[chess.Move, ...], List[Tuple[chess.Square, ...]], bool]:
+        if self.nativeMoveGeneration and native.isAvailable() and self._supportsNative(key):
+            if self._nativeBoard is None:
+                self._nativeBoard = native.NativeBoard(None)
+            self._nativeBoard.setBoard(self.board)
+            moves = tuple(self._nativeBoard.legalMoves())
+            check = self._nativeBoard.isCheck()
+        else:
+            moves = tuple(self.board.legal_moves)
+            check = self.board.is_check()
+
+        targets: List[List[chess.Square]] = [[] for _ in chess.SQUARES]
+        for move in moves:
+            squares = targets[move.from_square]
+            # the promotions of a pawn are generated one after another
+            if not squares or squares[-1] != move.to_square:
+                squares.append(move.to_square)
+        return moves, [tuple(squares) for squares in targets], check
+
+    def _isTracked(self, key: Hashable) -> bool:
+        # changes made on the board directly are detected by the number of moves and the position
+        return (self._ply == len(self.board.move_stack) and self._ply < len(self._positionKeys)
+                and self._positionKeys[self._ply] == key)
+
+    def _trackMove(self) -> None:
+        # called after a move is pushed on the board, the positions after the moves in popStack
+        # are no longer reachable with unpop
+        ply = len(self.board.move_stack)
+        if self._ply != ply - 1 or len(self._positionKeys) < ply:
+            self._positionKeys.clear()
+            return
+
+        del self._positionKeys[ply:]
+        key = _transpositionKey(self.board)
+        self._positionKeys.append(key)
+        self._positionCounts[key] += 1
+        self._ply = ply
+
+    def _trackPositions(self) -> None:
+        board = self.board.copy()
+        keys = [_transpositionKey(board)]
+        while board.move_stack:
+            board.pop()
+            keys.append(_transpositionKey(board))
+        keys.reverse()
+
+        self._positionKeys = keys
+        self._positionCounts = Counter(keys)
+        self._ply = len(keys) - 1
+
+    def _unpopMoves(self, moves: List[chess.Move],
+                    states: List[Optional[Tuple[Optional[Tuple[int, Hashable]], chess._BoardState]]]) -> None:
+        # The saved positions of moves popped together are only restored if the board is still at
+        # the position they were popped from. Otherwise, e.g. after makeMove or an edit of the board,
+        # the moves are pushed on the board as it is.
+        restored = False
+        start = 0
+        while start < len(moves):
+            end = start + 1
+            while end < len(moves) and states[end] is not None and states[end][0] is None:
+                end += 1
+
+            key = (len(self.board.move_stack), _transpositionKey(self.board))
+            restored = states[start] is not None and states[start][0] == key
+            if restored:
+                # The position before each unpopped move is the position after the previous one.
+                self.board._stack.append(chess._BoardState(self.board))
+                self.board._stack.extend(state for _, state in states[start:end - 1])
+                self.board.move_stack.extend(moves[start:end])
+                states[end - 1][1].restore(self.board)
+            else:
+                for move in moves[start:end]:
+                    self.board.push(move)
+            start = end
+
+        # the next move popped together with the last restored one is unpopped from this position
+        if restored and self._popStates and self._popStates[-1] is not None and self._popStates[-1][0] is None:
+            key = (len(self.board.move_stack), _transpositionKey(self.board))
+            self._popStates[-1] = (key, self._popStates[-1][1])
+
+    def _alignPopStates(self) -> None:
+        # the positions of moves added to popStack directly are unknown
+        if len(self._popStates) != len(self.popStack):
+            self._popStates.clear()
+            self._popStates.extend([None] * len(self.popStack))
+
+
+hotPaths.register(BoardModel, "_indexLegalMoves", "BoardModel.legalMoveGeneration")
+hotPaths.register(BoardModel, "_updateStatus", "BoardModel.statusCheck")
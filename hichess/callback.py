@@ -0,0 +1,59 @@
+# -*- coding: utf-8 -*-
+#
+# This file is part of the hichesslib project.
+# Copyright (C) 2019-2020 Haik Sargsian <haiksargsian6@gmail.com>
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>.
+
+""" `Callback`, the Qt-free counterpart of `QtCore.Signal`. """
+
+from typing import Optional, Callable, Any, List
+
+
+class Callback:
+    """ A lightweight replacement of `QtCore.Signal` for objects that don't depend on Qt.
+    The connected callables are called in the order in which they were connected.
+
+    Examples
+    --------
+    >>> model = BoardModel()
+    >>> model.moveMade.connect(print)
+    >>> model.push(chess.Move.from_uci("e2e4"))
+    e4
+    'e4'
+    """
+
+    def __init__(self):
+        self._slots: List[Callable[..., Any]] = []
+
+    def connect(self, slot: Callable[..., Any]) -> None:
+        self._slots.append(slot)
+
+    def disconnect(self, slot: Optional[Callable[..., Any]] = None) -> None:
+        """ Disconnects the given callable or, if it is None, all the connected callables.
+
+        Raises
+        ------
+        ValueError
+            If the given callable is not connected.
+        """
+
+        if slot is None:
+            self._slots.clear()
+        else:
+            self._slots.remove(slot)
+
+    def emit(self, *args: Any) -> None:
+        for slot in list(self._slots):
+            slot(*args)
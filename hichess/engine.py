@@ -0,0 +1,665 @@
+# -*- coding: utf-8 -*-
+#
+# This file is part of the hichesslib project.
+# Copyright (C) 2019-2020 Haik Sargsian <haiksargsian6@gmail.com>
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>.
+
+""" Chess engine support: `EngineWrapper`, `EnginePool` and `EngineCache`.
+Only QtCore is needed, the module doesn't import QtWidgets or QtGui.
+"""
+
+import asyncio
+import concurrent.futures
+import json
+import logging
+import os
+import threading
+from collections import OrderedDict
+from functools import partial
+from typing import Optional, Callable, Any, Coroutine, List, Tuple, Union
+
+import PySide2.QtCore as QtCore
+
+import chess
+import chess.engine
+import chess.polyglot
+
+from hichess.instrumentation import hotPaths
+
+
+logger = logging.getLogger(__name__)
+
+
+class _EventLoopThread(threading.Thread):
+    """ A daemon thread running its own asyncio event loop.
+    Coroutines are submitted from other threads and their results are returned as
+    `concurrent.futures.Future` objects.
+    """
+
+    def __init__(self):
+        super().__init__(name="hichess-engine", daemon=True)
+        self.loop = asyncio.new_event_loop()
+
+    def run(self) -> None:
+        asyncio.set_event_loop(self.loop)
+        self.loop.run_forever()
+        self.loop.close()
+
+    def submit(self, coro: Coroutine) -> concurrent.futures.Future:
+        return asyncio.run_coroutine_threadsafe(coro, self.loop)
+
+    def stop(self) -> None:
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self.join()
+
+
+class EnginePool:
+    """ A pool of warm UCI engines started with the same options and shared by any number
+    of `EngineWrapper` instances (and thus board widgets).
+
+    Every search leases an idle engine for its duration. When all the engines are busy, the
+    searches wait in a queue and are served in the order they were requested. Engines that
+    crash are restarted the next time they are leased or returned, a search interrupted by
+    a crash is retried once on a restarted engine.
+
+    The engines run in a dedicated thread, hence `play` and `analyse` return
+    `concurrent.futures.Future` objects and never block the caller.
+
+    Attributes
+    ----------
+    restarts : int
+        The number of engines restarted because they had terminated unexpectedly.
+    """
+
+    def __init__(self, path: Union[str, List[str]], size: int = 2, options: dict = {}):
+        assert size > 0
+
+        self.path = path
+        self.options = dict(options)
+        self.restarts = 0
+
+        self._size = size
+        self._engines: List[Tuple[asyncio.SubprocessTransport, chess.engine.UciProtocol]] = []
+        self._idle: Optional[asyncio.Queue] = None
+        self._thread: Optional[_EventLoopThread] = None
+
+    def size(self) -> int:
+        """ The number of engines in the pool. """
+        return self._size
+
+    def isRunning(self) -> bool:
+        """ Indicates if the engines of the pool have been started. """
+        return self._thread is not None
+
+    def start(self) -> bool:
+        """ Starts all the engines of the pool.
+
+        Returns
+        -------
+        bool
+            True if the engines were started and False if the pool is already running.
+        """
+
+        if self.isRunning():
+            logger.warning("The engine pool is already running.")
+            return False
+
+        async def main():
+            self._idle = asyncio.Queue()
+            self._engines = list(await asyncio.gather(*[self._spawn() for _ in range(self._size)]))
+            for i in range(self._size):
+                self._idle.put_nowait(i)
+            logger.info("Engine pool of %d engines at %s successfully started.", self._size, self.path)
+
+        self._thread = _EventLoopThread()
+        self._thread.start()
+        try:
+            self._thread.submit(main()).result()
+        except BaseException:
+            self._thread.stop()
+            self._thread = None
+            raise
+        return True
+
+    def play(self, board: chess.Board, limit: chess.engine.Limit, ponder: bool = False,
+             info: chess.engine.Info = chess.engine.INFO_NONE) -> "concurrent.futures.Future[chess.engine.PlayResult]":
+        """ Finds the best move on the `board` with the first engine available.
+        Do not modify `board` before the returned future is resolved.
+        """
+        return self._submit(lambda engine: engine.play(board=board, limit=limit, ponder=ponder, info=info))
+
+    def analyse(self, board: chess.Board, limit: chess.engine.Limit, multipv: Optional[int] = None) -> \
+            "concurrent.futures.Future[Union[chess.engine.InfoDict, List[chess.engine.InfoDict]]]":
+        """ Analyses the `board` with the first engine available.
+        For the result see `chess.engine.Protocol.analyse`.
+        """
+        return self._submit(lambda engine: engine.analyse(board=board, limit=limit, multipv=multipv))
+
+    def quit(self) -> bool:
+        """ Waits for the running searches to end and quits all the engines of the pool.
+
+        Returns
+        -------
+        bool
+            True if the engines were quit and False if the pool is not running.
+        """
+
+        if not self.isRunning():
+            logger.warning("The engine pool is not running.")
+            return False
+
+        async def main():
+            for _ in range(self._size):
+                i = await self._idle.get()
+                transport, engine = self._engines[i]
+                if self._alive(engine):
+                    await engine.quit()
+                transport.close()
+            self._engines = []
+
+        self._thread.submit(main()).result()
+        self._thread.stop()
+        self._thread = None
+        return True
+
+    def _submit(self, search: Callable[[chess.engine.UciProtocol], Coroutine]) -> concurrent.futures.Future:
+        if not self.isRunning():
+            raise RuntimeError("The engine pool is not running.")
+
+        async def main():
+            for attempt in range(2):
+                i = await self._acquire()
+                try:
+                    return await search(self._engines[i][1])
+                except chess.engine.EngineTerminatedError:
+                    if attempt:
+                        raise
+                    logger.warning("An engine of the pool terminated during a search, retrying.")
+                finally:
+                    await self._release(i)
+
+        return self._thread.submit(main())
+
+    async def _acquire(self) -> int:
+        i = await self._idle.get()
+        try:
+            await self._ensureAlive(i)
+        except BaseException:
+            self._idle.put_nowait(i)
+            raise
+        return i
+
+    async def _release(self, i: int) -> None:
+        try:
+            await self._ensureAlive(i)
+        finally:
+            self._idle.put_nowait(i)
+
+    async def _ensureAlive(self, i: int) -> None:
+        transport, engine = self._engines[i]
+        if not self._alive(engine):
+            transport.close()
+            self._engines[i] = await self._spawn()
+            self.restarts += 1
+            logger.warning("Restarted a terminated engine of the pool at %s.", self.path)
+
+    async def _spawn(self) -> Tuple[asyncio.SubprocessTransport, chess.engine.UciProtocol]:
+        transport, engine = await chess.engine.popen_uci(self.path)
+        await engine.configure(self.options)
+        return transport, engine
+
+    @staticmethod
+    def _alive(engine: chess.engine.UciProtocol) -> bool:
+        return not engine.returncode.done()
+
+
+class EngineCache:
+    """ A cache of engine search results, so that positions that have already been searched
+    with the same limit are not searched again (e.g. when going back and forth in a game).
+
+    The results are keyed by the Zobrist hash of the position (`chess.polyglot.zobrist_hash`)
+    and the parameters of the search limit, except its `clock_id`. Each entry stores the best move, the score and the
+    principal variation. When the cache is full, the least recently used entry is evicted.
+    The cache can be used from several threads.
+
+    Attributes
+    ----------
+    maxEntries : int
+        The maximum number of results kept in the cache.
+
+    path : Optional[str]
+        The file the cache is persisted to. If the file exists, the cache is loaded from it
+        on construction. The cache is written to it by `save`.
+
+    hits : int
+        The number of lookups that found a result.
+
+    misses : int
+        The number of lookups that did not find a result.
+    """
+
+    Key = Tuple[int, tuple]
+
+    # the parameters of chess.engine.Limit that the result of a search depends on
+    _LIMIT_FIELDS = ("time", "depth", "nodes", "mate", "white_clock", "black_clock",
+                     "white_inc", "black_inc", "remaining_moves")
+
+    def __init__(self, maxEntries: int = 100000, path: Optional[str] = None):
+        assert maxEntries > 0
+
+        self.maxEntries = maxEntries
+        self.path = path
+        self.hits = 0
+        self.misses = 0
+
+        self._entries: "OrderedDict[EngineCache.Key, Tuple[str, Optional[str], List[str]]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+        if path is not None and os.path.exists(path):
+            self.load(path)
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    @staticmethod
+    def key(board: chess.Board, limit: chess.engine.Limit) -> "EngineCache.Key":
+        """ Returns the key of the result of searching `board` with `limit`. """
+        return chess.polyglot.zobrist_hash(board), tuple(getattr(limit, field) for field in EngineCache._LIMIT_FIELDS)
+
+    def get(self, key: "EngineCache.Key") -> Optional[chess.engine.PlayResult]:
+        """ Returns the cached result for the given key or None if there is no such result. """
+
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+
+        move, score, pv = entry
+        info: chess.engine.InfoDict = {"pv": [chess.Move.from_uci(uci) for uci in pv]}
+        if score is not None:
+            info["score"] = chess.engine.PovScore(self._parseScore(score), chess.WHITE)
+        return chess.engine.PlayResult(chess.Move.from_uci(move),
+                                       info["pv"][1] if len(info["pv"]) > 1 else None, info)
+
+    def put(self, key: "EngineCache.Key", result: chess.engine.PlayResult) -> None:
+        """ Stores the result of a search. Results without a move are not stored. """
+
+        if result.move is None:
+            return
+
+        score = result.info.get("score")
+        entry = (result.move.uci(),
+                 str(score.white()) if score is not None else None,
+                 [move.uci() for move in result.info.get("pv", [result.move])])
+
+        with self._lock:
+            self._entries[key] = entry
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxEntries:
+                self._entries.popitem(last=False)
+
+    def clear(self) -> None:
+        """ Removes all the results from the cache. """
+        with self._lock:
+            self._entries.clear()
+
+    def load(self, path: Optional[str] = None) -> None:
+        """ Loads the results stored in the given file (`path` by default) into the cache. """
+
+        with open(path or self.path) as f:
+            entries = json.load(f)
+
+        with self._lock:
+            for zobristHash, limit, move, score, pv in entries[-self.maxEntries:]:
+                self._entries[(zobristHash, tuple(limit))] = (move, score, pv)
+            while len(self._entries) > self.maxEntries:
+                self._entries.popitem(last=False)
+
+    def save(self, path: Optional[str] = None) -> None:
+        """ Writes the cache to the given file (`path` by default), from the least to the most
+        recently used result. """
+
+        with self._lock:
+            entries = [[zobristHash, list(limit), *entry] for (zobristHash, limit), entry in self._entries.items()]
+
+        with open(path or self.path, "w") as f:
+            json.dump(entries, f)
+
+    @staticmethod
+    def _parseScore(score: str) -> chess.engine.Score:
+        if score.startswith("#"):
+            moves = int(score[2:])
+            if not moves:
+                return chess.engine.MateGiven if score[1] == "+" else chess.engine.Mate(0)
+            return chess.engine.Mate(moves if score[1] == "+" else -moves)
+        return chess.engine.Cp(int(score))
+
+
+class _AnalysisSession:
+    """ The state of a streaming analysis shared by the engine's thread, which writes the
+    latest lines sent by the engine, and the thread of the `EngineWrapper`, which reads them.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.lines: List[chess.engine.InfoDict] = []
+        self.dirty = False
+        self.finished = False
+        self.stopped = False
+        self.analysis: Optional[chess.engine.AnalysisResult] = None
+
+
+class EngineWrapper(QtCore.QObject):
+    """ This class is a wrapper around `engine`.
+    The class is used to ease interactions with the engine and simplifies debugging.
+    An `EngineWrapper` with no engine is called a null `EngineWrapper`.
+
+    By default the calls to the engine block until the engine responds. An asynchronous
+    `EngineWrapper` runs the engine in a dedicated thread instead, so searches do not block
+    the thread of the caller (usually the GUI thread) and `playMove` returns a
+    `concurrent.futures.Future`.
+
+    Instead of owning an engine the wrapper can use the engines of an `EnginePool`, which
+    is shared with other wrappers. The pool is started and quit by its owner.
+
+    An asynchronous wrapper with its own engine can also stream the analysis of a position,
+    see `startAnalysis`.
+
+    Attributes
+    ----------
+    engine : Optional[`chess.engine.UciProtocol`]
+        Represents the engine. By default there is no engine, thus, the engine is None.
+
+    pool : Optional[`EnginePool`]
+        The pool whose engines are used instead of `engine`.
+
+    cache : Optional[`EngineCache`]
+        If it is not None, the results of `playMove` are looked up in and stored to this cache.
+        A cached result is returned without querying the engine.
+
+    analysisInterval : int
+        The minimum interval in milliseconds between two emissions of `analysisUpdated`.
+        The information sent by the engine in the meantime is aggregated.
+    """
+
+    analysisUpdated = QtCore.Signal(object)
+    """ This is emitted during a streaming analysis with the latest information sent by the engine.
+    It accepts a list with a `chess.engine.InfoDict` (depth, score, pv, nps, etc.) for each of the
+    principal variations as a parameter.
+    """
+    analysisFinished = QtCore.Signal()
+    """ This is emitted when a streaming analysis ends, either because it was stopped or because
+    it reached its limit. """
+
+    def __init__(self, asynchronous: bool = False, pool: Optional[EnginePool] = None,
+                 cache: Optional[EngineCache] = None, parent=None):
+        super().__init__(parent)
+
+        self.engine: Optional[chess.engine.UciProtocol] = None
+        self.pool = pool
+        self.cache = cache
+        self._transport: Optional[asyncio.SubprocessTransport] = None
+        self._asynchronous = asynchronous
+        self._thread: Optional[_EventLoopThread] = None
+
+        self.analysisInterval = 100
+        self._analysisSession: Optional[_AnalysisSession] = None
+        self._analysisTimer = QtCore.QTimer(self)
+        self._analysisTimer.timeout.connect(self._onAnalysisTimeout)
+
+    def isAsynchronous(self) -> bool:
+        """ Indicates if the engine runs in a dedicated thread. """
+        return self._asynchronous
+
+    def null(self) -> bool:
+        """ Identifies if the wrapper has an engine. """
+        return self.engine is None and self.pool is None
+
+    def start(self, path: Union[str, List[str]], options: dict = {}) -> bool:
+        """ Starts an engine on the given path and configures it with the given options.
+        The path can also be a command line in form of a list.
+
+        Warnings
+        --------
+        Before starting a new engine, quit the current one.
+        It is not possible to start an engine when there is another running, in other words, when
+        the wrapper is not null. The caller will be warned about it if  this function is called when
+        the wrapper is not null. The caller will also be informed if the engine was successfully
+        started.
+
+        Returns
+        -------
+        bool
+            Returns True if the engine was started successfully, and False if not.
+        """
+        if not self.null():
+            logger.warning("Cannot start a new engine, as there is another running.")
+            return False
+
+        async def main():
+            self._transport, self.engine = await chess.engine.popen_uci(path)
+            logger.info("Engine at %s successfully started.", path)
+
+            await self.engine.configure(options)
+
+        if self._asynchronous:
+            self._thread = _EventLoopThread()
+            self._thread.start()
+
+        try:
+            self._wait(self._run(main()))
+        except BaseException:
+            if self._thread is not None:
+                self._thread.stop()
+                self._thread = None
+            raise
+        return True
+
+    def playMove(self, board: chess.Board, limit: chess.engine.Limit, ponder: bool = False) -> \
+            Union[chess.engine.PlayResult, "concurrent.futures.Future[chess.engine.PlayResult]"]:
+        """ Finds the best move on the `board`.
+
+        Returns
+        -------
+        Union[`chess.engine.PlayResult`, `concurrent.futures.Future`]
+            The result of the search if the wrapper is synchronous. Otherwise a future that
+            is resolved with the result once the search ends. Do not modify `board` before
+            the future is resolved, pass a copy of it instead.
+        """
+
+        key = None
+        info = chess.engine.INFO_NONE
+        if self.cache is not None:
+            key = EngineCache.key(board, limit)
+            result = self.cache.get(key)
+            if result is not None:
+                if self._asynchronous:
+                    future = concurrent.futures.Future()
+                    future.set_result(result)
+                    return future
+                return result
+            info = chess.engine.INFO_SCORE | chess.engine.INFO_PV
+
+        if self.pool is not None:
+            result = self.pool.play(board, limit, ponder, info)
+            if not self._asynchronous:
+                result = result.result()
+        else:
+            result = self._run(self.engine.play(board=board, limit=limit, ponder=ponder, info=info))
+
+        if key is not None:
+            if isinstance(result, concurrent.futures.Future):
+                result.add_done_callback(partial(self._cacheResult, key))
+            else:
+                self.cache.put(key, result)
+        return result
+
+    def quit(self) -> bool:
+        """ Quits the curent running engine.
+
+        Warnings
+        --------
+        This function should be called when there is a running engine. Otherwise the caller will be warned
+        about it.
+
+        If the wrapper uses a pool, it is detached from the pool, but the engines of the pool
+        keep running. If the wrapper has a `cache` with a path, the cache is saved.
+
+        Returns
+        -------
+        True if the engine was quit successfully and False if not.
+        """
+
+        if self.null():
+            logger.warning("No engine is running.")
+            return False
+
+        if self.cache is not None and self.cache.path is not None:
+            self.cache.save()
+
+        if self.pool is not None:
+            self.pool = None
+            return True
+
+        self.stopAnalysis()
+
+        async def main():
+            await self.engine.quit()
+            self._transport.close()
+
+        self._wait(self._run(main()))
+        self.engine = None
+        self._transport = None
+
+        if self._thread is not None:
+            self._thread.stop()
+            self._thread = None
+
+        return True
+
+    def startAnalysis(self, board: chess.Board, multipv: int = 1,
+                      limit: Optional[chess.engine.Limit] = None) -> bool:
+        """ Starts analysing the `board` in the background. While the engine is analysing,
+        `analysisUpdated` is emitted at most once per `analysisInterval` milliseconds. The
+        analysis runs until `stopAnalysis` is called, or until the `limit` is reached if one is
+        given. A running analysis is stopped before the new one starts.
+
+        Warnings
+        --------
+        Streaming analysis is only supported by asynchronous wrappers having an engine
+        of their own. The caller will be warned otherwise.
+
+        Returns
+        -------
+        bool
+            True if the analysis was started and False if not.
+        """
+
+        if self.engine is None or self._thread is None:
+            logger.warning("Streaming analysis requires an asynchronous wrapper with a running engine.")
+            return False
+
+        self.stopAnalysis()
+
+        session = self._analysisSession = _AnalysisSession()
+        board = board.copy()
+
+        async def main():
+            try:
+                analysis = session.analysis = await self.engine.analysis(board, limit, multipv=multipv)
+                if session.stopped:
+                    analysis.stop()
+                async for _ in analysis:
+                    lines = [dict(line) for line in analysis.multipv]
+                    with session.lock:
+                        session.lines = lines
+                        session.dirty = True
+            except Exception as error:
+                logger.warning("Engine analysis failed: %r", error)
+            finally:
+                session.finished = True
+
+        self._thread.submit(main())
+        self._analysisTimer.start(self.analysisInterval)
+        return True
+
+    def stopAnalysis(self) -> bool:
+        """ Stops the running streaming analysis and emits `analysisFinished`.
+
+        Returns
+        -------
+        bool
+            True if an analysis was stopped and False if there was no analysis running.
+        """
+
+        session = self._analysisSession
+        if session is None:
+            return False
+
+        def stop():
+            session.stopped = True
+            if session.analysis is not None:
+                session.analysis.stop()
+
+        self._thread.loop.call_soon_threadsafe(stop)
+        self._analysisSession = None
+        self._analysisTimer.stop()
+        self.analysisFinished.emit()
+        return True
+
+    def isAnalysing(self) -> bool:
+        """ Indicates if a streaming analysis is running. """
+        return self._analysisSession is not None
+
+    def _cacheResult(self, key: EngineCache.Key, future: concurrent.futures.Future) -> None:
+        if not future.cancelled() and future.exception() is None:
+            self.cache.put(key, future.result())
+
+    @QtCore.Slot()
+    def _onAnalysisTimeout(self):
+        session = self._analysisSession
+        if session is None:
+            return
+
+        with session.lock:
+            lines = session.lines if session.dirty else None
+            session.dirty = False
+            finished = session.finished
+
+        if lines is not None:
+            self.analysisUpdated.emit(lines)
+        if finished and lines is None:
+            self._analysisSession = None
+            self._analysisTimer.stop()
+            self.analysisFinished.emit()
+
+    def _run(self, coro: Coroutine) -> Any:
+        if self._thread is not None:
+            return self._thread.submit(coro)
+        return asyncio.get_event_loop().run_until_complete(coro)
+
+    @staticmethod
+    def _wait(result: Any) -> Any:
+        if isinstance(result, concurrent.futures.Future):
+            return result.result()
+        return result
+
+
+hotPaths.register(EngineWrapper, "playMove")
+hotPaths.register(EnginePool, "play")
+hotPaths.register(EnginePool, "analyse")
@@ -16,11 +16,15 @@
 # You should have received a copy of the GNU General Public License
 # along with this program. If not, see <http://www.gnu.org/licenses/>.
 
+import concurrent.futures
 import logging
-from collections import deque
+import os
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
 from enum import Enum
 from functools import partial
-from typing import Optional, Mapping, Generator, Callable, Any, Deque, Coroutine
+from typing import Optional, Mapping, Generator, Callable, Any, Deque, List, Dict, Iterator, Tuple, Union, TextIO
 
 import PySide2.QtCore as QtCore
 import PySide2.QtWidgets as QtWidgets
@@ -28,16 +32,165 @@ import PySide2.QtGui as QtGui
 
 import chess
 import chess.engine
+import chess.pgn
 
-import asyncio
+from hichess.boardmodel import IllegalMove, AccessibleSides, NO_SIDE, ONLY_WHITE_SIDE, ONLY_BLACK_SIDE, \
+    BOTH_SIDES, Callback, MoveRecord, PositionStatus, BoardModel, moveLogger, readGames
+from hichess.engine import EnginePool, EngineCache, EngineWrapper
+from hichess.instrumentation import OperationStats, Instrumentation, hotPaths
+from hichess import native
+
+
+logger = logging.getLogger(__name__)
 
 
 class NotAKingError(Exception):
     pass
 
 
-class IllegalMove(Exception):
-    pass
+class RenderMode(Enum):
+    STYLESHEET = 0
+    PAINTER = 1
+
+
+STYLESHEET_RENDERING = RenderMode.STYLESHEET
+PAINTER_RENDERING = RenderMode.PAINTER
+
+
+class PiecePixmapCache:
+    """ A cache of piece and overlay pixmaps that are already scaled to the size
+    they are drawn with. The pixmaps are shared by all the cell widgets rendered with
+    `PAINTER_RENDERING`, so that each piece image is loaded and scaled only once per
+    cell size.
+
+    Attributes
+    ----------
+    imagePath : str
+        The format of the paths of piece images. ``{color}`` and ``{piece}`` are replaced
+        with the color and the name of the piece respectively,
+        e.g. ``:/images/white_pawn.png``.
+
+    overlayColors : Dict[str, `QtGui.QColor`]
+        The colors of the overlays drawn under the piece, for the keys ``checked``,
+        ``highlighted``, ``highlightedHover``, ``highlightedPiece``, ``highlightedPieceHover``,
+        ``justMoved``, ``marked`` and ``inCheck``.
+
+    maxSize : int
+        The maximum number of scaled pixmaps kept in the cache. The least recently
+        used pixmaps are evicted first.
+    """
+
+    def __init__(self, imagePath: str = ":/images/{color}_{piece}.png", maxSize: int = 256):
+        self.imagePath = imagePath
+        self.maxSize = maxSize
+        self.overlayColors = {
+            "checked": QtGui.QColor(110, 155, 100, 178),
+            "highlighted": QtGui.QColor(175, 165, 220, 153),
+            "highlightedHover": QtGui.QColor(175, 165, 220, 204),
+            "highlightedPiece": QtGui.QColor(245, 145, 140, 153),
+            "highlightedPieceHover": QtGui.QColor(245, 145, 140, 204),
+            "justMoved": QtGui.QColor(255, 242, 0, 127),
+            "marked": QtGui.QColor(35, 175, 75, 178),
+            "inCheck": QtGui.QColor(255, 0, 0)
+        }
+
+        self._images: Dict[str, QtGui.QPixmap] = {}
+        self._scaled: "OrderedDict[tuple, QtGui.QPixmap]" = OrderedDict()
+
+    def piecePixmap(self, piece: chess.Piece, size: QtCore.QSize) -> QtGui.QPixmap:
+        """ Returns the image of the given piece scaled to `size`.
+        The returned pixmap is null if the image could not be loaded.
+        """
+
+        key = (piece.symbol(), size.width(), size.height())
+        pixmap = self._cached(key)
+        if pixmap is None:
+            image = self._image(piece)
+            if not image.isNull():
+                image = image.scaled(size, QtCore.Qt.IgnoreAspectRatio, QtCore.Qt.SmoothTransformation)
+            pixmap = self._store(key, image)
+        return pixmap
+
+    def overlayPixmap(self, name: str, size: QtCore.QSize) -> QtGui.QPixmap:
+        """ Returns the overlay with the given name (see `overlayColors`) rendered at `size`. """
+
+        key = (name, size.width(), size.height())
+        pixmap = self._cached(key)
+        if pixmap is None:
+            pixmap = QtGui.QPixmap(size)
+            pixmap.fill(QtCore.Qt.transparent)
+
+            painter = QtGui.QPainter(pixmap)
+            color = self.overlayColors[name]
+            if name == "inCheck":
+                gradient = QtGui.QRadialGradient(QtCore.QRectF(pixmap.rect()).center(),
+                                                 0.8 * max(size.width(), size.height()))
+                gradient.setColorAt(0, color)
+                gradient.setColorAt(1, QtCore.Qt.transparent)
+                painter.fillRect(pixmap.rect(), gradient)
+            else:
+                painter.fillRect(pixmap.rect(), color)
+            painter.end()
+
+            pixmap = self._store(key, pixmap)
+        return pixmap
+
+    def clear(self) -> None:
+        """ Removes all the pixmaps from the cache, e.g. after `imagePath` or `overlayColors`
+        have been changed. """
+        self._images.clear()
+        self._scaled.clear()
+
+    def _image(self, piece: chess.Piece) -> QtGui.QPixmap:
+        path = self.imagePath.format(color=chess.COLOR_NAMES[piece.color],
+                                     piece=chess.PIECE_NAMES[piece.piece_type])
+        image = self._images.get(path)
+        if image is None:
+            image = self._images[path] = QtGui.QPixmap(path)
+        return image
+
+    def _cached(self, key: tuple) -> Optional[QtGui.QPixmap]:
+        pixmap = self._scaled.get(key)
+        if pixmap is not None:
+            self._scaled.move_to_end(key)
+        return pixmap
+
+    def _store(self, key: tuple, pixmap: QtGui.QPixmap) -> QtGui.QPixmap:
+        self._scaled[key] = pixmap
+        while len(self._scaled) > self.maxSize:
+            self._scaled.popitem(last=False)
+        return pixmap
+
+
+piecePixmapCache = PiecePixmapCache()
+""" The `PiecePixmapCache` shared by all the cell widgets. """
+
+
+class _PolishQueue:
+    """ Collects the cell widgets whose style has to be recomputed while a batch of
+    updates is in progress and repolishes each of them once when the batch ends.
+    Batches can be nested, the cells are repolished when the outermost one ends.
+    """
+
+    def __init__(self):
+        self._depth = 0
+        self._cells: Dict["CellWidget", None] = {}
+
+    def isActive(self) -> bool:
+        return self._depth > 0
+
+    def add(self, w: "CellWidget") -> None:
+        self._cells[w] = None
+
+    def begin(self) -> None:
+        self._depth += 1
+
+    def end(self) -> None:
+        self._depth -= 1
+        if not self._depth:
+            cells, self._cells = self._cells, {}
+            for w in cells:
+                w._polish()
 
 
 class CellWidget(QtWidgets.QPushButton):
@@ -46,23 +199,31 @@ class CellWidget(QtWidgets.QPushButton):
     board. It can be marked with different colors.
 
     `CellWidget` by default represents an empty cell.
+
+    A cell is rendered either by the application's stylesheet (`STYLESHEET_RENDERING`,
+    the default) or by the cell itself from the pixmaps of `piecePixmapCache`
+    (`PAINTER_RENDERING`). The latter does not recompute the style of the cell when its
+    properties change, which makes updates much cheaper, but ignores the stylesheet.
     """
 
     designated = QtCore.Signal(bool)
     """ Indicates that the setter of `marked` property has been called. """
 
-    def __init__(self, parent=None):
+    def __init__(self, parent=None, renderMode: RenderMode = STYLESHEET_RENDERING):
         super().__init__(parent=parent)
 
+        self._renderMode = renderMode
         self._piece = None
         self._isInCheck = False
         self._isHighlighted = False
         self._isMarked = False
         self._justMoved = False
+        self._polishQueue: Optional[_PolishQueue] = None
 
         self.setMouseTracking(True)
         self.setObjectName("cell_plain")
-        self.setCheckable(False)
+        if renderMode == PAINTER_RENDERING:
+            self.setAttribute(QtCore.Qt.WA_Hover)
 
     def getPiece(self) -> Optional[chess.Piece]:
         return self._piece
@@ -100,8 +261,7 @@ class CellWidget(QtWidgets.QPushButton):
             self.setObjectName("cell_plain")
             self.setCheckable(False)
 
-        self.style().unpolish(self)
-        self.style().polish(self)
+        self._updateStyle()
 
     def isPlain(self) -> bool:
         """ A convenience property indicating if the cell is empty or not. """
@@ -112,7 +272,7 @@ class CellWidget(QtWidgets.QPushButton):
         self.setPiece(None)
 
     @staticmethod
-    def makePiece(piece: chess.Piece) -> "CellWidget":
+    def makePiece(piece: chess.Piece, renderMode: RenderMode = STYLESHEET_RENDERING) -> "CellWidget":
         """ A static method that creates a `CellWidget` from the given piece.
 
         Parameters
@@ -121,11 +281,13 @@ class CellWidget(QtWidgets.QPushButton):
             The piece that will occupy the cell. Note that the type of
             the piece cannot be NoneType as in the definition of the
             method `setPiece`, because by default cells are created empty.
+        renderMode : `RenderMode`
+            The render mode of the created cell.
          """
 
         assert isinstance(piece, chess.Piece)
 
-        w = CellWidget()
+        w = CellWidget(renderMode=renderMode)
         w.setPiece(piece)
         return w
 
@@ -146,9 +308,9 @@ class CellWidget(QtWidgets.QPushButton):
 
     def setInCheck(self, ck: bool) -> None:
         if self._piece and self._piece.piece_type == chess.KING:
-            self._isInCheck = ck
-            self.style().unpolish(self)
-            self.style().polish(self)
+            if self._isInCheck != ck:
+                self._isInCheck = ck
+                self._updateStyle()
         else:
             raise NotAKingError("Trying to (un)check a cell that does not hold a king.")
 
@@ -176,8 +338,7 @@ class CellWidget(QtWidgets.QPushButton):
                 self.setCheckable(False)
             else:
                 self.setCheckable(bool(self._piece))
-            self.style().unpolish(self)
-            self.style().polish(self)
+            self._updateStyle()
 
     def highlight(self) -> None:
         """ A convenience method that sets the property `highlighted` to True. """
@@ -196,10 +357,14 @@ class CellWidget(QtWidgets.QPushButton):
         return self._isMarked
 
     def setMarked(self, marked: bool) -> None:
+        changed = self._isMarked != marked
         self._isMarked = marked
         self.designated.emit(self._isMarked)
-        self.style().unpolish(self)
-        self.style().polish(self)
+        group = self.group()
+        if isinstance(group, _CellGroup):
+            group.cellMarked.emit(self._isMarked)
+        if changed:
+            self._updateStyle()
 
     def mark(self):
         """ A convenience method that sets the property `marked` to True. """
@@ -215,13 +380,71 @@ class CellWidget(QtWidgets.QPushButton):
         return self._justMoved
 
     def setJustMoved(self, jm: bool):
-        self._justMoved = jm
-        self.style().unpolish(self)
-        self.style().polish(self)
+        if self._justMoved != jm:
+            self._justMoved = jm
+            self._updateStyle()
+
+    def renderMode(self) -> RenderMode:
+        """ Indicates how the cell is rendered. See `RenderMode`. """
+        return self._renderMode
+
+    def setRenderMode(self, renderMode: RenderMode) -> None:
+        if self._renderMode != renderMode:
+            self._renderMode = renderMode
+            if renderMode == PAINTER_RENDERING:
+                self.setAttribute(QtCore.Qt.WA_Hover)
+            self._polish()
 
     def mouseMoveEvent(self, e):
         e.ignore()
 
+    def paintEvent(self, e: QtGui.QPaintEvent) -> None:
+        if self._renderMode == STYLESHEET_RENDERING:
+            super().paintEvent(e)
+            return
+
+        size = self.size()
+        painter = QtGui.QPainter(self)
+
+        overlay = self._overlayName()
+        if overlay is not None:
+            painter.drawPixmap(0, 0, piecePixmapCache.overlayPixmap(overlay, size))
+        if self._piece is not None:
+            painter.drawPixmap(0, 0, piecePixmapCache.piecePixmap(self._piece, size))
+        painter.end()
+
+    def _overlayName(self) -> Optional[str]:
+        # the same precedence as the selectors of the default stylesheet
+        if self._isInCheck:
+            return "inCheck"
+        if self._isHighlighted:
+            name = "highlightedPiece" if self._piece else "highlighted"
+            return name + "Hover" if self.underMouse() else name
+        if self._isMarked:
+            return "marked"
+        if self._justMoved:
+            return "justMoved"
+        if self.isChecked():
+            return "checked"
+        return None
+
+    def _updateStyle(self) -> None:
+        if self._renderMode == PAINTER_RENDERING:
+            self.update()
+        elif self._polishQueue is not None and self._polishQueue.isActive():
+            self._polishQueue.add(self)
+        else:
+            self._polish()
+
+    def _polish(self) -> None:
+        # a cell that has never been shown is polished by Qt when it is shown for the first time
+        if not self.testAttribute(QtCore.Qt.WA_WState_Polished):
+            return
+        self.style().unpolish(self)
+        self.style().polish(self)
+        if self._renderMode == PAINTER_RENDERING:
+            self.update()
+
     piece = QtCore.Property(bool, isPiece, setPiece)
     plain = QtCore.Property(bool, isPlain)
     inCheck = QtCore.Property(bool, isInCheck, setInCheck)
@@ -230,91 +453,16 @@ class CellWidget(QtWidgets.QPushButton):
     justMoved = QtCore.Property(bool, justMoved, setJustMoved)
 
 
-class AccessibleSides(Enum):
-    NONE = 0
-    ONLY_WHITE = 1
-    ONLY_BLACK = 2
-    BOTH = 3
-
-
-NO_SIDE = AccessibleSides.NONE
-ONLY_WHITE_SIDE = AccessibleSides.ONLY_WHITE
-ONLY_BLACK_SIDE = AccessibleSides.ONLY_BLACK
-BOTH_SIDES = AccessibleSides.BOTH
-
-
-class EngineWrapper:
-    """ This class is a wrapper around `engine`.
-    The class is used to ease interactions with the engine and simplifies debugging.
-    An `EngineWrapper` with no engine is called a null `EngineWrapper`.
-
-    Attributes
-    ----------
-    engine : Optional[`chess.engine.UciProtocol`]
-        Represents the engine. By default there is no engine, thus, the engine is None.
+class _CellGroup(QtWidgets.QButtonGroup):
+    """ Dispatches the signals of all the cells of a board widget, so that the board widget
+    connects to the group once instead of connecting to each of its cells.
     """
 
-    def __init__(self):
-        self.engine: Optional[chess.engine.UciProtocol] = None
-
-    def null(self) -> bool:
-        """ Identifies if the wrapper has an engine. """
-        return self.engine is None
-
-    def start(self, path: str, options: dict = {}) -> bool:
-        """ Starts an engine on the given path and configures it with the given options.
-
-        Warnings
-        --------
-        Before starting a new engine, quit the current one.
-        It is not possible to start an engine when there is another running, in other words, when
-        the wrapper is not null. The caller will be warned about it if  this function is called when
-        the wrapper is not null. The caller will also be informed if the engine was successfully
-        started.
-
-        Returns
-        -------
-        bool
-            Returns True if the engine was started successfully, and False if not.
-        """
-        if not self.null():
-            logging.warning("Cannot start a new engine, as there is another running.")
-            return False
-
-        async def main():
-            transport, self.engine = await chess.engine.popen_uci(path)
-            logging.info(f"Engine at {path} successfully started.")
-
-            await self.engine.configure(options)
-
-        asyncio.get_event_loop().run_until_complete(main())
-        return True
-
-    def playMove(self, board: chess.Board, limit: chess.engine.Limit, ponder: bool) -> Coroutine[Any, Any, chess.engine.PlayResult]:
-        """ Finds the best move on the `board`. Returns a coroutine. """
-        return asyncio.get_event_loop().run_until_complete(self.engine.play(board=board, limit=limit, ponder=ponder))
-
-    def quit(self) -> bool:
-        """ Quits the curent running engine.
-
-        Warnings
-        --------
-        This function should be called when there is a running engine. Otherwise the caller will be warned
-        about it.
-
-        Returns
-        -------
-        True if the engine was quit successfully and False if not.
-        """
+    cellMarked = QtCore.Signal(bool)
 
-        if self.null():
-            logging.warning("No engine is running.")
-            return False
-
-        asyncio.get_event_loop().run_until_complete(self.engine.quit())
-        self.engine = None
-
-        return True
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.setExclusive(False)
 
 
 class _PromotionDialog(QtWidgets.QDialog):
@@ -322,19 +470,26 @@ class _PromotionDialog(QtWidgets.QDialog):
     QUEEN_ON_BOTTOM, QUEEN_ON_TOP = [True, False]
 
     def __init__(self, parent=None, color: bool = chess.WHITE,
-                 order: OptionOrder = QUEEN_ON_TOP):
+                 order: OptionOrder = QUEEN_ON_TOP,
+                 renderMode: RenderMode = STYLESHEET_RENDERING):
         super().__init__(parent)
 
-        self.setWindowFlags(QtCore.Qt.Window | QtCore.Qt.FramelessWindowHint | QtCore.Qt.Popup)
+        # The flags are combined as integers. With PySide2 5.13.2 on Python 3.11, | on two Qt.WindowType values
+        # leaves a TypeError "'PySide2.QtCore.Qt.WindowType' object cannot be interpreted as an integer" set,
+        # which is raised by the next call into Qt. This is the only place where hichess combines Qt enums.
+        self.setWindowFlags(QtCore.Qt.WindowFlags(int(QtCore.Qt.Window) | int(QtCore.Qt.FramelessWindowHint)
+                                                  | int(QtCore.Qt.Popup)))
 
         self.chosenPiece = chess.QUEEN
+        self.pieces: List[CellWidget] = []
 
         def makePiece(pieceType):
-            w = CellWidget.makePiece(chess.Piece(pieceType, color))
+            w = CellWidget.makePiece(chess.Piece(pieceType, color), renderMode)
             w.setFocusPolicy(QtCore.Qt.NoFocus)
             w.setSizePolicy(QtWidgets.QSizePolicy.MinimumExpanding,
                             QtWidgets.QSizePolicy.MinimumExpanding)
             w.clicked.connect(partial(self.onPieceChosen, pieceType))
+            self.pieces.append(w)
             return w
 
         layout = QtWidgets.QVBoxLayout()
@@ -349,6 +504,10 @@ class _PromotionDialog(QtWidgets.QDialog):
 
         self.setLayout(layout)
 
+    def setRenderMode(self, renderMode: RenderMode) -> None:
+        for w in self.pieces:
+            w.setRenderMode(renderMode)
+
     @QtCore.Slot()
     def onPieceChosen(self, pieceType):
         self.chosenPiece = pieceType
@@ -359,6 +518,10 @@ class _DragWidget(QtWidgets.QLabel):
     def __init__(self, parent=None):
         super(_DragWidget, self).__init__(parent)
 
+        self.setAttribute(QtCore.Qt.WA_TransparentForMouseEvents)
+        self.setStyleSheet("background: transparent;")
+        self.hide()
+
     def event(self, e: QtCore.QEvent) -> bool:
         if e.type() == QtGui.QMouseEvent:
             e.ignore()
@@ -370,14 +533,40 @@ def _DefaultPredicate(w: CellWidget) -> bool:
     return True
 
 
+def cellIndexOfSquare(square: chess.Square, flipped: bool = False) -> chess.Square:
+    """
+    Returns
+    -------
+    chess.Square
+        The index of the cell at the given square number if we started counting from the top left
+        corner of the board, which is flipped if `flipped` is True.
+    """
+
+    if not flipped:
+        return chess.square_mirror(square)
+    return chess.square(7 - chess.square_file(square), chess.square_rank(square))
+
+
 class BoardWidget(QtWidgets.QLabel):
     """ Represents a customizable graphical chess board.
     It inherits `QtWidgets.QLabel` and has a `QtWidgets.QGridLayout` with 64
     `CellWidget` instances that can be moved. It also supports all the
     chess rules, drag and drop and chess engines.
 
+    The game itself is held by a `BoardModel`, which the board widget displays.
+    The attributes `board`, `popStack`, `blockBoardOnPop` and `nativeMoveGeneration` are those of the model.
+
+    If the board widget is constructed with ``lazyCells=True``, its cell widgets are only created
+    when it is shown for the first time or when a cell is requested by its square (e.g. with
+    `cellWidgetAtSquare` or `king`). Until then the board can be played on as usual, but
+    `cellWidgets` and `foreachCells` visit no cells. This makes screens with many boards,
+    most of which are not visible yet, faster to open.
+
     Attributes
     ----------
+    model : `BoardModel`
+        The model of the game displayed by the board widget.
+
     board : `chess.Board`
         Represents the actual board. Moves and their validation are
         conducted through this object.
@@ -385,6 +574,8 @@ class BoardWidget(QtWidgets.QLabel):
     popStack : Deque[`chess.Move`]
         The moves that are popped from the `board.move_stack` through the functions
         `goToMove`, `pop` are stored in this deque.
+        The positions reached by the popped moves are remembered as well, so that
+        `unpop` and `goToMove` restore them directly instead of replaying the moves.
 
     blockBoardOnPop : bool
         If this attribute is True, the board can't be interacted with unless `popStack`
@@ -411,6 +602,30 @@ class BoardWidget(QtWidgets.QLabel):
 
     engineWrapper : `EngineWrapper`
         This attribute is used to start an engine and find the best moves on the board.
+
+    autoPromotion : Optional[`chess.PieceType`]
+        If this attribute is not None, pawns that reach the last rank are promoted to
+        the given piece without showing the promotion dialog, e.g. `chess.QUEEN` for auto-queen.
+
+    premovePromotion : Optional[`chess.PieceType`]
+        The piece that the next pawn reaching the last rank is promoted to without showing
+        the promotion dialog. It is reset to None after it has been used once. It takes
+        precedence over `autoPromotion`.
+
+    modalPromotion : bool
+        If this attribute is True (default), the promotion dialog is executed modally and
+        `pushPiece` returns after a piece has been chosen. Otherwise the dialog is only shown,
+        `pushPiece` returns immediately and the move is pushed when a piece is chosen.
+
+    incrementalSync : bool
+        If this attribute is True (default), synchronizing the board widget only updates
+        the cells whose pieces differ from the pieces displayed by the widget. Otherwise
+        every cell is updated on each synchronization.
+
+    scaledPixmapCacheSize : int
+        The maximum number of scaled board pixmaps kept in memory. The pixmaps are scaled
+        to the size of the board widget and cached by size, so that flipping the board or
+        returning to a previous size doesn't scale `defaultPixmap` or `flippedPixmap` again.
     """
 
     moveMade = QtCore.Signal(str)
@@ -430,57 +645,109 @@ class BoardWidget(QtWidgets.QLabel):
     """ This is emitted when it is drag on the board. """
     stalemate = QtCore.Signal()
     """ This is emitted when it is stalemate on the board. """
+    threefoldRepetition = QtCore.Signal()
+    """ This is emitted when the position on the board has occurred at least three times, so a draw can be claimed. """
+    fivefoldRepetition = QtCore.Signal()
+    """ This is emitted when the position on the board has occurred five times. The game is drawn, so `draw` is
+    emitted as well.
+    """
+    fiftyMoves = QtCore.Signal()
+    """ This is emitted when no capture or pawn move has been made in the last fifty moves, so a draw can be claimed.
+    """
+    seventyFiveMoves = QtCore.Signal()
+    """ This is emitted when no capture or pawn move has been made in the last seventy-five moves. The game is drawn,
+    so `draw` is emitted as well.
+    """
     gameOver = QtCore.Signal()
     """ This is emitted when the game is over. """
+    bestMoveFound = QtCore.Signal(object)
+    """ This is emitted when a search started by `findBestMove` ends. It accepts the
+    `chess.engine.PlayResult` of the search as a parameter.
+    """
+
+    _searchFinished = QtCore.Signal(str, object)
 
     def __init__(self, parent=None,
                  fen: Optional[str] = chess.STARTING_FEN,
                  flipped: bool = False,
                  sides: AccessibleSides = NO_SIDE,
-                 dnd: bool = False):
+                 dnd: bool = False,
+                 renderMode: RenderMode = STYLESHEET_RENDERING,
+                 lazyCells: bool = False):
         super().__init__(parent=parent)
 
-        self.board = chess.Board(fen)
-        self.popStack = deque()
+        self._model = BoardModel(fen, sides)
 
         self._flipped = flipped
-        self._accessibleSides = sides
+        self._renderMode = renderMode
 
-        self.blockBoardOnPop = False
+        self.incrementalSync = True
+        self._pieces: List[Optional[chess.Piece]] = [None] * 64
+        self._syncedBitboards: Tuple[int, ...] = ()
+        self._justMovedSquares: Tuple[chess.Square, ...] = ()
+        self._polishQueue = _PolishQueue()
 
         self.defaultPixmap = self.pixmap()
         self.flippedPixmap = QtGui.QPixmap(self.pixmap())
+        self.scaledPixmapCacheSize = 8
+        self._scaledPixmaps: "OrderedDict[Tuple[int, int, int], QtGui.QPixmap]" = OrderedDict()
+        # while the board is being resized its pixmap is scaled fast, the smooth
+        # pixmap is scaled once the size hasn't changed for a while
+        self._smoothScalingTimer = QtCore.QTimer(self)
+        self._smoothScalingTimer.setSingleShot(True)
+        self._smoothScalingTimer.setInterval(150)
+        self._smoothScalingTimer.timeout.connect(self._updatePixmap)
         self.lastCheckedCellWidget = None
 
         self.dragAndDrop = dnd
-        self._dragWidget: Optional[QtWidgets.QWidget] = None
+        self._dragging = False
+
+        self.autoPromotion: Optional[chess.PieceType] = None
+        self.premovePromotion: Optional[chess.PieceType] = None
+        self.modalPromotion = True
+        self._promotionDialogs: Dict[Tuple[chess.Color, bool], _PromotionDialog] = {}
+        self._pendingPromotion: Optional[chess.Move] = None
 
         self.engineWrapper = EngineWrapper()
+        self._analysisParameters: Optional[Tuple[int, Optional[chess.engine.Limit]]] = None
 
         self._boardLayout = QtWidgets.QGridLayout()
         self._boardLayout.setContentsMargins(0, 0, 0, 0)
         self._boardLayout.setSpacing(0)
-
-        def newCellWidget():
-            cellWidget = CellWidget()
-            cellWidget.setFocusPolicy(QtCore.Qt.NoFocus)
-            cellWidget.setSizePolicy(QtWidgets.QSizePolicy.MinimumExpanding,
-                                     QtWidgets.QSizePolicy.MinimumExpanding)
-
-            cellWidget.clicked.connect(partial(self._onCellWidgetClicked, cellWidget))
-            cellWidget.toggled.connect(partial(self._onCellWidgetToggled, cellWidget))
-            cellWidget.designated.connect(self._onCellWidgetMarked)
-            cellWidget.installEventFilter(self)
-            return cellWidget
-
-        for i in range(8):
-            for j in range(8):
-                self._boardLayout.addWidget(newCellWidget(), i, j)
         self.setLayout(self._boardLayout)
 
-        self.setFen(self.board.fen())
+        # the signals of the cells reach the board widget through a single group
+        self._cellGroup = _CellGroup(self)
+        self._cellGroup.buttonClicked[QtWidgets.QAbstractButton].connect(self._onCellWidgetClicked)
+        self._cellGroup.buttonToggled[QtWidgets.QAbstractButton, bool].connect(self._onCellWidgetToggled)
+        self._cellGroup.cellMarked.connect(self._onCellWidgetMarked)
+
+        self._cells: List[CellWidget] = []
+        self._cellAtSquare: List[CellWidget] = []
+        self._squareOfCell: Dict[CellWidget, chess.Square] = {}
+        if not lazyCells:
+            self._createCells()
+
+        # the same widget shows the dragged piece during every drag and drop
+        self._dragWidget = _DragWidget(self)
+
+        with self.batchUpdates():
+            self.synchronize()
+
+        self._model.moveMade.connect(self._onModelMoveMade)
+        self._model.moveMade.connect(self.moveMade.emit)
+        self._model.movePushed.connect(self.movePushed.emit)
+        self._model.checkmate.connect(self.checkmate.emit)
+        self._model.draw.connect(self.draw.emit)
+        self._model.stalemate.connect(self.stalemate.emit)
+        self._model.threefoldRepetition.connect(self.threefoldRepetition.emit)
+        self._model.fivefoldRepetition.connect(self.fivefoldRepetition.emit)
+        self._model.fiftyMoves.connect(self.fiftyMoves.emit)
+        self._model.seventyFiveMoves.connect(self.seventyFiveMoves.emit)
+        self._model.gameOver.connect(self.gameOver.emit)
 
         self.moveMade.connect(self._onMoveMade)
+        self._searchFinished.connect(self._onSearchFinished)
         self.setMouseTracking(True)
         self.setAutoFillBackground(True)
         self.setScaledContents(True)
@@ -492,16 +759,12 @@ class BoardWidget(QtWidgets.QLabel):
                     # start drag if it is possible
                     if self.dragAndDrop and watched.getPiece() \
                             and watched.getPiece().color == self.board.turn:
-                        self._dragWidget = _DragWidget(self)
-                        self._dragWidget.setAutoFillBackground(True)
+                        self._dragging = True
                         self._dragWidget.setFixedSize(watched.size())
-                        self._dragWidget.setScaledContents(True)
-                        self._dragWidget.setStyleSheet("background: transparent;")
-                        self._dragWidget.setPixmap(QtGui.QPixmap(
-                            f":/images/{'_'.join(watched.objectName().split('_')[1:])}.png"))
+                        self._dragWidget.setPixmap(piecePixmapCache.piecePixmap(watched.getPiece(), watched.size()))
 
                         rect = self._dragWidget.geometry()
-                        rect.moveCenter(QtGui.QCursor.pos())
+                        rect.moveCenter(self.mapFromGlobal(QtGui.QCursor.pos()))
                         self._dragWidget.setGeometry(rect)
 
                         watched.setChecked(not watched.isChecked())
@@ -514,18 +777,31 @@ class BoardWidget(QtWidgets.QLabel):
 
         return watched.event(event)
 
+    def showEvent(self, e: QtGui.QShowEvent) -> None:
+        if not self._cells:
+            self._ensureCells()
+            # the board widget is already visible, so its new children have to be shown explicitly
+            for w in self._cells:
+                w.show()
+        super().showEvent(e)
+
+    def resizeEvent(self, e: QtGui.QResizeEvent) -> None:
+        super().resizeEvent(e)
+        if not self._updatePixmap(smooth=False):
+            self._smoothScalingTimer.start()
+
     def mousePressEvent(self, e):
-        if e.buttons() != QtCore.Qt.LeftButton and self._dragWidget:
-            self._dragWidget.deleteLater()
-            self._dragWidget = None
+        if e.buttons() != QtCore.Qt.LeftButton and self._dragging:
+            self._endDrag()
             self.foreachCells(CellWidget.unhighlight, CellWidget.unmark,
                               lambda w: w.setChecked(False))
 
     def mouseMoveEvent(self, e):
-        if self._dragWidget:
+        if self._dragging:
             # if drag has started, show the drag widget if it is not visible
             # and move its center to the mouse cursor.
             if not self._dragWidget.isVisible():
+                self._dragWidget.raise_()
                 self._dragWidget.show()
             rect = self._dragWidget.geometry()
             rect.moveCenter(e.pos())
@@ -535,11 +811,11 @@ class BoardWidget(QtWidgets.QLabel):
     def mouseReleaseEvent(self, event):
         if event.button() == QtCore.Qt.LeftButton:
             # end drag and drop
-            if self._dragWidget:
-                self._dragWidget.deleteLater()
-                self._dragWidget = None
+            if self._dragging:
+                self._endDrag()
 
-                for w in self.cellWidgets(lambda w: w.geometry().contains(self.mapFromGlobal(event.globalPos()))):
+                w = self._cellWidgetAt(self.mapFromGlobal(event.globalPos()))
+                if w is not None:
                     self._onCellWidgetClicked(w)
 
     def cellWidgets(self, predicate: Callable[[CellWidget], bool] = _DefaultPredicate) -> \
@@ -552,8 +828,7 @@ class BoardWidget(QtWidgets.QLabel):
             that fulfill the predicate's condition.
         """
 
-        for i in range(self._boardLayout.count()):
-            w = self._boardLayout.itemAt(i).widget()
+        for w in self._cells:
             if predicate(w):
                 yield w
 
@@ -569,11 +844,30 @@ class BoardWidget(QtWidgets.QLabel):
         predicate : Callable[[`CellWidget`], bool]
         """
 
-        for w in self.cellWidgets():
-            if predicate(w):
+        with self.batchUpdates():
+            for w in self.cellWidgets(predicate):
                 for callback in args:
                     callback(w)
 
+    @contextmanager
+    def batchUpdates(self) -> Iterator[None]:
+        """ A context manager that defers the style updates of the cell widgets until the
+        end of the block. Every cell whose properties changed inside the block is repolished
+        only once, no matter how many of its properties have been set. Blocks can be nested.
+
+        Examples
+        --------
+        >>> with boardWidget.batchUpdates():
+        ...     boardWidget.unmarkCells()
+        ...     boardWidget.highlightLegalMoveCellsFor(w)
+        """
+
+        self._polishQueue.begin()
+        try:
+            yield
+        finally:
+            self._polishQueue.end()
+
     def cellIndexOfSquare(self, square: chess.Square) -> Optional[chess.Square]:
         """
         Returns
@@ -583,9 +877,7 @@ class BoardWidget(QtWidgets.QLabel):
             corner of the board.
         """
 
-        if not self._flipped:
-            return chess.square_mirror(square)
-        return chess.square(7 - chess.square_file(square), chess.square_rank(square))
+        return cellIndexOfSquare(square, self._flipped)
 
     def squareOf(self, w: CellWidget) -> chess.Square:
         """
@@ -595,10 +887,7 @@ class BoardWidget(QtWidgets.QLabel):
             The square number corresponding to the given cell widget.
         """
 
-        i = self._boardLayout.indexOf(w)
-        if not self.flipped:
-            return chess.square_mirror(i)
-        return chess.square(7 - chess.square_file(i), chess.square_rank(i))
+        return self._squareOfCell[w]
 
     def cellWidgetAtSquare(self, square: chess.Square) -> Optional[CellWidget]:
         """
@@ -609,18 +898,27 @@ class BoardWidget(QtWidgets.QLabel):
             it returns None.
         """
 
-        item = self._boardLayout.itemAt(self.cellIndexOfSquare(square))
-        if item is not None:
-            return item.widget()
+        if 0 <= square < 64:
+            if not self._cellAtSquare:
+                self._ensureCells()
+            return self._cellAtSquare[square]
         return None
 
     def pieceCanBePushedTo(self, w: CellWidget):
         """ Yields the numbers of squares that the piece on the cell widget can be legally pushed
         to. """
 
-        for move in self.board.legal_moves:
-            if move.from_square == self.squareOf(w):
-                yield move.to_square
+        yield from self.legalTargets(self.squareOf(w))
+
+    def legalTargets(self, square: chess.Square) -> Tuple[chess.Square, ...]:
+        """ Returns the squares that the piece on the given square can be legally moved to,
+        in the order in which `board.legal_moves` generates them. Promotions to different
+        pieces are collapsed into a single target square.
+
+        The legal moves are generated once per position and indexed by their source squares,
+        so this method is a constant time lookup until the position on `board` changes.
+        """
+        return self._model.legalTargets(square)
 
     def isPseudoLegalPromotion(self, move: chess.Move) -> bool:
         """ This method indicates if the given move can be a promotion. So would be if the piece
@@ -631,15 +929,7 @@ class BoardWidget(QtWidgets.QLabel):
         The result of this method is pseudo-true, as it doesn't do any move validation. It is the
         caller's responsibility to validate the move.
         """
-
-        piece = self.board.piece_at(move.from_square)
-
-        if piece is not None and piece.piece_type == chess.PAWN:
-            if piece.color == chess.WHITE:
-                return chess.A8 <= move.to_square <= chess.H8
-            elif piece.color == chess.BLACK:
-                return chess.A1 <= move.to_square <= chess.H1
-        return False
+        return self._model.isPseudoLegalPromotion(move)
 
     def king(self, color: chess.Color) -> Optional[CellWidget]:
         """
@@ -694,8 +984,10 @@ class BoardWidget(QtWidgets.QLabel):
         if w.isPlain():
             raise ValueError(f"Cell widget at {square} is not a piece")
 
-        self.board.remove_piece_at(square)
+        self._model.removePieceAt(square)
         w.toPlain()
+        self._pieces[square] = None
+        self._syncedBitboards = ()
 
         return w
 
@@ -717,27 +1009,35 @@ class BoardWidget(QtWidgets.QLabel):
             raise ValueError("Square {} is occupied")
         return self._setPieceAt(square, piece)
 
-    def synchronize(self) -> None:
+    def synchronize(self, full: bool = False) -> None:
         """ Synchronizes the widget with the contents of `board`.
-        This method makes all the cells plain and then sets their pieces on by one.
+        If `incrementalSync` is True, only the cells whose pieces changed since the last
+        synchronization are updated. Pass `full` as True to update every cell regardless,
+        e.g. after the cells have been modified directly.
         """
-        self._synchronize()
+        self._synchronize(full)
 
-    def synchronizeAndUpdateStyles(self) -> None:
+    def synchronizeAndUpdateStyles(self, full: bool = False) -> None:
         """ Synchronizes the widget with the contents of `board` and updates
         the just moved cells and the king in check.
+        For the meaning of `full` see `synchronize`.
         """
 
-        self._synchronize()
+        if not self._cells:
+            # the cells are synchronized when they are created
+            return
 
-        self._updateJustMovedCells(False)
-        self._updateJustMovedCells(True)
+        with self.batchUpdates():
+            self._synchronize(full)
 
-        if self.board.is_check():
-            self.king(self.board.turn).check()
-        else:
-            self.king(self.board.turn).uncheck()
-            self.king(not self.board.turn).uncheck()
+            self._updateJustMovedCells(False)
+            self._updateJustMovedCells(True)
+
+            if self._model.isCheck():
+                self.king(self.board.turn).check()
+            else:
+                self.king(self.board.turn).uncheck()
+                self.king(not self.board.turn).uncheck()
 
     def setPieceMap(self, pieces: Mapping[int, chess.Piece]) -> None:
         """ Sets the board's piece map and synchronizes the board widget.
@@ -745,9 +1045,10 @@ class BoardWidget(QtWidgets.QLabel):
         the pieces change after the change of piece map.
         """
 
-        self.board.set_piece_map(pieces)
-        self.unhighlightCells()
-        self.synchronize()
+        self._model.setPieceMap(pieces)
+        with self.batchUpdates():
+            self.unhighlightCells()
+            self.synchronize()
 
     def setFen(self, fen: Optional[str]) -> None:
         """ Sets the board's fen and synchronizes the board widget.
@@ -755,41 +1056,44 @@ class BoardWidget(QtWidgets.QLabel):
         the pieces change after the fen.
         """
 
-        self.board = chess.Board(fen)
-        self.unhighlightCells()
-        self.synchronize()
+        self._model.setFen(fen)
+        with self.batchUpdates():
+            self.unhighlightCells()
+            self.synchronize()
 
     def clear(self) -> None:
         """ Clears the board widget and resets the properties of the cells. """
 
-        self._updateJustMovedCells(False)
+        with self.batchUpdates():
+            self._updateJustMovedCells(False)
 
-        self.king(chess.WHITE).uncheck()
-        self.king(chess.BLACK).uncheck()
+            self.king(chess.WHITE).uncheck()
+            self.king(chess.BLACK).uncheck()
 
-        self.board.clear()
-        self.popStack.clear()
-        self.foreachCells(CellWidget.unhighlight, CellWidget.unmark, lambda w: w.setChecked(False))
-        self.synchronize()
+            self._model.clear()
+            self.foreachCells(CellWidget.unhighlight, CellWidget.unmark, lambda w: w.setChecked(False))
+            self.synchronize()
 
     def reset(self) -> None:
         """ Resets the pieces to their standard positions and resets the
         properties of the board widget and all the pieces inside of its layout.
         """
 
-        self._updateJustMovedCells(False)
+        with self.batchUpdates():
+            self._updateJustMovedCells(False)
 
-        self.king(chess.WHITE).uncheck()
-        self.king(chess.BLACK).uncheck()
+            self.king(chess.WHITE).uncheck()
+            self.king(chess.BLACK).uncheck()
 
-        self._flipped = False
-        self._updatePixmap()
+            wasFlipped = self._flipped
+            self._flipped = False
+            self._updateCellLookup()
+            self._updatePixmap()
 
-        self.board.reset()
-        self.popStack.clear()
-        self.foreachCells(CellWidget.unhighlight, CellWidget.unmark,
-                          lambda w: w.setChecked(False))
-        self.synchronize()
+            self._model.reset()
+            self.foreachCells(CellWidget.unhighlight, CellWidget.unmark,
+                              lambda w: w.setChecked(False))
+            self.synchronize(full=wasFlipped)
 
     def makeMove(self, move: chess.Move) -> None:
         """ Makes a move without move validation.
@@ -799,12 +1103,8 @@ class BoardWidget(QtWidgets.QLabel):
         parameter.
         """
 
-        self._updateJustMovedCells(False)
-        san = self.board.san(move)
-        self.board.push(move)
-        self._updateJustMovedCells(True)
-        self.synchronizeAndUpdateStyles()
-        self.moveMade.emit(san)
+        with self.batchUpdates():
+            self._model.makeMove(move)
 
     def pushPiece(self, toSquare: chess.Square, w: CellWidget) -> None:
         """ Pushes the piece on the given cell widget to the given square.
@@ -842,14 +1142,14 @@ class BoardWidget(QtWidgets.QLabel):
             Last poped move in form of uci.
         """
 
-        self._updateJustMovedCells(False)
-        lastMove = None
-        for i in range(n):
-            lastMove = self.board.pop()
-            self.popStack.append(lastMove)
+        with self.batchUpdates():
+            self._updateJustMovedCells(False)
+            lastMove = self._model.pop(n)
 
-        self.foreachCells(CellWidget.unmark, CellWidget.unhighlight)
-        self.synchronizeAndUpdateStyles()
+            self.unmarkCells()
+            self.unhighlightCells()
+            self.synchronizeAndUpdateStyles()
+        self._restartAnalysis()
 
         return lastMove.uci()
 
@@ -859,15 +1159,14 @@ class BoardWidget(QtWidgets.QLabel):
         For further reference see the latter's documentation.
         """
 
-        self._updateJustMovedCells(False)
-
-        lastMove = None
-        for i in range(n):
-            lastMove = self.popStack.pop()
-            self.board.push(lastMove)
+        with self.batchUpdates():
+            self._updateJustMovedCells(False)
+            lastMove = self._model.unpop(n)
 
-        self.foreachCells(CellWidget.unmark, CellWidget.unhighlight)
-        self.synchronizeAndUpdateStyles()
+            self.unmarkCells()
+            self.unhighlightCells()
+            self.synchronizeAndUpdateStyles()
+        self._restartAnalysis()
 
         return lastMove.uci()
 
@@ -891,6 +1190,64 @@ class BoardWidget(QtWidgets.QLabel):
                     return True
         return False
 
+    def loadGame(self, game: Union[chess.pgn.Game, os.PathLike, str, TextIO],
+                 ply: Optional[int] = None) -> chess.pgn.Game:
+        """ Loads the given game and goes to the move `ply`, by default the last move.
+        The moves after `ply` are stored in `popStack`.
+
+        Unlike replaying the game with `push`, the moves are neither rendered as san nor
+        signaled, and the board widget is synchronized once, at the target move.
+        For the parameters and the exceptions see `BoardModel.loadGame`.
+
+        Examples
+        --------
+        >>> for game in hichess.readGames(pathlib.Path("games.pgn")):
+        ...     boardWidget.loadGame(game, ply=0)
+        """
+
+        game = self._model.loadGame(game, ply)
+        with self.batchUpdates():
+            self._updateJustMovedCells(False)
+            self.unmarkCells()
+            self.unhighlightCells()
+            self.synchronizeAndUpdateStyles()
+        self._restartAnalysis()
+        return game
+
+    def findBestMove(self, limit: chess.engine.Limit, ponder: bool = False) -> None:
+        """ Searches the best move on the board with `engineWrapper` and emits `bestMoveFound`
+        with the result of the search.
+
+        If `engineWrapper` is asynchronous, this method returns immediately and the signal is
+        emitted later, while the board keeps responding to the user. The result is discarded
+        if the position on the board has changed by the time the search ends.
+        """
+
+        result = self.engineWrapper.playMove(self.board.copy(), limit, ponder)
+        if isinstance(result, concurrent.futures.Future):
+            # the callback is called in the engine's thread, the signal delivers the
+            # result to the thread of the board widget
+            result.add_done_callback(partial(self._searchFinished.emit, self.board.fen()))
+        else:
+            self.bestMoveFound.emit(result)
+
+    def startAnalysis(self, multipv: int = 1, limit: Optional[chess.engine.Limit] = None) -> bool:
+        """ Starts a streaming analysis of the board with `engineWrapper`.
+        The analysis is restarted automatically whenever a move is made, popped or unpopped,
+        until `stopAnalysis` is called. For further reference see `EngineWrapper.startAnalysis`.
+        """
+
+        if not self.engineWrapper.startAnalysis(self.board, multipv, limit):
+            return False
+        self._analysisParameters = (multipv, limit)
+        return True
+
+    def stopAnalysis(self) -> bool:
+        """ Stops the streaming analysis started with `startAnalysis`. """
+
+        self._analysisParameters = None
+        return self.engineWrapper.stopAnalysis()
+
     def highlightLegalMoveCellsFor(self, w: CellWidget) -> int:
         """ Highlights the legal moves for the given cell widget.
 
@@ -900,11 +1257,11 @@ class BoardWidget(QtWidgets.QLabel):
             The number of highlighted cells as a result of this method's call.
         """
 
-        counter = 0
-        for square in self.pieceCanBePushedTo(w):
-            self.cellWidgetAtSquare(square).highlight()
-            counter += 1
-        return counter
+        targets = self.legalTargets(self.squareOf(w))
+        with self.batchUpdates():
+            for square in targets:
+                self.cellWidgetAtSquare(square).highlight()
+        return len(targets)
 
     def uncheckCells(self, exceptFor: Optional[CellWidget] = None) -> None:
         """ Calls QtWidgets.QPushButton.setChecked(False) for all the cells except for the
@@ -919,12 +1276,12 @@ class BoardWidget(QtWidgets.QLabel):
         self.foreachCells(callback)
 
     def unhighlightCells(self) -> None:
-        """ Calls `CellWidget.unhighlight` for each cell. """
-        self.foreachCells(CellWidget.unhighlight)
+        """ Calls `CellWidget.unhighlight` for each highlighted cell. """
+        self.foreachCells(CellWidget.unhighlight, predicate=CellWidget.isHighlighted)
 
     def unmarkCells(self) -> None:
-        """ Calls `CellWidget.unmark` for each cell. """
-        self.foreachCells(CellWidget.unmark)
+        """ Calls `CellWidget.unmark` for each marked cell. """
+        self.foreachCells(CellWidget.unmark, predicate=CellWidget.isMarked)
 
     @property
     def flipped(self) -> bool:
@@ -941,30 +1298,93 @@ class BoardWidget(QtWidgets.QLabel):
         """ A convenience method that sets the property `flipped` to True. """
         self._setFlipped(not self.flipped)
 
+    @property
+    def model(self) -> BoardModel:
+        """ The model of the game displayed by the board widget. """
+        return self._model
+
+    @property
+    def board(self) -> chess.Board:
+        return self._model.board
+
+    @board.setter
+    def board(self, board: chess.Board) -> None:
+        self._model.board = board
+
+    @property
+    def popStack(self) -> Deque[chess.Move]:
+        return self._model.popStack
+
+    @popStack.setter
+    def popStack(self, popStack: Deque[chess.Move]) -> None:
+        self._model.popStack = popStack
+
+    @property
+    def blockBoardOnPop(self) -> bool:
+        return self._model.blockBoardOnPop
+
+    @blockBoardOnPop.setter
+    def blockBoardOnPop(self, blockBoardOnPop: bool) -> None:
+        self._model.blockBoardOnPop = blockBoardOnPop
+
+    @property
+    def nativeMoveGeneration(self) -> bool:
+        """ Indicates if the legal moves used by `pieceCanBePushedTo`, `highlightLegalMoveCellsFor`
+        and the detection of the end of the game are generated by the chessplusplus library.
+        See `BoardModel.nativeMoveGeneration`.
+        """
+        return self._model.nativeMoveGeneration
+
+    @nativeMoveGeneration.setter
+    def nativeMoveGeneration(self, nativeMoveGeneration: bool) -> None:
+        self._model.nativeMoveGeneration = nativeMoveGeneration
+
     @property
     def accessibleSides(self) -> AccessibleSides:
         """ Indicates pieces of which color
         can be interacted with.
         """
-        return self._accessibleSides
+        return self._model.accessibleSides
 
     @accessibleSides.setter
     def accessibleSides(self, accessibleSides: AccessibleSides) -> None:
-        self._accessibleSides = accessibleSides
-        self.foreachCells(CellWidget.unhighlight, CellWidget.unmark, lambda w: w.setChecked(False))
-        self.synchronize()
+        self._model.accessibleSides = accessibleSides
+        with self.batchUpdates():
+            self.foreachCells(CellWidget.unhighlight, CellWidget.unmark, lambda w: w.setChecked(False))
+            self.synchronize()
+
+    @property
+    def renderMode(self) -> RenderMode:
+        """ Indicates how the cell widgets of the board are rendered.
+        For further reference see `CellWidget`.
+        """
+        return self._renderMode
+
+    @renderMode.setter
+    def renderMode(self, renderMode: RenderMode) -> None:
+        self._renderMode = renderMode
+        self.foreachCells(lambda w: w.setRenderMode(renderMode))
+        for promotionDialog in self._promotionDialogs.values():
+            promotionDialog.setRenderMode(renderMode)
 
     @QtCore.Slot()
     def _onMoveMade(self):
-        if self.board.is_checkmate():
-            self.checkmate.emit(not self.board.turn)
-            self.gameOver.emit()
-        elif self.board.is_insufficient_material():
-            self.draw.emit()
-            self.gameOver.emit()
-        elif self.board.is_stalemate():
-            self.stalemate.emit()
-            self.gameOver.emit()
+        self._restartAnalysis()
+
+    def _onModelMoveMade(self, san: str):
+        # the cells are unmarked before moveMade is emitted, so the listeners see the board without marks
+        if self._model.isPushing():
+            self.unmarkCells()
+        self.synchronizeAndUpdateStyles()
+
+    @QtCore.Slot(str, object)
+    def _onSearchFinished(self, fen: str, future: concurrent.futures.Future):
+        if future.cancelled():
+            return
+        if future.exception() is not None:
+            logger.warning("Engine search failed: %r", future.exception())
+        elif fen == self.board.fen():
+            self.bestMoveFound.emit(future.result())
 
     @QtCore.Slot()
     def _onCellWidgetClicked(self, w):
@@ -980,11 +1400,7 @@ class BoardWidget(QtWidgets.QLabel):
     @QtCore.Slot()
     def _onCellWidgetToggled(self, w: CellWidget, toggled: bool):
         if toggled:
-            if self.board.turn != w.getPiece().color or not self._isCellAccessible(w):
-                w.setChecked(False)
-                return
-
-            if self.blockBoardOnPop and self.popStack:
+            if not self._model.canMoveFrom(self.squareOf(w)):
                 w.setChecked(False)
                 return
 
@@ -992,13 +1408,30 @@ class BoardWidget(QtWidgets.QLabel):
                 if _w != w:
                     _w.setChecked(False)
 
-            self.foreachCells(CellWidget.unmark, CellWidget.unhighlight, callback)
-            if not self.highlightLegalMoveCellsFor(w):
-                w.setChecked(False)
+            with self.batchUpdates():
+                self.foreachCells(CellWidget.unmark, CellWidget.unhighlight, callback)
+                if not self.highlightLegalMoveCellsFor(w):
+                    w.setChecked(False)
             self.lastCheckedCellWidget = w
         else:
             self.unhighlightCells()
 
+    @QtCore.Slot()
+    def _onPromotionDialogFinished(self, promotionDialog: _PromotionDialog, exitCode: int):
+        # only the dialogs shown by a non-modal promotion leave a pending move
+        move, self._pendingPromotion = self._pendingPromotion, None
+        if move is None:
+            return
+
+        if exitCode == _PromotionDialog.Accepted:
+            move.promotion = promotionDialog.chosenPiece
+            # the position could have changed while the dialog was shown
+            if self.board.is_legal(move):
+                with self.batchUpdates():
+                    self._model.push(move)
+                return
+        self.foreachCells(CellWidget.unhighlight, lambda w: w.setChecked(False))
+
     @QtCore.Slot()
     def _onCellWidgetMarked(self, marked: bool):
         if marked:
@@ -1008,105 +1441,478 @@ class BoardWidget(QtWidgets.QLabel):
 
             self.foreachCells(callback, CellWidget.unhighlight)
 
-    def _isCellAccessible(self, w):
-        if self.accessibleSides == NO_SIDE:
-            return False
-        if self.accessibleSides == BOTH_SIDES:
-            return True
-
-        if w.piece:
-            color = w.getPiece().color
-
-            if color == chess.WHITE:
-                return self.accessibleSides == ONLY_WHITE_SIDE
-            if color == chess.BLACK:
-                return self.accessibleSides == ONLY_BLACK_SIDE
-
     def _setPieceAt(self, square: chess.Square, piece: chess.Piece) -> CellWidget:
-        self.board.set_piece_at(square, piece)
+        self._model.setPieceAt(square, piece)
 
         w = self.cellWidgetAtSquare(square)
         w.setPiece(piece)
+        self._pieces[square] = piece
+        # the cells of the other changed squares haven't been synchronized yet
+        self._syncedBitboards = ()
 
         return w
 
-    def _updatePixmap(self) -> None:
-        if not self._flipped:
-            if self.defaultPixmap:
-                self.setPixmap(self.defaultPixmap.scaled(self.size(),
-                               QtCore.Qt.KeepAspectRatio, QtCore.Qt.SmoothTransformation))
-        elif self.flippedPixmap:
-            self.setPixmap(self.flippedPixmap.scaled(self.size(),
-                           QtCore.Qt.KeepAspectRatio, QtCore.Qt.SmoothTransformation))
-
-    def _synchronize(self) -> None:
-        def callback(w):
-            w.unhighlight()
-            if not w.isPlain():
-                w.toPlain()
-
-        boardCopy = self.board.copy()
-        self.foreachCells(callback)
-        for square, piece in self.board.piece_map().items():
-            self._setPieceAt(square, piece)
-        self.board = boardCopy
+    def _endDrag(self) -> None:
+        self._dragging = False
+        self._dragWidget.hide()
+
+    def _cellWidgetAt(self, pos: QtCore.QPoint) -> Optional[CellWidget]:
+        # the cells fill the board evenly, as the layout has neither margins nor spacing
+        if not self.rect().contains(pos):
+            return None
+        row = pos.y() * 8 // self.height()
+        column = pos.x() * 8 // self.width()
+        return self._cells[8 * row + column]
+
+    def _createCells(self) -> None:
+        sizePolicy = QtWidgets.QSizePolicy(QtWidgets.QSizePolicy.MinimumExpanding,
+                                           QtWidgets.QSizePolicy.MinimumExpanding)
+        for i in range(8):
+            for j in range(8):
+                cellWidget = CellWidget(renderMode=self._renderMode)
+                cellWidget._polishQueue = self._polishQueue
+                cellWidget.setFocusPolicy(QtCore.Qt.NoFocus)
+                cellWidget.setSizePolicy(sizePolicy)
+                self._cellGroup.addButton(cellWidget)
+                self._cells.append(cellWidget)
+                self._boardLayout.addWidget(cellWidget, i, j)
+
+        # the events sent while the cells are added to the layout don't go through the filter
+        for cellWidget in self._cells:
+            cellWidget.installEventFilter(self)
+        self._updateCellLookup()
+
+    def _ensureCells(self) -> None:
+        # creates the cells of a board widget constructed with lazyCells
+        if not self._cells:
+            self._createCells()
+            self.synchronizeAndUpdateStyles(full=True)
+
+    def _updateCellLookup(self) -> None:
+        if not self._cells:
+            return
+        self._cellAtSquare = [self._cells[self.cellIndexOfSquare(square)] for square in chess.SQUARES]
+        self._squareOfCell = {w: square for square, w in enumerate(self._cellAtSquare)}
+
+    def _restartAnalysis(self) -> None:
+        if self._analysisParameters is not None:
+            self.engineWrapper.startAnalysis(self.board, *self._analysisParameters)
+
+    @QtCore.Slot()
+    def _updatePixmap(self, smooth: bool = True) -> bool:
+        # Returns False if the pixmap has been scaled fast, because there was no
+        # smoothly scaled pixmap of the current size in the cache.
+        pixmap = self.flippedPixmap if self._flipped else self.defaultPixmap
+        if not pixmap:
+            return True
+
+        key = (pixmap.cacheKey(), self.width(), self.height())
+        scaled = self._scaledPixmaps.get(key)
+        if scaled is not None:
+            self._scaledPixmaps.move_to_end(key)
+        elif smooth:
+            scaled = pixmap.scaled(self.size(), QtCore.Qt.KeepAspectRatio, QtCore.Qt.SmoothTransformation)
+            self._scaledPixmaps[key] = scaled
+            while len(self._scaledPixmaps) > self.scaledPixmapCacheSize:
+                self._scaledPixmaps.popitem(last=False)
+        else:
+            self.setPixmap(pixmap.scaled(self.size(), QtCore.Qt.KeepAspectRatio, QtCore.Qt.FastTransformation))
+            return False
+
+        self.setPixmap(scaled)
+        return True
+
+    def _synchronize(self, full: bool = False) -> None:
+        if not self._cells:
+            return
+
+        full = full or not self.incrementalSync
+        board = self.board
+
+        for w in self._cells:
+            if w.isHighlighted():
+                w.unhighlight()
+
+        # Only the squares whose bits differ from the last synchronization are visited,
+        # so the cost depends on the number of changed squares, neither on the number of
+        # pieces nor on the length of the game.
+        bitboards = native.bitboards(board)
+        if full or not self._syncedBitboards:
+            changed = chess.BB_ALL
+        else:
+            changed = native.changedSquares(self._syncedBitboards, bitboards)
+        self._syncedBitboards = bitboards
+
+        for square in chess.scan_forward(changed):
+            piece = board.piece_at(square)
+            if full or piece != self._pieces[square]:
+                self.cellWidgetAtSquare(square).setPiece(piece)
+                self._pieces[square] = piece
 
     def _updateJustMovedCells(self, justMoved: bool):
-        if self.board.move_stack:
+        # the cells of the last move are remembered, because the move stack
+        # can change before they are updated
+        for square in self._justMovedSquares:
+            self.cellWidgetAtSquare(square).justMoved = False
+        self._justMovedSquares = ()
+
+        if justMoved and self.board.move_stack:
             lastMove = self.board.move_stack[-1]
-            self.cellWidgetAtSquare(lastMove.from_square).justMoved = justMoved
-            self.cellWidgetAtSquare(lastMove.to_square).justMoved = justMoved
+            self.cellWidgetAtSquare(lastMove.from_square).justMoved = True
+            self.cellWidgetAtSquare(lastMove.to_square).justMoved = True
+            self._justMovedSquares = (lastMove.from_square, lastMove.to_square)
 
     def _push(self, move: chess.Move) -> None:
-        self._updateJustMovedCells(False)
-
         turn = self.board.turn
 
-        if self._isCellAccessible(self.cellWidgetAtSquare(move.from_square)) \
+        if self._model.isAccessible(move.from_square) \
                 and move.promotion is None and self.isPseudoLegalPromotion(move):
-            w = self.cellWidgetAtSquare(move.to_square)
-
-            promotionDialog = _PromotionDialog(parent=self, color=turn, order=self._flipped)
-            if not self._flipped and turn:
-                promotionDialog.move(self.mapToGlobal(w.pos()))
+            if self.premovePromotion is not None:
+                move.promotion = self.premovePromotion
+                self.premovePromotion = None
+            elif self.autoPromotion is not None:
+                move.promotion = self.autoPromotion
             else:
-                promotionDialog.move(self.mapToGlobal(QtCore.QPoint(w.x(), w.y() - 3 * w.height())))
-            promotionDialog.setFixedWidth(w.width())
-            promotionDialog.setFixedHeight(4 * w.height())
-
-            exitCode = promotionDialog.exec_()
-            if exitCode == _PromotionDialog.Accepted:
-                move.promotion = promotionDialog.chosenPiece
-            elif exitCode == _PromotionDialog.Rejected:
-                self.foreachCells(CellWidget.unhighlight, lambda w: w.setChecked(False))
-                return
+                promotionDialog = self._promotionDialog(turn, move.to_square)
+
+                if not self.modalPromotion:
+                    self._pendingPromotion = move
+                    promotionDialog.show()
+                    return
+
+                exitCode = promotionDialog.exec_()
+                if exitCode == _PromotionDialog.Accepted:
+                    move.promotion = promotionDialog.chosenPiece
+                elif exitCode == _PromotionDialog.Rejected:
+                    self.foreachCells(CellWidget.unhighlight, lambda w: w.setChecked(False))
+                    return
+
+        with self.batchUpdates():
+            self._model.push(move)
+
+    def _promotionDialog(self, color: chess.Color, square: chess.Square) -> _PromotionDialog:
+        # the dialogs are built once per color and order of the pieces and then reused
+        key = (color, self._flipped)
+        promotionDialog = self._promotionDialogs.get(key)
+        if promotionDialog is None:
+            promotionDialog = _PromotionDialog(parent=self, color=color, order=self._flipped,
+                                               renderMode=self._renderMode)
+            promotionDialog.finished.connect(partial(self._onPromotionDialogFinished, promotionDialog))
+            self._promotionDialogs[key] = promotionDialog
 
-        if not self.board.is_legal(move) or move.null():
-            raise IllegalMove(f"illegal move {move} by ")
-        logging.debug(f"\n{self.board.lan(move)} ({move.from_square} -> {move.to_square})")
+        w = self.cellWidgetAtSquare(square)
+        if not self._flipped and color:
+            promotionDialog.move(self.mapToGlobal(w.pos()))
+        else:
+            promotionDialog.move(self.mapToGlobal(QtCore.QPoint(w.x(), w.y() - 3 * w.height())))
+        promotionDialog.setFixedWidth(w.width())
+        promotionDialog.setFixedHeight(4 * w.height())
 
-        san = self.board.san(move)
-        self.board.push(move)
-        logging.debug(f"\n{self.board}\n")
+        promotionDialog.chosenPiece = chess.QUEEN
+        return promotionDialog
 
-        self._updateJustMovedCells(True)
-        self.popStack.clear()
+    def _setFlipped(self, flipped: bool):
+        if self._flipped != flipped:
+            # Flipping the board rotates it by 180 degrees, which moves the cell at the layout
+            # index i to the index 63 - i. The cells are moved with their squares, pieces and
+            # states, so none of them is synchronized or repolished.
+            geometries = [w.geometry() for w in self._cells]
+            self._flipped = flipped
+            self._cells.reverse()
+            # The layout holds nothing but the cells. Taking its items from the end and clearing
+            # WA_LaidOut spares removeWidget and addWidget searching the layout for every cell.
+            for i in reversed(range(self._boardLayout.count())):
+                self._boardLayout.takeAt(i)
+            for i, w in enumerate(self._cells):
+                w.setAttribute(QtCore.Qt.WA_LaidOut, False)
+                self._boardLayout.addWidget(w, i // 8, i % 8)
+                # the layout is applied later, but the cells have to be found at their new positions
+                w.setGeometry(geometries[i])
+            self._updatePixmap()
 
-        self.foreachCells(CellWidget.unmark, CellWidget.unhighlight)
-        self.synchronizeAndUpdateStyles()
 
-        self.moveMade.emit(san)
-        self.movePushed.emit(san)
+class _BoardView:
+    # a board of MultiBoardView and its rendered pixmap
+    def __init__(self, model: BoardModel, flipped: bool):
+        self.model = model
+        self.flipped = flipped
+        self.pixmap: Optional[QtGui.QPixmap] = None
+        self.key: Optional[tuple] = None
+        self.onMoveMade: Optional[Callable[[str], None]] = None
 
-    def _setFlipped(self, flipped: bool):
-        if self._flipped != flipped:
-            self._updateJustMovedCells(False)
 
-            markedWidgets = list(self.cellWidgets(CellWidget.isMarked))
-            for w in markedWidgets:
-                w.unmark()
-                self.cellWidgetAtSquare(63 - self.squareOf(w)).mark()
+class MultiBoardView(QtWidgets.QWidget):
+    """ Displays many boards in a grid in a single widget, e.g. to follow many games at once.
 
-            self._flipped = flipped
-            self.synchronizeAndUpdateStyles()
-            self._updatePixmap()
+    Unlike `BoardWidget`, the view has no widget per cell and the boards can't be played on.
+    Each board is rendered into a pixmap with the pieces of `piecePixmapCache` and the
+    pixmap is painted until the position on the board changes. Boards are rendered only
+    when they are updated, at most once per `frameInterval` and for at most `frameBudget`
+    seconds per frame. The boards that don't fit into the budget are rendered in the next frames.
+
+    The boards are updated automatically when a move is made with `BoardModel.makeMove` or
+    `BoardModel.push`. After any other change to a model call `updateBoard`.
+
+    Attributes
+    ----------
+    columns : int
+        The number of boards in a row of the grid.
+
+    spacing : int
+        The space between the boards in pixels.
+
+    lightSquareColor : `QtGui.QColor`
+        The color of the light squares. After it is changed call `updateBoards`.
+
+    darkSquareColor : `QtGui.QColor`
+        The color of the dark squares. After it is changed call `updateBoards`.
+
+    frameInterval : int
+        The minimum interval between two repaints of the view in milliseconds.
+        16 by default, that is about 60 frames per second.
+
+    frameBudget : float
+        The maximum time spent rendering the updated boards in a frame, in seconds.
+
+    Examples
+    --------
+    >>> view = hichess.MultiBoardView(columns=10)
+    >>> models = [view.addBoard() for _ in range(100)]
+    >>> models[0].push(chess.Move.from_uci("e2e4"))
+    """
+
+    boardClicked = QtCore.Signal(object)
+    """ This is emitted with the `BoardModel` of the board that has been clicked. """
+
+    def __init__(self, parent: Optional[QtWidgets.QWidget] = None, columns: int = 8):
+        super().__init__(parent=parent)
+
+        self.columns = columns
+        self.spacing = 4
+        self.lightSquareColor = QtGui.QColor(240, 217, 181)
+        self.darkSquareColor = QtGui.QColor(181, 136, 99)
+        self.frameInterval = 16
+        self.frameBudget = 0.008
+
+        self._boards: List[_BoardView] = []
+        self._viewOfModel: Dict[BoardModel, _BoardView] = {}
+        self._pending: "OrderedDict[int, _BoardView]" = OrderedDict()
+        self._backgrounds: Dict[int, QtGui.QPixmap] = {}
+
+        self._frameTimer = QtCore.QTimer(self)
+        self._frameTimer.setSingleShot(True)
+        self._frameTimer.timeout.connect(self._renderFrame)
+
+    def addBoard(self, model: Optional[BoardModel] = None, flipped: bool = False) -> BoardModel:
+        """ Adds a board displaying the given model, or a new model with the standard position.
+
+        Returns
+        -------
+        BoardModel
+            The model displayed by the added board.
+        """
+
+        if model is None:
+            model = BoardModel()
+
+        view = _BoardView(model, flipped)
+        view.onMoveMade = partial(self._onMoveMade, view)
+        model.moveMade.connect(view.onMoveMade)
+        self._boards.append(view)
+        self._viewOfModel[model] = view
+        self._schedule(view)
+        return model
+
+    def removeBoard(self, model: BoardModel) -> None:
+        """ Removes the board displaying the given model.
+
+        Raises
+        ------
+        ValueError
+            If no board displays the given model.
+        """
+
+        view = self._boardView(model)
+        model.moveMade.disconnect(view.onMoveMade)
+        self._boards.remove(view)
+        del self._viewOfModel[model]
+        self._pending.pop(id(view), None)
+        self.update()
+
+    def models(self) -> List[BoardModel]:
+        """ Returns the models of the boards in the order in which they are displayed. """
+        return [view.model for view in self._boards]
+
+    def updateBoard(self, model: BoardModel) -> None:
+        """ Schedules rendering the board displaying the given model. The board is only rendered
+        again if its position has changed.
+        """
+        self._schedule(self._boardView(model))
+
+    def updateBoards(self) -> None:
+        """ Schedules rendering all the boards, e.g. after the colors of the squares have been changed. """
+
+        self._backgrounds.clear()
+        for view in self._boards:
+            view.key = None
+            self._schedule(view)
+
+    def isFlipped(self, model: BoardModel) -> bool:
+        return self._boardView(model).flipped
+
+    def setFlipped(self, model: BoardModel, flipped: bool) -> None:
+        """ Flips the board displaying the given model, see `BoardWidget.flipped`. """
+
+        view = self._boardView(model)
+        if view.flipped != flipped:
+            view.flipped = flipped
+            self._schedule(view)
+
+    def boardSize(self) -> int:
+        """ The size of a board in pixels. Boards are as big as possible while all of them fit into the view. """
+
+        columns = max(1, min(self.columns, len(self._boards)))
+        rows = max(1, -(-len(self._boards) // columns))
+        width = (self.width() - (columns - 1) * self.spacing) // columns
+        height = (self.height() - (rows - 1) * self.spacing) // rows
+        # a multiple of 8, so that all the cells are of the same size
+        return max(8, min(width, height) // 8 * 8)
+
+    def boardRect(self, model: BoardModel) -> QtCore.QRect:
+        """ Returns the rectangle in which the board displaying the given model is painted. """
+        return self._boardRect(self._boards.index(self._boardView(model)))
+
+    def boardAt(self, pos: QtCore.QPoint) -> Optional[BoardModel]:
+        """ Returns the model of the board at the given position of the view, if there is one. """
+
+        size = self.boardSize()
+        column, x = divmod(pos.x(), size + self.spacing)
+        row, y = divmod(pos.y(), size + self.spacing)
+        i = row * self.columns + column
+        if x < size and y < size and 0 <= column < self.columns and 0 <= i < len(self._boards):
+            return self._boards[i].model
+        return None
+
+    def squareAt(self, pos: QtCore.QPoint) -> Optional[chess.Square]:
+        """ Returns the square at the given position of the view, if it is on a board. """
+
+        model = self.boardAt(pos)
+        if model is None:
+            return None
+
+        rect = self.boardRect(model)
+        cellSize = rect.width() // 8
+        index = 8 * ((pos.y() - rect.y()) // cellSize) + (pos.x() - rect.x()) // cellSize
+        # the mapping of cellIndexOfSquare is its own inverse
+        return cellIndexOfSquare(index, self.isFlipped(model))
+
+    def boardPixmap(self, model: BoardModel) -> Optional[QtGui.QPixmap]:
+        """ Returns the last rendered pixmap of the board displaying the given model,
+        or None if it hasn't been rendered yet.
+        """
+        return self._boardView(model).pixmap
+
+    def mouseReleaseEvent(self, e: QtGui.QMouseEvent) -> None:
+        model = self.boardAt(e.pos())
+        if model is not None and e.button() == QtCore.Qt.LeftButton:
+            self.boardClicked.emit(model)
+        super().mouseReleaseEvent(e)
+
+    def resizeEvent(self, e: QtGui.QResizeEvent) -> None:
+        super().resizeEvent(e)
+        for view in self._boards:
+            self._schedule(view)
+
+    def paintEvent(self, e: QtGui.QPaintEvent) -> None:
+        painter = QtGui.QPainter(self)
+        for i, view in enumerate(self._boards):
+            rect = self._boardRect(i)
+            if view.pixmap is not None and rect.intersects(e.rect()):
+                painter.drawPixmap(rect.topLeft(), view.pixmap)
+        painter.end()
+
+    def _boardView(self, model: BoardModel) -> _BoardView:
+        view = self._viewOfModel.get(model)
+        if view is None:
+            raise ValueError("the model is not displayed by the view")
+        return view
+
+    def _boardRect(self, i: int) -> QtCore.QRect:
+        size = self.boardSize()
+        row, column = divmod(i, self.columns)
+        return QtCore.QRect(column * (size + self.spacing), row * (size + self.spacing), size, size)
+
+    def _onMoveMade(self, view: _BoardView, san: str) -> None:
+        self._schedule(view)
+
+    def _schedule(self, view: _BoardView) -> None:
+        self._pending[id(view)] = view
+        if not self._frameTimer.isActive():
+            self._frameTimer.start(self.frameInterval)
+
+    @QtCore.Slot()
+    def _renderFrame(self) -> None:
+        size = self.boardSize()
+        deadline = time.perf_counter() + self.frameBudget
+        # positions are compared by their pieces, the last move and the side in check
+        while self._pending:
+            _, view = self._pending.popitem(last=False)
+            board = view.model.board
+            key = (size, view.flipped, board.occupied_co[chess.WHITE], board.occupied_co[chess.BLACK],
+                   board.pawns, board.knights, board.bishops, board.rooks, board.queens, board.kings,
+                   board.move_stack[-1] if board.move_stack else None, board.is_check() and board.turn)
+            if key != view.key:
+                view.pixmap = self._renderBoard(view, size)
+                view.key = key
+                self.update(self._boardRect(self._boards.index(view)))
+            if time.perf_counter() >= deadline:
+                break
+
+        if self._pending:
+            self._frameTimer.start(self.frameInterval)
+
+    def _renderBoard(self, view: _BoardView, size: int) -> QtGui.QPixmap:
+        board = view.model.board
+        cellSize = QtCore.QSize(size // 8, size // 8)
+
+        pixmap = QtGui.QPixmap(self._background(size))
+        painter = QtGui.QPainter(pixmap)
+
+        def drawAt(square: chess.Square, cellPixmap: QtGui.QPixmap) -> None:
+            row, column = divmod(cellIndexOfSquare(square, view.flipped), 8)
+            painter.drawPixmap(column * cellSize.width(), row * cellSize.height(), cellPixmap)
+
+        if board.move_stack:
+            move = board.peek()
+            for square in (move.from_square, move.to_square):
+                drawAt(square, piecePixmapCache.overlayPixmap("justMoved", cellSize))
+        if board.is_check():
+            king = board.king(board.turn)
+            if king is not None:
+                drawAt(king, piecePixmapCache.overlayPixmap("inCheck", cellSize))
+        for square, piece in board.piece_map().items():
+            drawAt(square, piecePixmapCache.piecePixmap(piece, cellSize))
+
+        painter.end()
+        return pixmap
+
+    def _background(self, size: int) -> QtGui.QPixmap:
+        # the empty board looks the same when it is flipped
+        background = self._backgrounds.get(size)
+        if background is None:
+            background = QtGui.QPixmap(size, size)
+            background.fill(self.lightSquareColor)
+            painter = QtGui.QPainter(background)
+            cellSize = size // 8
+            for index in range(64):
+                row, column = divmod(index, 8)
+                if (row + column) % 2:
+                    painter.fillRect(column * cellSize, row * cellSize, cellSize, cellSize, self.darkSquareColor)
+            painter.end()
+            self._backgrounds = {size: background}
+        return background
+
+
+hotPaths.register(CellWidget, "_polish", "CellWidget.polish")
+hotPaths.register(BoardWidget, "_synchronize", "BoardWidget.synchronize")
+hotPaths.register(MultiBoardView, "_renderFrame", "MultiBoardView.renderFrame")
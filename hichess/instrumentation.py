@@ -0,0 +1,225 @@
+# -*- coding: utf-8 -*-
+#
+# This file is part of the hichesslib project.
+# Copyright (C) 2019-2020 Haik Sargsian <haiksargsian6@gmail.com>
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>.
+
+""" Opt-in timing of the hot paths of the library.
+The instrumented methods are only replaced by timing wrappers while the instrumentation
+is enabled, so it costs nothing when it is disabled.
+"""
+
+import concurrent.futures
+import json
+import logging
+import os
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from functools import wraps
+from typing import Optional, Callable, Any, Deque, Dict, Iterator, List, Tuple
+
+from hichess.callback import Callback
+
+
+class OperationStats:
+    """ The number of calls and the time spent in an instrumented operation.
+    The times are in seconds.
+    """
+
+    def __init__(self, calls: int = 0, totalTime: float = 0.0, maxTime: float = 0.0):
+        self.calls = calls
+        self.totalTime = totalTime
+        self.maxTime = maxTime
+
+    @property
+    def meanTime(self) -> float:
+        return self.totalTime / self.calls if self.calls else 0.0
+
+    def toDict(self) -> Dict[str, float]:
+        return {"calls": self.calls, "totalTime": self.totalTime,
+                "meanTime": self.meanTime, "maxTime": self.maxTime}
+
+    def __repr__(self) -> str:
+        return f"OperationStats(calls={self.calls}, totalTime={self.totalTime}, maxTime={self.maxTime})"
+
+
+class Instrumentation:
+    """ Records the call counts and the cumulative time of registered methods.
+
+    Methods are registered with `register`. While the instrumentation is enabled they are
+    replaced by wrappers that time every call, after `disable` the original methods are
+    restored. If a method returns a `concurrent.futures.Future` (e.g. the engine searches),
+    the call lasts until the future is done.
+
+    Attributes
+    ----------
+    recorded : `Callback`
+        Called with the name of the operation, its start time (`time.perf_counter`) and
+        its duration in seconds after every recorded call. It can be called from the
+        threads of the engines.
+
+    maxEvents : int
+        The maximum number of calls kept for `dumpChromeTrace` when tracing is enabled.
+
+    Examples
+    --------
+    >>> hichess.hotPaths.enable(trace=True)
+    >>> boardWidget.push(chess.Move.from_uci("e2e4"))
+    >>> hichess.hotPaths.stats()["BoardWidget.synchronize"].calls
+    1
+    >>> hichess.hotPaths.dumpChromeTrace("trace.json")
+    >>> hichess.hotPaths.disable()
+    """
+
+    def __init__(self, maxEvents: int = 100000):
+        self.recorded = Callback()
+        self.maxEvents = maxEvents
+
+        self._targets: List[Tuple[type, str, str]] = []
+        self._originals: Dict[Tuple[type, str], Callable[..., Any]] = {}
+        self._stats: Dict[str, OperationStats] = {}
+        self._events: Deque[Tuple[str, float, float, int]] = deque(maxlen=maxEvents)
+        self._trace = False
+        self._enabled = False
+        self._lock = threading.Lock()
+
+    def register(self, owner: type, attribute: str, name: Optional[str] = None) -> None:
+        """ Registers the method `attribute` of the class `owner` under the given name,
+        by default "<class name>.<method name>". Methods registered while the instrumentation
+        is enabled, e.g. by modules of hichess imported lazily, are instrumented at once.
+        """
+
+        target = (owner, attribute, name or f"{owner.__name__}.{attribute}")
+        self._targets.append(target)
+        if self.isEnabled():
+            self._instrument(*target)
+
+    def isEnabled(self) -> bool:
+        return self._enabled
+
+    def enable(self, trace: bool = False) -> None:
+        """ Starts timing the registered methods. If `trace` is True, every call is kept
+        for `dumpChromeTrace` as well.
+        """
+
+        self._trace = trace
+        if self._events.maxlen != self.maxEvents:
+            self._events = deque(self._events, maxlen=self.maxEvents)
+        if not self.isEnabled():
+            self._enabled = True
+            for target in self._targets:
+                self._instrument(*target)
+
+    def disable(self) -> None:
+        """ Restores the original methods. The recorded stats are kept until `reset`. """
+
+        self._enabled = False
+        for (owner, attribute), original in self._originals.items():
+            setattr(owner, attribute, original)
+        self._originals.clear()
+
+    def stats(self) -> Dict[str, OperationStats]:
+        """ Returns a copy of the stats of the operations that have been called. """
+
+        with self._lock:
+            return {name: OperationStats(s.calls, s.totalTime, s.maxTime) for name, s in self._stats.items()}
+
+    def reset(self) -> None:
+        with self._lock:
+            self._stats.clear()
+            self._events.clear()
+
+    @contextmanager
+    def measure(self, name: str) -> Iterator[None]:
+        """ A context manager that records the time spent in its block as a call of
+        the operation with the given name, if the instrumentation is enabled.
+        """
+
+        if not self.isEnabled():
+            yield
+            return
+
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(name, start, time.perf_counter() - start)
+
+    def record(self, name: str, start: float, duration: float) -> None:
+        with self._lock:
+            stats = self._stats.get(name)
+            if stats is None:
+                stats = self._stats[name] = OperationStats()
+            stats.calls += 1
+            stats.totalTime += duration
+            stats.maxTime = max(stats.maxTime, duration)
+            if self._trace:
+                self._events.append((name, start, duration, threading.get_ident()))
+        self.recorded.emit(name, start, duration)
+
+    def logStats(self, logger: Optional[logging.Logger] = None, level: int = logging.INFO) -> None:
+        """ Logs one record per operation. The stats are attached to the records as the
+        attributes `operation` and `stats`, so that structured log handlers can use them.
+        """
+
+        logger = logger or logging.getLogger(__name__)
+        for name, stats in sorted(self.stats().items()):
+            logger.log(level, "%s: %d calls, %.3f ms total, %.3f ms mean, %.3f ms max",
+                       name, stats.calls, 1000 * stats.totalTime, 1000 * stats.meanTime, 1000 * stats.maxTime,
+                       extra={"operation": name, "stats": stats.toDict()})
+
+    def dumpChromeTrace(self, path: str) -> None:
+        """ Writes the traced calls in the Chrome trace event format, which can be opened
+        with chrome://tracing or Perfetto. Calls are traced only if the instrumentation
+        has been enabled with `trace` set to True.
+        """
+
+        with self._lock:
+            events = list(self._events)
+
+        pid = os.getpid()
+        traceEvents = [{"name": name, "cat": "hichess", "ph": "X", "pid": pid, "tid": tid,
+                        "ts": 1e6 * start, "dur": 1e6 * duration}
+                       for name, start, duration, tid in events]
+        with open(path, "w") as f:
+            json.dump({"traceEvents": traceEvents, "displayTimeUnit": "ms"}, f)
+
+    def _instrument(self, owner: type, attribute: str, name: str) -> None:
+        original = owner.__dict__[attribute]
+        self._originals[(owner, attribute)] = original
+        setattr(owner, attribute, self._timed(original, name))
+
+    def _timed(self, function: Callable[..., Any], name: str) -> Callable[..., Any]:
+        @wraps(function)
+        def wrapper(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                result = function(*args, **kwargs)
+            except BaseException:
+                self.record(name, start, time.perf_counter() - start)
+                raise
+
+            if isinstance(result, concurrent.futures.Future):
+                result.add_done_callback(lambda _: self.record(name, start, time.perf_counter() - start))
+            else:
+                self.record(name, start, time.perf_counter() - start)
+            return result
+        return wrapper
+
+
+hotPaths = Instrumentation()
+""" The `Instrumentation` of the hot paths of the library. """
@@ -0,0 +1,223 @@
+# -*- coding: utf-8 -*-
+#
+# This file is part of the hichesslib project.
+# Copyright (C) 2019-2020 Haik Sargsian <haiksargsian6@gmail.com>
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>.
+
+""" Optional bindings to chessplusplus, the bitboard board written in C++.
+
+The library is built with CMake from the root of the repository, e.g.
+``cmake -S . -B build && cmake --build build``, which puts it into the hichess package.
+It can also be loaded from the path in the environment variable ``HICHESS_NATIVE_LIBRARY``.
+Everything in hichess works without it, python-chess is used instead.
+"""
+
+import ctypes
+import ctypes.util
+import logging
+import os
+from typing import Optional, List, Tuple
+
+import chess
+
+
+logger = logging.getLogger(__name__)
+
+_LIBRARY_NAMES = ["libchessplusplus.so", "libchessplusplus.dylib", "chessplusplus.dll", "libchessplusplus.dll"]
+# more than the 218 legal moves of any valid position
+_MAX_MOVES = 256
+
+_library: Optional[ctypes.CDLL] = None
+_loaded = False
+
+
+def _findLibrary() -> Optional[str]:
+    path = os.environ.get("HICHESS_NATIVE_LIBRARY")
+    if path:
+        return path
+
+    here = os.path.dirname(os.path.abspath(__file__))
+    for name in _LIBRARY_NAMES:
+        path = os.path.join(here, name)
+        if os.path.exists(path):
+            return path
+    return ctypes.util.find_library("chessplusplus")
+
+
+def _load() -> Optional[ctypes.CDLL]:
+    global _library, _loaded
+    if _loaded:
+        return _library
+    _loaded = True
+
+    path = _findLibrary()
+    if path is None:
+        return None
+    try:
+        library = ctypes.CDLL(path)
+    except OSError as e:
+        logger.warning("Could not load %s: %s", path, e)
+        return None
+
+    bitboards = ctypes.POINTER(ctypes.c_uint64)
+    library.chessplusplus_board_new.restype = ctypes.c_void_p
+    library.chessplusplus_board_new.argtypes = []
+    library.chessplusplus_board_free.restype = None
+    library.chessplusplus_board_free.argtypes = [ctypes.c_void_p]
+    library.chessplusplus_board_set_fen.restype = ctypes.c_int
+    library.chessplusplus_board_set_fen.argtypes = [ctypes.c_void_p, ctypes.c_char_p]
+    library.chessplusplus_board_set_position.restype = None
+    library.chessplusplus_board_set_position.argtypes = [ctypes.c_void_p, bitboards, ctypes.c_int, ctypes.c_uint64,
+                                                         ctypes.c_int, ctypes.c_int, ctypes.c_int]
+    library.chessplusplus_board_bitboards.restype = None
+    library.chessplusplus_board_bitboards.argtypes = [ctypes.c_void_p, bitboards]
+    library.chessplusplus_board_turn.restype = ctypes.c_int
+    library.chessplusplus_board_turn.argtypes = [ctypes.c_void_p]
+    library.chessplusplus_board_is_check.restype = ctypes.c_int
+    library.chessplusplus_board_is_check.argtypes = [ctypes.c_void_p]
+    library.chessplusplus_board_legal_moves.restype = ctypes.c_int
+    library.chessplusplus_board_legal_moves.argtypes = [ctypes.c_void_p, ctypes.POINTER(ctypes.c_uint16), ctypes.c_int]
+    library.chessplusplus_board_perft.restype = ctypes.c_uint64
+    library.chessplusplus_board_perft.argtypes = [ctypes.c_void_p, ctypes.c_int]
+
+    _library = library
+    return _library
+
+
+def isAvailable() -> bool:
+    """ Indicates if the chessplusplus library has been found and loaded. """
+    return _load() is not None
+
+
+def supports(board: chess.Board) -> bool:
+    """ Indicates if the position of the given board can be handled by `NativeBoard`.
+    Only valid positions of standard chess are supported, neither Chess960 nor the variants of python-chess.
+    """
+    return type(board) is chess.Board and not board.chess960 and board.is_valid()
+
+
+def bitboards(board: chess.Board) -> Tuple[int, ...]:
+    """ Returns the bitboards of the white pieces, the black pieces, the pawns, the knights,
+    the bishops, the rooks, the queens and the kings of the given board.
+    """
+    return (board.occupied_co[chess.WHITE], board.occupied_co[chess.BLACK], board.pawns,
+            board.knights, board.bishops, board.rooks, board.queens, board.kings)
+
+
+def changedSquares(old: Tuple[int, ...], new: Tuple[int, ...]) -> chess.Bitboard:
+    """ Returns the squares whose pieces differ between two tuples of `bitboards`.
+
+    Note that this function is always computed in Python, as a call into the library costs
+    more than the eight XORs.
+    """
+
+    changed = 0
+    for a, b in zip(old, new):
+        changed |= a ^ b
+    return changed
+
+
+class NativeBoard:
+    """ A board of the chessplusplus library, used for fast FEN parsing and legal move generation.
+
+    Raises
+    ------
+    RuntimeError
+        If the library isn't available, see `isAvailable`.
+
+    Examples
+    --------
+    >>> nativeBoard = NativeBoard()
+    >>> len(nativeBoard.legalMoves())
+    20
+    >>> nativeBoard.perft(3)
+    8902
+    """
+
+    def __init__(self, fen: Optional[str] = chess.STARTING_FEN):
+        library = _load()
+        if library is None:
+            raise RuntimeError("the chessplusplus library is not available")
+
+        self._library = library
+        self._handle = library.chessplusplus_board_new()
+        self._bitboards = (ctypes.c_uint64 * 8)()
+        self._moves = (ctypes.c_uint16 * _MAX_MOVES)()
+        if fen is not None:
+            self.setFen(fen)
+        else:
+            self.setFen("8/8/8/8/8/8/8/8 w - - 0 1")
+
+    def __del__(self):
+        handle = getattr(self, "_handle", None)
+        if handle:
+            self._library.chessplusplus_board_free(handle)
+            self._handle = None
+
+    def setFen(self, fen: str) -> None:
+        """ Sets the position from the given fen.
+
+        Raises
+        ------
+        ValueError
+            If the fen is invalid.
+        """
+
+        if self._library.chessplusplus_board_set_fen(self._handle, fen.encode()) != 0:
+            raise ValueError(f"invalid fen: {fen!r}")
+
+    def setBoard(self, board: chess.Board) -> None:
+        """ Sets the position of the given python-chess board, without going through a fen. """
+
+        self._bitboards[:] = bitboards(board)
+        self._library.chessplusplus_board_set_position(
+            self._handle, self._bitboards, board.turn, board.clean_castling_rights(),
+            -1 if board.ep_square is None else board.ep_square, board.halfmove_clock, board.fullmove_number)
+
+    def bitboards(self) -> Tuple[int, ...]:
+        """ Returns the bitboards of the position in the order of the function `bitboards`. """
+
+        self._library.chessplusplus_board_bitboards(self._handle, self._bitboards)
+        return tuple(self._bitboards)
+
+    def pieceMap(self) -> dict:
+        """ Returns the pieces of the position, as `chess.BaseBoard.piece_map` does. """
+
+        white, black, *pieceTypes = self.bitboards()
+        pieces = {}
+        for pieceType, bb in zip(chess.PIECE_TYPES, pieceTypes):
+            for square in chess.scan_forward(bb):
+                pieces[square] = chess.Piece(pieceType, bool(white & chess.BB_SQUARES[square]))
+        return pieces
+
+    def turn(self) -> chess.Color:
+        return bool(self._library.chessplusplus_board_turn(self._handle))
+
+    def isCheck(self) -> bool:
+        return bool(self._library.chessplusplus_board_is_check(self._handle))
+
+    def legalMoves(self) -> List[chess.Move]:
+        """ Returns the legal moves of the position. """
+
+        n = self._library.chessplusplus_board_legal_moves(self._handle, self._moves, len(self._moves))
+        if n > len(self._moves):
+            # only possible in invalid positions, the moves that didn't fit are generated again
+            self._moves = (ctypes.c_uint16 * n)()
+            n = self._library.chessplusplus_board_legal_moves(self._handle, self._moves, n)
+        return [chess.Move(code & 63, code >> 6 & 63, code >> 12 or None) for code in self._moves[:n]]
+
+    def perft(self, depth: int) -> int:
+        """ Returns the number of leaf nodes of the tree of legal moves of the given depth. """
+        return self._library.chessplusplus_board_perft(self._handle, depth)
@@ -13,7 +13,7 @@ setup(
   download_url = "https://github.com/H-a-y-k/hichesslib/archive/v1.2.10.tar.gz",
   keywords = ["chess", "Qt", "PySide2", "GUI"],
   install_requires= [
-          "python_chess",
+          "python_chess>=1.0,<2",
           "PySide2"
       ],
   classifiers=[
@@ -23,9 +23,8 @@ setup(
     "Topic :: Games/Entertainment :: Board Games",
     "Topic :: Games/Entertainment :: Turn Based Strategy",
     "License :: OSI Approved :: GNU General Public License v3 or later (GPLv3+)",
-    "Programming Language :: Python :: 3.6",
     "Programming Language :: Python :: 3.7",
     "Programming Language :: Python :: 3 :: Only",
   ],
-  python_requires='>=3.6'
+  python_requires='>=3.7'
 )
\ No newline at end of file
@@ -0,0 +1,515 @@
+# -*- coding: utf-8 -*-
+#
+# This file is part of the HiChess project.
+# Copyright (C) 2019-2020 Haik Sargsian <haiksargsian6@gmail.com>
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>.
+
+""" Benchmarks of the hot paths of `BoardWidget`.
+
+The benchmarks run offscreen with the stylesheet of the examples applied, so that the
+cost of repolishing the cell widgets is measured as well. The results are written as JSON
+and compared with a stored baseline, e.g.
+
+    python benchmark_hichess.py --output results.json
+    python benchmark_hichess.py --save-baseline
+
+The script exits with status 1 if the median time of a benchmark is slower than the
+baseline median by more than its tolerance, a fraction of the baseline median. It is the
+one given on the command line, or a larger one the benchmark is registered with. On a shared
+machine whose speed drifts from one process to the next, a larger one is given, e.g.
+
+    python benchmark_hichess.py --processes 3 --tolerance 0.5
+
+The baseline only stores the summary of the samples: the median, the 90th percentile, the
+number of samples and the extremes.
+
+The baseline is recorded again on the machine the benchmarks are compared on, after a change
+that makes them faster on purpose or when a benchmark is added. As the speed of a machine often
+differs between two processes, it is best recorded from several processes, and the results are
+steadier when compared in the same way, e.g.
+
+    python benchmark_hichess.py --save-baseline --rounds 3 --processes 5
+    python benchmark_hichess.py --processes 3
+"""
+
+import os
+
+os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+
+from context import hichess
+import chess
+import chess.pgn
+
+from PySide2.QtWidgets import QApplication
+
+import argparse
+import json
+import math
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+ROOT = os.path.dirname(HERE)
+GAMES = os.path.join(HERE, "games")
+STYLESHEET = os.path.join(HERE, "..", "examples", "style", "styles.css")
+BASELINE = os.path.join(HERE, "benchmarks", "baseline.json")
+
+# shorter samples are dominated by the noise of the machine
+MIN_SAMPLE_TIME = 0.02
+
+BENCHMARKS = {}
+RATES = {}
+TOLERANCES = {}
+
+
+def benchmark(name, count=None, unit=None, tolerance=None):
+    """ Registers a benchmark. The decorated function receives the loaded games, prepares
+    everything it needs and returns the function whose calls are timed.
+    If each call processes `count` items, e.g. boards, their number per second is reported
+    as well. A benchmark that is noisy by nature can be given a larger `tolerance` than the
+    default one, with the reason next to it.
+    """
+
+    def decorator(setup):
+        BENCHMARKS[name] = setup
+        if count is not None:
+            RATES[name] = (count, unit)
+        if tolerance is not None:
+            TOLERANCES[name] = tolerance
+        return setup
+    return decorator
+
+
+def loadGames():
+    games = []
+    for gameName in sorted(os.listdir(GAMES)):
+        with open(os.path.join(GAMES, gameName)) as pgn:
+            games.append(chess.pgn.read_game(pgn))
+    return games
+
+
+def longestGame(games):
+    return max(games, key=lambda game: len(list(game.mainline_moves())))
+
+
+def shownBoardWidget():
+    # the cells are only polished by the stylesheet once they have been shown
+    boardWidget = hichess.BoardWidget()
+    boardWidget.resize(480, 480)
+    boardWidget.show()
+    QApplication.processEvents()
+    return boardWidget
+
+
+def replay(boardWidget, game):
+    boardWidget.setFen(game.board().fen())
+    for move in game.mainline_moves():
+        boardWidget.makeMove(move)
+
+
+@benchmark("construction")
+def constructionBenchmark(games):
+    return hichess.BoardWidget
+
+
+@benchmark("boardsPerSecond", count=30, unit="boards")
+def boardsPerSecondBenchmark(games):
+    # e.g. a screen of 30 boards
+    return lambda: [hichess.BoardWidget() for _ in range(30)]
+
+
+@benchmark("lazyBoardsPerSecond", count=30, unit="boards")
+def lazyBoardsPerSecondBenchmark(games):
+    return lambda: [hichess.BoardWidget(lazyCells=True) for _ in range(30)]
+
+
+@benchmark("setFen")
+def setFenBenchmark(games):
+    boardWidget = shownBoardWidget()
+    fens = []
+    for game in games:
+        board = game.board()
+        for move in game.mainline_moves():
+            board.push(move)
+        fens.append(board.fen())
+
+    def run():
+        for fen in fens:
+            boardWidget.setFen(fen)
+        boardWidget.setFen(chess.STARTING_FEN)
+    return run
+
+
+@benchmark("push")
+def pushBenchmark(games):
+    boardWidget = shownBoardWidget()
+    moves = list(longestGame(games).mainline_moves())
+    fen = longestGame(games).board().fen()
+
+    def run():
+        boardWidget.setFen(fen)
+        for move in moves:
+            boardWidget.push(move)
+    return run
+
+
+@benchmark("makeMove")
+def makeMoveBenchmark(games):
+    boardWidget = shownBoardWidget()
+    game = longestGame(games)
+    return lambda: replay(boardWidget, game)
+
+
+@benchmark("popAndUnpop")
+def popAndUnpopBenchmark(games):
+    boardWidget = shownBoardWidget()
+    replay(boardWidget, longestGame(games))
+    n = len(boardWidget.board.move_stack)
+
+    def run():
+        for _ in range(n):
+            boardWidget.pop()
+        for _ in range(n):
+            boardWidget.unpop()
+    return run
+
+
+@benchmark("goToMove")
+def goToMoveBenchmark(games):
+    boardWidget = shownBoardWidget()
+    replay(boardWidget, longestGame(games))
+    n = len(boardWidget.board.move_stack)
+    plies = [0, n, n // 2, 1, n - 1, n // 3, 2 * n // 3, n]
+
+    def run():
+        for ply in plies:
+            boardWidget.goToMove(ply)
+    return run
+
+
+@benchmark("highlightLegalMoveCellsFor")
+def highlightBenchmark(games):
+    boardWidget = shownBoardWidget()
+    replay(boardWidget, longestGame(games))
+    boardWidget.goToMove(len(boardWidget.board.move_stack) // 2)
+    cells = [boardWidget.cellWidgetAtSquare(square)
+             for square in chess.SquareSet(boardWidget.board.occupied_co[boardWidget.board.turn])]
+
+    def run():
+        for w in cells:
+            boardWidget.highlightLegalMoveCellsFor(w)
+            boardWidget.unhighlightCells()
+    return run
+
+
+@benchmark("flip")
+def flipBenchmark(games):
+    boardWidget = shownBoardWidget()
+    replay(boardWidget, longestGame(games))
+
+    def run():
+        boardWidget.flip()
+        boardWidget.flip()
+    return run
+
+
+@benchmark("synchronizeAndUpdateStyles")
+def synchronizeBenchmark(games):
+    boardWidget = shownBoardWidget()
+    replay(boardWidget, longestGame(games))
+
+    def run():
+        boardWidget.synchronizeAndUpdateStyles()
+        boardWidget.synchronizeAndUpdateStyles(full=True)
+    return run
+
+
+@benchmark("pgnReplay")
+def pgnReplayBenchmark(games):
+    boardWidget = shownBoardWidget()
+
+    def run():
+        for game in games:
+            replay(boardWidget, game)
+    return run
+
+
+@benchmark("loadGame")
+def loadGameBenchmark(games):
+    boardWidget = shownBoardWidget()
+
+    def run():
+        for game in games:
+            boardWidget.loadGame(game)
+            boardWidget.loadGame(game, ply=0)
+    return run
+
+
+@benchmark("multiBoardViewFrame")
+def multiBoardViewBenchmark(games):
+    # a frame in which each of 100 boards has a new position
+    view = hichess.MultiBoardView(columns=10)
+    view.resize(1000, 1000)
+    view.frameBudget = float("inf")
+    models = [view.addBoard() for _ in range(100)]
+    for i, model in enumerate(models):
+        model.loadGame(games[i % len(games)], ply=0)
+
+    def run():
+        for model in models:
+            if model.popStack:
+                model.unpop()
+            else:
+                model.goToMove(0)
+            view.updateBoard(model)
+        view._renderFrame()
+    return run
+
+
+def importBenchmark(statement):
+    # each call imports hichess in a new interpreter, whose startup is timed as well,
+    # which makes these benchmarks depend on the file system cache, hence their tolerance of 0.5
+    code = f"import sys; sys.path.insert(0, {ROOT!r}); import hichess; {statement}"
+    return lambda: subprocess.run([sys.executable, "-c", code], check=True)
+
+
+@benchmark("importHichess", tolerance=0.5)
+def importHichessBenchmark(games):
+    return importBenchmark("hichess.__version__")
+
+
+@benchmark("importBoardModel", tolerance=0.5)
+def importBoardModelBenchmark(games):
+    return importBenchmark("hichess.BoardModel()")
+
+
+@benchmark("importEngineWrapper", tolerance=0.5)
+def importEngineWrapperBenchmark(games):
+    return importBenchmark("hichess.EngineWrapper")
+
+
+@benchmark("importBoardWidget", tolerance=0.5)
+def importBoardWidgetBenchmark(games):
+    return importBenchmark("hichess.BoardWidget")
+
+
+def measure(run, repeat, number):
+    """ Calls `run` `number` times per sample and returns the seconds per call of each sample. """
+
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for _ in range(number):
+            run()
+        samples.append((time.perf_counter() - start) / number)
+        QApplication.processEvents()
+    return samples
+
+
+def callsPerSample(seconds):
+    """ Returns the number of calls per sample, so that a sample of calls that take the given
+    seconds lasts at least `MIN_SAMPLE_TIME`.
+    """
+    return max(1, math.ceil(MIN_SAMPLE_TIME / seconds)) if seconds > 0 else 1
+
+
+def summarize(name, samples, repeat, number, rounds, keepSamples=False):
+    """ Returns the result of the benchmark `name` from the seconds per call of its samples.
+    The samples themselves are only kept if `keepSamples` is True.
+    """
+
+    samples = sorted(samples)
+    result = {
+        "min": samples[0],
+        "median": statistics.median(samples),
+        "p90": samples[int(0.9 * (len(samples) - 1))],
+        "max": samples[-1],
+        "n": len(samples),
+        "repeat": repeat,
+        "number": number,
+        "rounds": rounds,
+    }
+    if keepSamples:
+        result["samples"] = samples
+    if name in RATES:
+        count, unit = RATES[name]
+        result["perSecond"] = count / result["min"]
+    return result
+
+
+def printResult(name, result):
+    line = f"{name:<30} min {1000 * result['min']:9.3f} ms   median {1000 * result['median']:9.3f} ms"
+    if name in RATES:
+        line += f"   {result['perSecond']:9.0f} {RATES[name][1]}/s"
+    print(line)
+
+
+def runBenchmarks(names, repeat, number=None, rounds=1, keepSamples=False):
+    """ Runs the given benchmarks. In each of the `rounds` a benchmark is set up again and
+    sampled `repeat` times, the samples of all the rounds are summarized together.
+    If `number` is None, the number of calls per sample is found with `callsPerSample`.
+    """
+
+    games = loadGames()
+    results = {}
+    for name in names:
+        samples = []
+        calls = number
+        for _ in range(rounds):
+            run = BENCHMARKS[name](games)
+            start = time.perf_counter()
+            run()  # warm up the caches
+            if calls is None:
+                calls = callsPerSample(time.perf_counter() - start)
+            samples += measure(run, repeat, calls)
+        results[name] = summarize(name, samples, repeat, calls, rounds, keepSamples)
+        printResult(name, results[name])
+    return results
+
+
+def runInProcesses(names, repeat, number, rounds, processes, stylesheet):
+    """ Runs the given benchmarks in `processes` new interpreters one after another and
+    summarizes the samples of all of them together. The speed of the machine often differs
+    more between two processes than within one, which a baseline should cover.
+    """
+
+    samples = {name: [] for name in names}
+    with tempfile.TemporaryDirectory() as directory:
+        output = os.path.join(directory, "results.json")
+        command = [sys.executable, os.path.abspath(__file__), *names, "--repeat", str(repeat),
+                   "--rounds", str(rounds), "--output", output, "--samples",
+                   "--baseline", os.path.join(directory, "none.json")]
+        if number is not None:
+            command += ["--number", str(number)]
+        if not stylesheet:
+            command.append("--no-stylesheet")
+
+        calls = {}
+        for _ in range(processes):
+            subprocess.run(command, check=True, stdout=subprocess.DEVNULL)
+            with open(output) as f:
+                for name, result in json.load(f)["results"].items():
+                    samples[name] += result["samples"]
+                    calls[name] = result["number"]
+
+    results = {}
+    for name in names:
+        results[name] = summarize(name, samples[name], repeat, calls[name], rounds * processes)
+        printResult(name, results[name])
+    return results
+
+
+def benchmarkTolerance(name, tolerance):
+    """ Returns the tolerance of the benchmark `name`, a fraction of its baseline median:
+    the given `tolerance` or the one the benchmark is registered with if it is larger.
+    """
+
+    return max(tolerance, TOLERANCES.get(name, 0.0))
+
+
+def compare(results, baseline, tolerance):
+    """ Returns the names of the benchmarks whose median time is slower than in `baseline`
+    by more than their tolerance (see `benchmarkTolerance`). The medians are compared, as
+    a single lucky sample can't hide a regression then. Benchmarks whose samples are all faster
+    than the baseline by more than their tolerance are reported as well, as the baseline should
+    be recorded again.
+    """
+
+    regressions = []
+    for name, result in results.items():
+        if name not in baseline:
+            continue
+        expected = baseline[name]
+        allowed = benchmarkTolerance(name, tolerance)
+        ratio = result["median"] / expected["median"] if expected["median"] else 1.0
+        if ratio > 1 + allowed:
+            status = "REGRESSION"
+            regressions.append(name)
+        elif result["max"] * (1 + allowed) < expected["median"]:
+            status = "faster, the baseline is out of date"
+        else:
+            status = "ok"
+        print(f"{name:<30} {ratio:6.2f}x of baseline (tolerance {allowed:.2f})   {status}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("benchmarks", nargs="*", help=f"the benchmarks to run, all by default: {', '.join(BENCHMARKS)}")
+    parser.add_argument("--repeat", type=int, default=7, help="the number of samples per benchmark")
+    parser.add_argument("--number", type=int,
+                        help=f"the number of calls per sample, by default enough for {MIN_SAMPLE_TIME:g} s per sample")
+    parser.add_argument("--rounds", type=int, default=1,
+                        help="the number of times each benchmark is set up and sampled")
+    parser.add_argument("--processes", type=int, default=1,
+                        help="the number of interpreters the benchmarks are run in one after another")
+    parser.add_argument("--output", help="the file where the results are written as JSON")
+    parser.add_argument("--samples", action="store_true",
+                        help="write the seconds per call of each sample as well, as needed by --processes")
+    parser.add_argument("--baseline", default=BASELINE, help="the baseline the results are compared with")
+    parser.add_argument("--save-baseline", action="store_true", help="store the results as the new baseline")
+    parser.add_argument("--tolerance", type=float, default=0.25,
+                        help="the allowed slowdown of the median, a fraction of the baseline median, 0.25 by default")
+    parser.add_argument("--no-stylesheet", action="store_true", help="don't apply the stylesheet of the examples")
+    args = parser.parse_args()
+    for name in args.benchmarks:
+        if name not in BENCHMARKS:
+            parser.error(f"unknown benchmark {name}")
+
+    app = QApplication(sys.argv[:1])
+    if not args.no_stylesheet and os.path.exists(STYLESHEET):
+        with open(STYLESHEET) as qss:
+            app.setStyleSheet(qss.read())
+
+    names = args.benchmarks or list(BENCHMARKS)
+    if args.processes > 1:
+        results = runInProcesses(names, args.repeat, args.number, args.rounds, args.processes, not args.no_stylesheet)
+    else:
+        results = runBenchmarks(names, args.repeat, args.number, args.rounds, args.samples)
+    report = {
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "stylesheet": not args.no_stylesheet,
+        "results": results,
+    }
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+
+    if args.save_baseline:
+        # the baseline only stores the summaries of the samples
+        for result in results.values():
+            result.pop("samples", None)
+        os.makedirs(os.path.dirname(args.baseline), exist_ok=True)
+        with open(args.baseline, "w") as f:
+            json.dump(report, f, indent=2)
+        return 0
+
+    if os.path.exists(args.baseline):
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        if compare(results, baseline["results"], args.tolerance):
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,124 @@
+# -*- coding: utf-8 -*-
+#
+# This file is part of the HiChess project.
+# Copyright (C) 2019-2020 Haik Sargsian <haiksargsian6@gmail.com>
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>.
+
+""" A minimal UCI engine used by the tests instead of a real engine.
+
+It always plays the legal move that comes first in UCI notation. The option ``Delay``
+makes every finite search last the given number of milliseconds. ``go infinite`` streams
+info lines until ``stop`` is received.
+"""
+
+import sys
+import threading
+import time
+
+import chess
+
+board = chess.Board()
+delay = 0
+search = None
+stopped = threading.Event()
+outputLock = threading.Lock()
+
+
+def send(line):
+    with outputLock:
+        sys.stdout.write(line + "\n")
+        sys.stdout.flush()
+
+
+def bestMoves(b, multipv):
+    return sorted(b.legal_moves, key=chess.Move.uci)[:multipv]
+
+
+def info(b, depth, multipv):
+    for i, move in enumerate(bestMoves(b, multipv)):
+        send(f"info depth {depth} multipv {i + 1} score cp {10 * depth - i} nodes {1000 * depth} "
+             f"nps 100000 pv {move.uci()}")
+
+
+def run(b, infinite, multipv):
+    depth = 1
+    deadline = time.monotonic() + delay / 1000
+    while True:
+        info(b, depth, multipv)
+        if stopped.wait(0.01 if infinite else max(0.0, min(0.01, deadline - time.monotonic()))):
+            break
+        if not infinite and time.monotonic() >= deadline:
+            break
+        depth += 1
+
+    moves = bestMoves(b, 1)
+    send(f"bestmove {moves[0].uci() if moves else '0000'}")
+
+
+def setPosition(tokens):
+    global board
+    if tokens[1] == "startpos":
+        board = chess.Board()
+        rest = tokens[2:]
+    else:
+        board = chess.Board(" ".join(tokens[2:8]))
+        rest = tokens[8:]
+    if rest and rest[0] == "moves":
+        for uci in rest[1:]:
+            board.push_uci(uci)
+
+
+def main():
+    global delay, search
+    multipv = 1
+
+    for line in sys.stdin:
+        tokens = line.split()
+        if not tokens:
+            continue
+
+        command = tokens[0]
+        if command == "uci":
+            send("id name DummyEngine")
+            send("id author hichesslib")
+            send("option name Delay type spin default 0 min 0 max 100000")
+            send("option name MultiPV type spin default 1 min 1 max 500")
+            send("uciok")
+        elif command == "isready":
+            send("readyok")
+        elif command == "setoption":
+            name = tokens[tokens.index("name") + 1]
+            value = tokens[tokens.index("value") + 1]
+            if name == "Delay":
+                delay = int(value)
+            elif name == "MultiPV":
+                multipv = int(value)
+        elif command == "position":
+            setPosition(tokens)
+        elif command == "go":
+            stopped.clear()
+            search = threading.Thread(target=run, args=(board.copy(), "infinite" in tokens, multipv))
+            search.start()
+        elif command == "stop":
+            stopped.set()
+            if search is not None:
+                search.join()
+        elif command == "quit":
+            stopped.set()
+            break
+
+
+if __name__ == "__main__":
+    main()
@@ -18,16 +18,40 @@
 
 import unittest
 from unittest.mock import patch, Mock
+from collections import deque
 
 from context import hichess
 import chess
+import chess.engine
 import chess.pgn
+import chess.polyglot
 
+from PySide2.QtCore import QEvent, QPoint, QRect, QSize, Qt, QTimer
+from PySide2.QtGui import QColor, QMouseEvent, QPixmap
+from PySide2.QtTest import QTest
 from PySide2.QtWidgets import QApplication, QSizePolicy
 
+import io
 import itertools
+import json
 import os
+import pathlib
+import subprocess
 import sys
+import time
+import tempfile
+import concurrent.futures
+
+
+ENGINE = [sys.executable, os.path.join(os.path.dirname(os.path.abspath(__file__)), "engines", "dummy_uci.py")]
+
+
+def waitUntil(condition, timeout=10):
+    deadline = time.monotonic() + timeout
+    while not condition() and time.monotonic() < deadline:
+        QApplication.processEvents()
+        time.sleep(0.005)
+    return condition()
 
 
 class CellWidgetTestCase(unittest.TestCase):
@@ -148,6 +172,10 @@ class CellWidgetTestCase(unittest.TestCase):
         mockDesignated.assert_called_once_with(False)
         self.assertFalse(self.cellWidget.isMarked())
 
+        mockDesignated.reset_mock()
+        self.cellWidget.unmark()
+        mockDesignated.assert_called_once_with(False)
+
     @patch("hichess.hichess.CellWidget.setMarked")
     def testMark(self, mockSetMarked):
         self.cellWidget.mark()
@@ -159,6 +187,55 @@ class CellWidgetTestCase(unittest.TestCase):
         mockSetMarked.assert_called_once_with(False)
 
 
+    def testPainterRendering(self):
+        self.cellWidget = hichess.CellWidget(renderMode=hichess.PAINTER_RENDERING)
+        self.assertEqual(self.cellWidget.renderMode(), hichess.PAINTER_RENDERING)
+
+        with patch.object(hichess.CellWidget, "_polish", autospec=True) as mockPolish:
+            self.cellWidget.setPiece(chess.Piece(chess.KING, chess.WHITE))
+            self.cellWidget.highlight()
+            self.cellWidget.mark()
+            self.cellWidget.check()
+            mockPolish.assert_not_called()
+
+        self.assertEqual(self.cellWidget.objectName(), "cell_white_king")
+        self.assertEqual(self.cellWidget._overlayName(), "inCheck")
+        self.cellWidget.uncheck()
+        self.assertEqual(self.cellWidget._overlayName(), "highlightedPiece")
+        self.cellWidget.unhighlight()
+        self.assertEqual(self.cellWidget._overlayName(), "marked")
+        self.assertFalse(self.cellWidget.grab().isNull())
+
+        self.cellWidget.setRenderMode(hichess.STYLESHEET_RENDERING)
+        self.assertEqual(self.cellWidget.renderMode(), hichess.STYLESHEET_RENDERING)
+
+
+class PiecePixmapCacheTestCase(unittest.TestCase):
+    def setUp(self):
+        self.cache = hichess.PiecePixmapCache(imagePath="../examples/images/{color}_{piece}.png", maxSize=4)
+
+    def testPiecePixmap(self):
+        size = QSize(40, 40)
+        piece = chess.Piece(chess.QUEEN, chess.BLACK)
+
+        pixmap = self.cache.piecePixmap(piece, size)
+        self.assertFalse(pixmap.isNull())
+        self.assertEqual(pixmap.size(), size)
+        self.assertEqual(self.cache.piecePixmap(piece, size).cacheKey(), pixmap.cacheKey())
+        self.assertEqual(self.cache.piecePixmap(piece, QSize(20, 30)).size(), QSize(20, 30))
+
+        self.cache.imagePath = "nonexistent/{color}_{piece}.png"
+        self.cache.clear()
+        self.assertTrue(self.cache.piecePixmap(piece, size).isNull())
+
+    def testOverlayPixmap(self):
+        size = QSize(10, 10)
+        for name in self.cache.overlayColors:
+            pixmap = self.cache.overlayPixmap(name, size)
+            self.assertEqual(pixmap.size(), size)
+        self.assertLessEqual(len(self.cache._scaled), self.cache.maxSize)
+
+
 class BoardWidgetTestCase(unittest.TestCase):
     def setUp(self):
         self.boardWidget = hichess.BoardWidget(fen=chess.STARTING_FEN, flipped=False, sides=hichess.NO_SIDE)
@@ -238,6 +315,30 @@ class BoardWidgetTestCase(unittest.TestCase):
                                   for move in self.boardWidget.board.legal_moves
                                   if move.from_square == self.boardWidget.squareOf(w)])
 
+    def testLegalTargets(self):
+        self.boardWidget.setFen("r3k2r/1P6/8/8/8/8/6p1/R3K2R w KQkq - 0 1")
+
+        def expected(square):
+            targets = []
+            for move in self.boardWidget.board.legal_moves:
+                if move.from_square == square and move.to_square not in targets:
+                    targets.append(move.to_square)
+            return targets
+
+        self.assertSetEqual(set(self.boardWidget.legalTargets(chess.B7)), {chess.B8, chess.A8})
+        for square in chess.SQUARES:
+            self.assertListEqual(list(self.boardWidget.legalTargets(square)), expected(square))
+
+        self.boardWidget.push(chess.Move.from_uci("e1c1"))
+        self.assertListEqual(list(self.boardWidget.legalTargets(chess.G2)), expected(chess.G2))
+        self.assertFalse(self.boardWidget.legalTargets(chess.B7))
+
+        self.boardWidget.pop()
+        self.assertListEqual(list(self.boardWidget.legalTargets(chess.E1)), expected(chess.E1))
+
+        self.boardWidget.board.push(chess.Move.from_uci("a1a8"))
+        self.assertListEqual(list(self.boardWidget.legalTargets(chess.E8)), expected(chess.E8))
+
     def testIsPseudoLegalPromotion(self):
         self.boardWidget.setFen(None)
 
@@ -356,6 +457,55 @@ class BoardWidgetTestCase(unittest.TestCase):
         self.assertEqual(self.boardWidget.board.fen(), chess.Board.starting_fen)
         self.assertDictEqual(self.boardWidget.board.piece_map(), chess.Board().piece_map())
 
+    def testIncrementalSynchronize(self):
+        setPiece = hichess.CellWidget.setPiece
+        with patch.object(hichess.CellWidget, "setPiece", autospec=True, side_effect=setPiece) as mockSetPiece:
+            self.boardWidget.push(chess.Move.from_uci("e2e4"))
+            self.assertEqual(mockSetPiece.call_count, 2)
+            mockSetPiece.reset_mock()
+
+            self.boardWidget.pop()
+            self.assertEqual(mockSetPiece.call_count, 2)
+            mockSetPiece.reset_mock()
+
+            self.boardWidget.synchronize(full=True)
+            self.assertEqual(mockSetPiece.call_count, 64)
+
+        self.boardWidget.cellWidgetAtSquare(chess.E2).toPlain()
+        self.boardWidget.synchronize()
+        self.assertTrue(self.boardWidget.cellWidgetAtSquare(chess.E2).isPlain())
+        self.boardWidget.synchronize(full=True)
+        self.assertTrue(self.boardWidget.cellWidgetAtSquare(chess.E2).isPiece())
+
+        self.boardWidget.incrementalSync = False
+        self.boardWidget.board.set_fen("8/8/8/4k3/8/8/8/4K3 w - - 0 1")
+        self.boardWidget.synchronize()
+        for square in chess.SQUARES:
+            self.assertEqual(self.boardWidget.cellWidgetAtSquare(square).getPiece(),
+                             self.boardWidget.board.piece_at(square))
+
+    def testBatchUpdates(self):
+        w = self.boardWidget.cellWidgetAtSquare(chess.E4)
+
+        with patch.object(hichess.CellWidget, "_polish", autospec=True) as mockPolish:
+            with self.boardWidget.batchUpdates():
+                w.setPiece(chess.Piece(chess.PAWN, chess.WHITE))
+                with self.boardWidget.batchUpdates():
+                    w.highlight()
+                    w.mark()
+                    w.setJustMoved(True)
+                mockPolish.assert_not_called()
+            mockPolish.assert_called_once_with(w)
+            mockPolish.reset_mock()
+
+            w.unmark()
+            mockPolish.assert_called_once_with(w)
+            mockPolish.reset_mock()
+
+            self.boardWidget.push(chess.Move.from_uci("e2e3"))
+            polishedCells = [call.args[0] for call in mockPolish.call_args_list]
+            self.assertEqual(len(polishedCells), len(set(polishedCells)))
+
     @patch("hichess.hichess.BoardWidget.synchronize")
     def testSetPieceMap(self, mockSynchronize):
         self.boardWidget = hichess.BoardWidget(fen=None)
@@ -405,6 +555,17 @@ class BoardWidgetTestCase(unittest.TestCase):
 
         mockSynchronize.assert_called_once()
 
+    def testResetFlipped(self):
+        self.boardWidget.push(chess.Move.from_uci("e2e4"))
+        self.boardWidget.flip()
+        self.boardWidget.reset()
+
+        self.assertFalse(self.boardWidget.flipped)
+        for square in chess.SQUARES:
+            w = self.boardWidget.cellWidgetAtSquare(square)
+            self.assertEqual(self.boardWidget.squareOf(w), square)
+            self.assertEqual(w.getPiece(), self.boardWidget.board.piece_at(square))
+
     def testMakeMove(self):
         for gameName in os.listdir("games"):
             with open(f"games/{gameName}") as pgn:
@@ -441,6 +602,7 @@ class BoardWidgetTestCase(unittest.TestCase):
 
                 checkmateCount = 0
                 stalemateCount = 0
+                gameOverCount = 0
 
                 self.boardWidget.moveMade.connect(mockMoveMade)
                 self.boardWidget.movePushed.connect(mockMovePushed)
@@ -453,6 +615,7 @@ class BoardWidgetTestCase(unittest.TestCase):
                     self.boardWidget.push(move)
                     checkmateCount += self.boardWidget.board.is_checkmate()
                     stalemateCount += self.boardWidget.board.is_stalemate()
+                    gameOverCount += self.boardWidget.board.outcome() is not None
 
                     mockMoveMade.assert_called_with(san)
                     mockMovePushed.assert_called_with(san)
@@ -467,7 +630,23 @@ class BoardWidgetTestCase(unittest.TestCase):
                 self.assertEqual(mockMovePushed.call_count, len(self.boardWidget.board.move_stack))
                 self.assertEqual(mockCheckmate.call_count, checkmateCount)
                 self.assertEqual(mockStalemate.call_count, stalemateCount)
-                self.assertEqual(mockGameOver.call_count, checkmateCount + stalemateCount)
+                self.assertEqual(mockGameOver.call_count, gameOverCount)
+
+    def testPushUnmarksCellsBeforeMoveMade(self):
+        boardWidget = hichess.BoardWidget()
+        boardWidget.cellWidgetAtSquare(chess.E5).mark()
+        boardWidget.cellWidgetAtSquare(chess.D4).mark()
+
+        markedCells = []
+        boardWidget.moveMade.connect(
+            lambda san: markedCells.extend(boardWidget.cellWidgets(hichess.CellWidget.isMarked)))
+        boardWidget.push(chess.Move.from_uci("e2e4"))
+        self.assertListEqual(markedCells, [])
+
+        # a move made without pushing it doesn't unmark the cells
+        boardWidget.cellWidgetAtSquare(chess.E5).mark()
+        boardWidget.makeMove(chess.Move.from_uci("e7e5"))
+        self.assertTrue(boardWidget.cellWidgetAtSquare(chess.E5).isMarked())
 
     def testPushForRaises(self):
         boardWidget = hichess.BoardWidget()
@@ -519,6 +698,163 @@ class BoardWidgetTestCase(unittest.TestCase):
         self.assertTrue(self.boardWidget.goToMove(2))
         mockUnpop.assert_called_with(2)
 
+    def testPerMoveCostIsConstant(self):
+        shuffle = [chess.Move.from_uci(uci) for uci in ["g1f3", "g8f6", "f3g1", "f6g8"]]
+
+        def nextMove():
+            return shuffle[len(self.boardWidget.board.move_stack) % 4]
+
+        def measure():
+            samples = []
+            for _ in range(5):
+                start = time.perf_counter()
+                for _ in range(4):
+                    self.boardWidget.push(nextMove())
+                self.boardWidget.makeMove(nextMove())
+                self.boardWidget.pop(2)
+                self.boardWidget.unpop()
+                self.boardWidget.pop()
+                samples.append(time.perf_counter() - start)
+            return min(samples)
+
+        times = {}
+        for ply in [10, 1000]:
+            while len(self.boardWidget.board.move_stack) < ply:
+                self.boardWidget.board.push(nextMove())
+            self.boardWidget.synchronizeAndUpdateStyles()
+            measure()  # the positions of the moves pushed directly are counted once
+
+            with patch.object(chess.Board, "copy", side_effect=AssertionError("the board is copied")):
+                times[ply] = measure()
+        self.assertLess(times[1000], 3 * times[10])
+
+    def testLoadGame(self):
+        mockMoveMade = Mock()
+        self.boardWidget.moveMade.connect(mockMoveMade)
+
+        for gameName in sorted(os.listdir("games")):
+            with open(f"games/{gameName}") as pgn:
+                game = chess.pgn.read_game(pgn)
+            moves = list(game.mainline_moves())
+            board = game.board()
+            for move in moves[:len(moves) // 2]:
+                board.push(move)
+
+            self.assertIs(self.boardWidget.loadGame(game, len(moves) // 2), game)
+            self.assertEqual(self.boardWidget.board.fen(), board.fen())
+            self.assertListEqual(self.boardWidget.board.move_stack, board.move_stack)
+            self.assertEqual(len(self.boardWidget.popStack), len(moves) - len(moves) // 2)
+            for square in chess.SQUARES:
+                self.assertEqual(self.boardWidget.cellWidgetAtSquare(square).getPiece(), board.piece_at(square))
+            if board.move_stack:
+                self.assertTrue(self.boardWidget.cellWidgetAtSquare(board.peek().to_square).justMoved)
+
+            self.boardWidget.goToMove(len(moves))
+            self.assertEqual(self.boardWidget.board.fen(), game.end().board().fen())
+        mockMoveMade.assert_not_called()
+
+        with open("games/game2.pgn") as pgn:
+            text = pgn.read()
+        self.boardWidget.loadGame(text)
+        self.assertFalse(self.boardWidget.popStack)
+        with self.assertRaises(IndexError):
+            self.boardWidget.loadGame(text, -1)
+        with self.assertRaises(ValueError):
+            self.boardWidget.loadGame("")
+
+        self.boardWidget.loadGame(pathlib.Path("games/game2.pgn"), ply=0)
+        self.assertEqual(self.boardWidget.board.fen(), chess.STARTING_FEN)
+        self.boardWidget.goToMove(len(self.boardWidget.popStack))
+        self.assertEqual(self.boardWidget.board.fen(), chess.pgn.read_game(io.StringIO(text)).end().board().fen())
+
+    def testReadGames(self):
+        texts = []
+        for gameName in sorted(os.listdir("games")):
+            with open(f"games/{gameName}") as pgn:
+                texts.append(pgn.read())
+
+        games = hichess.readGames(io.StringIO("\n\n".join(texts)))
+        self.assertEqual(next(games).headers, chess.pgn.read_game(io.StringIO(texts[0])).headers)
+        self.assertEqual(len(list(games)), len(texts) - 1)
+        self.assertEqual(len(list(hichess.readGames(pathlib.Path("games/game1.pgn")))), 1)
+
+        # a str is PGN, as in loadGame
+        self.assertEqual(len(list(hichess.readGames("\n\n".join(texts)))), len(texts))
+
+    def testLazyCells(self):
+        boardWidget = hichess.BoardWidget(sides=hichess.BOTH_SIDES, lazyCells=True)
+        self.assertFalse(list(boardWidget.cellWidgets()))
+
+        with open("games/game1.pgn") as pgn:
+            boardWidget.loadGame(pgn, ply=10)
+        boardWidget.unpop()
+        boardWidget.push(next(iter(boardWidget.board.legal_moves)))
+        self.assertFalse(list(boardWidget.cellWidgets()))
+
+        # the cells are created and synchronized when one of them is requested
+        lastMove = boardWidget.board.peek()
+        self.assertTrue(boardWidget.cellWidgetAtSquare(lastMove.to_square).justMoved)
+        self.assertEqual(len(list(boardWidget.cellWidgets())), 64)
+        for square in chess.SQUARES:
+            self.assertEqual(boardWidget.cellWidgetAtSquare(square).getPiece(), boardWidget.board.piece_at(square))
+        self.assertEqual(boardWidget.squareOf(boardWidget.cellWidgetAtSquare(chess.E4)), chess.E4)
+
+        # or when the board widget is shown
+        boardWidget = hichess.BoardWidget(lazyCells=True)
+        boardWidget.show()
+        self.assertEqual(len(list(boardWidget.cellWidgets())), 64)
+        self.assertTrue(all(w.isVisible() for w in boardWidget.cellWidgets()))
+        self.assertEqual(len(list(boardWidget.cellWidgets(hichess.CellWidget.isPiece))), 32)
+        boardWidget.close()
+
+    def testCellSignals(self):
+        # the signals of all the cells are dispatched by one group
+        self.boardWidget.accessibleSides = hichess.BOTH_SIDES
+        e2 = self.boardWidget.cellWidgetAtSquare(chess.E2)
+        e2.click()
+        self.assertTrue(e2.isChecked())
+        self.assertSetEqual({self.boardWidget.squareOf(w) for w in self.boardWidget.cellWidgets(
+            hichess.CellWidget.isHighlighted)}, {chess.E3, chess.E4})
+
+        self.boardWidget.cellWidgetAtSquare(chess.A7).mark()
+        self.assertFalse(e2.isChecked())
+        self.assertFalse(list(self.boardWidget.cellWidgets(hichess.CellWidget.isHighlighted)))
+
+        e2.click()
+        self.boardWidget.cellWidgetAtSquare(chess.E4).click()
+        self.assertEqual(self.boardWidget.board.peek(), chess.Move.from_uci("e2e4"))
+
+    def testGoToMoveRestoresPositions(self):
+        with open("games/game1.pgn") as pgn:
+            game = chess.pgn.read_game(pgn)
+        moves = list(game.mainline_moves())
+
+        self.boardWidget.setFen(game.board().fen())
+        for move in moves:
+            self.boardWidget.makeMove(move)
+
+        for n in [len(moves) - 1, 10, 0, 25, len(moves), 3, 3, 17]:
+            self.boardWidget.goToMove(n)
+
+            expected = game.board()
+            for move in moves[:n]:
+                expected.push(move)
+            self.assertEqual(self.boardWidget.board, expected)
+            self.assertListEqual(self.boardWidget.board.move_stack, moves[:n])
+            self.assertListEqual(list(self.boardWidget.popStack), moves[n:][::-1])
+            for square in chess.SQUARES:
+                self.assertEqual(self.boardWidget.cellWidgetAtSquare(square).getPiece(), expected.piece_at(square))
+
+        while self.boardWidget.board.move_stack:
+            expected.pop()
+            self.boardWidget.board.pop()
+            self.assertEqual(self.boardWidget.board, expected)
+
+        self.boardWidget.setFen(game.board().fen())
+        self.boardWidget.popStack.extend(reversed(moves[:5]))
+        self.assertTrue(self.boardWidget.goToMove(5))
+        self.assertListEqual(self.boardWidget.board.move_stack, moves[:5])
+
     def testHighlightLegalMoveCellsFor(self):
         self.boardWidget.setFen("R6R/3Q4/1Q4Q1/4Q3/2Q4Q/Q4Q2/pp1Q4/kBNN1KB1 w - - 0 1")
 
@@ -588,6 +924,152 @@ class BoardWidgetTestCase(unittest.TestCase):
             self.assertEqual(w1.isMarked(), w2.isMarked())
             self.assertEqual(w1.objectName(), w2.objectName())
 
+    def testFlipMovesCells(self):
+        self.boardWidget.accessibleSides = hichess.BOTH_SIDES
+        self.boardWidget.push(chess.Move.from_uci("e2e4"))
+        self.boardWidget.cellWidgetAtSquare(chess.G8).click()
+
+        cells = {square: self.boardWidget.cellWidgetAtSquare(square) for square in chess.SQUARES}
+        states = {square: (w.getPiece(), w.isMarked(), w.isHighlighted(), w.isChecked(), w.justMoved)
+                  for square, w in cells.items()}
+
+        # a flip moves the cells with their states and recomputes no style
+        with patch.object(hichess.CellWidget, "_polish", autospec=True) as mockPolish, \
+                patch.object(hichess.CellWidget, "setPiece", autospec=True) as mockSetPiece:
+            self.boardWidget.flip()
+        mockPolish.assert_not_called()
+        mockSetPiece.assert_not_called()
+
+        for square, w in cells.items():
+            self.assertIs(self.boardWidget.cellWidgetAtSquare(square), w)
+            self.assertEqual(self.boardWidget.squareOf(w), square)
+            self.assertEqual((w.getPiece(), w.isMarked(), w.isHighlighted(), w.isChecked(), w.justMoved),
+                             states[square])
+        for i, w in enumerate(self.boardWidget.cellWidgets()):
+            self.assertIs(w, cells[chess.square(7 - chess.square_file(i), chess.square_rank(i))])
+            self.assertIs(self.boardWidget._boardLayout.itemAtPosition(i // 8, i % 8).widget(), w)
+
+        self.boardWidget.cellWidgetAtSquare(chess.F6).click()
+        self.assertEqual(self.boardWidget.board.peek(), chess.Move.from_uci("g8f6"))
+
+        # the marks stay on their squares
+        self.boardWidget.cellWidgetAtSquare(chess.A2).mark()
+        self.boardWidget.flip()
+        self.assertListEqual([self.boardWidget.squareOf(w) for w in self.boardWidget.cellWidgets(
+            hichess.CellWidget.isMarked)], [chess.A2])
+
+    def testRenderMode(self):
+        self.assertEqual(self.boardWidget.renderMode, hichess.STYLESHEET_RENDERING)
+        self.boardWidget.renderMode = hichess.PAINTER_RENDERING
+        for w in self.boardWidget.cellWidgets():
+            self.assertEqual(w.renderMode(), hichess.PAINTER_RENDERING)
+
+        self.boardWidget.push(chess.Move.from_uci("e2e4"))
+        w = self.boardWidget.cellWidgetAtSquare(chess.E4)
+        self.assertEqual(w.objectName(), "cell_white_pawn")
+        self.assertTrue(w.justMoved)
+
+    def testScaledPixmapCache(self):
+        defaultPixmap = QPixmap(800, 800)
+        defaultPixmap.fill(QColor("white"))
+        flippedPixmap = QPixmap(800, 800)
+        flippedPixmap.fill(QColor("black"))
+
+        self.boardWidget.resize(640, 640)
+        self.boardWidget.setBoardPixmap(defaultPixmap, flippedPixmap)
+        self.assertEqual(self.boardWidget.pixmap().size(), QSize(640, 640))
+
+        scaled = self.boardWidget.pixmap().cacheKey()
+        self.boardWidget.flip()
+        self.boardWidget.flip()
+        self.assertEqual(self.boardWidget.pixmap().cacheKey(), scaled)
+        self.assertEqual(len(self.boardWidget._scaledPixmaps), 2)
+
+        # the pixmap is scaled fast while resizing and smoothly after the resize
+        self.boardWidget.show()
+        self.boardWidget.resize(560, 560)
+        QApplication.processEvents()
+        self.assertEqual(self.boardWidget.pixmap().size(), QSize(560, 560))
+        self.assertTrue(self.boardWidget._smoothScalingTimer.isActive())
+        waitUntil(lambda: not self.boardWidget._smoothScalingTimer.isActive())
+        self.assertEqual(len(self.boardWidget._scaledPixmaps), 3)
+
+        self.boardWidget.resize(640, 640)
+        QApplication.processEvents()
+        self.assertEqual(self.boardWidget.pixmap().cacheKey(), scaled)
+        self.assertFalse(self.boardWidget._smoothScalingTimer.isActive())
+
+        self.boardWidget.scaledPixmapCacheSize = 1
+        self.boardWidget.setBoardPixmap(defaultPixmap.copy(), flippedPixmap.copy())
+        self.assertEqual(len(self.boardWidget._scaledPixmaps), 1)
+        self.boardWidget.hide()
+
+    def testDragAndDrop(self):
+        boardWidget = hichess.BoardWidget(sides=hichess.BOTH_SIDES, dnd=True)
+        boardWidget.resize(640, 640)
+        boardWidget.show()
+        QApplication.processEvents()
+        dragWidget = boardWidget._dragWidget
+
+        for uci in ["e2e4", "e7e5", "g1f3"]:
+            move = chess.Move.from_uci(uci)
+            source = boardWidget.cellWidgetAtSquare(move.from_square)
+            target = boardWidget.cellWidgetAtSquare(move.to_square)
+
+            QTest.mousePress(source, Qt.LeftButton, Qt.NoModifier, source.rect().center())
+            self.assertTrue(source.isChecked())
+            self.assertTrue(target.isHighlighted())
+
+            globalPos = boardWidget.mapToGlobal(target.geometry().center())
+            boardWidget.mouseReleaseEvent(QMouseEvent(QEvent.MouseButtonRelease, boardWidget.mapFromGlobal(globalPos),
+                                                      globalPos, Qt.LeftButton, Qt.NoButton, Qt.NoModifier))
+            self.assertEqual(boardWidget.board.peek(), move)
+            self.assertIs(boardWidget._dragWidget, dragWidget)
+            self.assertFalse(dragWidget.isVisible())
+            boardWidget.flip()
+
+        self.assertIsNone(boardWidget._cellWidgetAt(QPoint(-1, 10)))
+        self.assertIsNone(boardWidget._cellWidgetAt(QPoint(10, 640)))
+        boardWidget.hide()
+
+    def testPromotion(self):
+        boardWidget = hichess.BoardWidget(fen="8/P7/8/8/8/8/8/k6K w - - 0 1", sides=hichess.BOTH_SIDES)
+
+        boardWidget.autoPromotion = chess.QUEEN
+        boardWidget.premovePromotion = chess.KNIGHT
+        boardWidget.push(chess.Move(chess.A7, chess.A8))
+        self.assertEqual(boardWidget.board.peek().promotion, chess.KNIGHT)
+        self.assertIsNone(boardWidget.premovePromotion)
+
+        boardWidget.pop()
+        boardWidget.push(chess.Move(chess.A7, chess.A8))
+        self.assertEqual(boardWidget.board.peek().promotion, chess.QUEEN)
+        self.assertFalse(boardWidget._promotionDialogs)
+
+        boardWidget.pop()
+        boardWidget.autoPromotion = None
+        boardWidget.modalPromotion = False
+        boardWidget.push(chess.Move(chess.A7, chess.A8))
+        promotionDialog = boardWidget._promotionDialogs[(chess.WHITE, False)]
+        self.assertTrue(promotionDialog.isVisible())
+        self.assertFalse(boardWidget.board.move_stack)
+
+        promotionDialog.reject()
+        self.assertFalse(boardWidget.board.move_stack)
+
+        boardWidget.push(chess.Move(chess.A7, chess.A8))
+        rook = next(w for w in promotionDialog.pieces if w.getPiece().piece_type == chess.ROOK)
+        rook.click()
+        self.assertFalse(promotionDialog.isVisible())
+        self.assertEqual(boardWidget.board.peek(), chess.Move(chess.A7, chess.A8, chess.ROOK))
+
+        boardWidget.pop()
+        boardWidget.modalPromotion = True
+        QTimer.singleShot(0, promotionDialog.accept)
+        boardWidget.push(chess.Move(chess.A7, chess.A8))
+        self.assertEqual(boardWidget.board.peek(), chess.Move(chess.A7, chess.A8, chess.QUEEN))
+        self.assertEqual(len(boardWidget._promotionDialogs), 1)
+
     @patch("hichess.hichess.BoardWidget.synchronize")
     def testSetAccessibleSides(self, mockSynchronize):
         self.boardWidget.accessibleSides = hichess.BOTH_SIDES
@@ -595,6 +1077,849 @@ class BoardWidgetTestCase(unittest.TestCase):
         mockSynchronize.assert_called_once()
 
 
+class BoardModelTestCase(unittest.TestCase):
+    def setUp(self):
+        self.model = hichess.BoardModel(sides=hichess.BOTH_SIDES)
+
+    def testPush(self):
+        mockMoveMade = Mock()
+        mockMovePushed = Mock()
+        mockCheckmate = Mock()
+        mockGameOver = Mock()
+        self.model.moveMade.connect(mockMoveMade)
+        self.model.movePushed.connect(mockMovePushed)
+        self.model.checkmate.connect(mockCheckmate)
+        self.model.gameOver.connect(mockGameOver)
+
+        for uci in ["f2f3", "e7e5", "g2g4", "d8h4"]:
+            move = chess.Move.from_uci(uci)
+            san = self.model.board.san(move)
+            self.assertEqual(self.model.push(move), san)
+            mockMoveMade.assert_called_with(san)
+            mockMovePushed.assert_called_with(san)
+
+        mockCheckmate.assert_called_once_with(chess.BLACK)
+        mockGameOver.assert_called_once()
+
+        with self.assertRaises(hichess.IllegalMove):
+            self.model.push(chess.Move.from_uci("e1f2"))
+
+        self.assertFalse(self.model.isPushing())
+        self.model.moveMade.disconnect(mockMoveMade)
+        pushing = []
+        self.model.moveMade.connect(lambda san: pushing.append(self.model.isPushing()))
+        self.model.pop()
+        self.model.push(chess.Move.from_uci("d8g5"))
+        self.assertEqual(mockMoveMade.call_count, 4)
+        self.assertEqual(mockMovePushed.call_count, 5)
+        self.assertListEqual(pushing, [True])
+
+    def testPopUnpopAndGoToMove(self):
+        moves = [chess.Move.from_uci(uci) for uci in ["e2e4", "e7e5", "g1f3", "b8c6", "f1b5"]]
+        for move in moves:
+            self.model.makeMove(move)
+
+        self.assertEqual(self.model.pop(2), moves[3])
+        self.assertListEqual(list(self.model.popStack), moves[3:][::-1])
+        self.assertEqual(self.model.unpop(), moves[3])
+        self.assertTrue(self.model.goToMove(1))
+        self.assertListEqual(self.model.board.move_stack, moves[:1])
+        self.assertTrue(self.model.goToMove(5))
+        self.assertListEqual(self.model.board.move_stack, moves)
+        self.assertFalse(self.model.goToMove(5))
+        self.assertFalse(self.model.goToMove(6))
+
+        with self.assertRaises(IndexError):
+            self.model.unpop()
+
+        self.model.pop()
+        self.model.push(chess.Move.from_uci("f1c4"))
+        self.assertFalse(self.model.popStack)
+
+    def testUnpopAfterChangingTheBoard(self):
+        def replayed(board):
+            # the board obtained by pushing the moves of the given board on its root
+            replay = board.root()
+            for move in board.move_stack:
+                replay.push(move)
+            return replay
+
+        for uci in ["e2e4", "e7e5", "g1f3"]:
+            self.model.push(chess.Move.from_uci(uci))
+        self.model.pop(2)
+        self.model.makeMove(chess.Move.from_uci("c7c5"))
+        self.assertEqual(self.model.unpop(), chess.Move.from_uci("e7e5"))
+        self.assertListEqual([move.uci() for move in self.model.board.move_stack], ["e2e4", "c7c5", "e7e5"])
+        self.assertEqual(self.model.board, replayed(self.model.board))
+
+        # the moves popped together are pushed once one of them has been unpopped onto a changed board
+        self.model.setFen(chess.STARTING_FEN)
+        for uci in ["d2d4", "d7d5", "c2c4", "e7e6"]:
+            self.model.push(chess.Move.from_uci(uci))
+        self.model.pop(3)
+        self.model.unpop()
+        self.model.makeMove(chess.Move.from_uci("g8f6"))
+        self.model.unpop(2)
+        self.assertEqual(self.model.board, replayed(self.model.board))
+
+        self.model.pop(4)
+        pieces = self.model.board.piece_map()
+        del pieces[chess.B1]
+        self.model.setPieceMap(pieces)
+        self.model.unpop(2)
+        self.assertIsNone(self.model.board.piece_at(chess.B1))
+        self.assertEqual(self.model.board.piece_at(chess.D5), chess.Piece(chess.PAWN, chess.BLACK))
+
+        # the saved positions are restored as long as the board is unchanged
+        self.model.pop(2)
+        self.model.unpop()
+        self.model.unpop()
+        self.assertEqual(self.model.board, replayed(self.model.board))
+
+    @patch("hichess.boardmodel._transpositionKey", chess.polyglot.zobrist_hash)
+    @patch("hichess.boardmodel._BOARD_STATES", False)
+    def testPublicChessApi(self):
+        # pop and unpop don't depend on the private API of python-chess
+        moves = [chess.Move.from_uci(uci) for uci in ["g1f3", "g8f6", "f3g1", "f6g8", "g1f3", "g8f6", "f3g1"]]
+        for move in moves:
+            self.model.push(move)
+
+        self.assertEqual(self.model.pop(3), moves[4])
+        self.assertEqual(self.model.repetitions(), 2)
+        self.assertEqual(self.model.unpop(2), moves[5])
+        self.assertListEqual(self.model.board.move_stack, moves[:6])
+        self.assertEqual(self.model.repetitions(), 2)
+        self.model.unpop()
+        self.assertEqual(self.model.board, chess.Board("rnbqkb1r/pppppppp/5n2/8/8/8/PPPPPPPP/RNBQKBNR b KQkq - 7 4"))
+        self.assertEqual(self.model.repetitions(), 2)
+
+    def testCanMoveFrom(self):
+        self.assertTrue(self.model.canMoveFrom(chess.E2))
+        self.assertFalse(self.model.canMoveFrom(chess.E7))
+        self.assertFalse(self.model.canMoveFrom(chess.E4))
+
+        self.model.accessibleSides = hichess.ONLY_BLACK_SIDE
+        self.assertFalse(self.model.canMoveFrom(chess.E2))
+        self.model.makeMove(chess.Move.from_uci("e2e4"))
+        self.assertTrue(self.model.canMoveFrom(chess.E7))
+
+        self.model.blockBoardOnPop = True
+        self.model.pop()
+        self.model.makeMove(chess.Move.from_uci("d2d4"))
+        self.assertTrue(self.model.popStack)
+        self.assertFalse(self.model.canMoveFrom(chess.E7))
+
+    def testDrawRules(self):
+        mockThreefold = Mock()
+        mockFivefold = Mock()
+        mockDraw = Mock()
+        mockGameOver = Mock()
+        self.model.threefoldRepetition.connect(mockThreefold)
+        self.model.fivefoldRepetition.connect(mockFivefold)
+        self.model.draw.connect(mockDraw)
+        self.model.gameOver.connect(mockGameOver)
+
+        shuffle = [chess.Move.from_uci(uci) for uci in ["g1f3", "g8f6", "f3g1", "f6g8"]]
+        for move in 2 * shuffle:
+            self.model.push(move)
+        self.assertEqual(self.model.repetitions(), 3)
+        mockThreefold.assert_called_once()
+        mockDraw.assert_not_called()
+
+        self.model.pop(4)
+        self.assertEqual(self.model.repetitions(), 2)
+        self.model.unpop(4)
+        self.assertEqual(self.model.status().repetitions, 3)
+
+        for move in 2 * shuffle:
+            self.model.push(move)
+        self.assertTrue(self.model.status().fivefoldRepetition)
+        mockFivefold.assert_called_once()
+        mockDraw.assert_called_once()
+        mockGameOver.assert_called_once()
+
+        # moves pushed on the board directly are counted as well
+        self.model.board.pop()
+        self.model.board.pop()
+        self.assertEqual(self.model.repetitions(), 4)
+
+        mockFifty = Mock()
+        mockSeventyFive = Mock()
+        self.model.fiftyMoves.connect(mockFifty)
+        self.model.seventyFiveMoves.connect(mockSeventyFive)
+        self.model.setFen("8/8/4k3/8/8/3RK3/8/8 w - - 99 80")
+        self.model.push(chess.Move.from_uci("d3d1"))
+        mockFifty.assert_called_once()
+        self.model.setFen("8/8/4k3/8/8/3RK3/8/8 w - - 149 80")
+        self.model.push(chess.Move.from_uci("d3d1"))
+        mockSeventyFive.assert_called_once()
+        self.assertEqual(mockDraw.call_count, 2)
+
+    def testDrawClaimsCalledOnce(self):
+        mockThreefold = Mock()
+        mockFifty = Mock()
+        self.model.threefoldRepetition.connect(mockThreefold)
+        self.model.fiftyMoves.connect(mockFifty)
+
+        # a draw can be claimed after each of the last five moves, but only the first one is reported
+        shuffle = [chess.Move.from_uci(uci) for uci in ["g1f3", "g8f6", "f3g1", "f6g8"]]
+        for move in 3 * shuffle:
+            self.model.push(move)
+            self.assertEqual(mockThreefold.call_count, int(len(self.model.board.move_stack) >= 8))
+
+        self.model.setFen("8/8/4k3/8/8/3RK3/8/8 w - - 99 80")
+        for uci in ["d3d1", "e6e7", "d1d3", "e7e6"]:
+            self.model.push(chess.Move.from_uci(uci))
+            mockFifty.assert_called_once()
+
+    def testStatus(self):
+        self.model.setFen("rnb1kbnr/pppp1ppp/8/4p3/6Pq/5P2/PPPPP2P/RNBQKBNR w KQkq - 1 3")
+        with patch.object(chess.Board, "generate_legal_moves", wraps=self.model.board.generate_legal_moves) \
+                as mockGenerate:
+            status = self.model.status()
+            self.assertTrue(self.model.isCheck())
+            self.assertFalse(self.model.legalTargets(chess.E1))
+            self.assertEqual(mockGenerate.call_count, 1)
+        self.assertTrue(status.checkmate)
+        self.assertFalse(status.stalemate)
+        self.assertEqual(status.legalMoves, ())
+
+    def testMoveTrace(self):
+        with patch.object(chess.Board, "lan") as mockLan, patch.object(chess.Board, "__str__") as mockStr:
+            self.model.push(chess.Move.from_uci("e2e4"))
+            mockLan.assert_not_called()
+            mockStr.assert_not_called()
+
+        self.model.moveTrace = deque(maxlen=2)
+        with self.assertLogs("hichess.moves", "DEBUG") as logs:
+            self.model.push(chess.Move.from_uci("e7e5"))
+            self.model.makeMove(chess.Move.from_uci("g1f3"))
+            self.model.push(chess.Move.from_uci("b8c6"))
+
+        self.assertEqual([record.moveRecord.san for record in logs.records], ["e5", "Nf3", "Nc6"])
+        self.assertListEqual([(record.ply, record.move.uci(), record.san, record.pushed)
+                              for record in self.model.moveTrace],
+                             [(3, "g1f3", "Nf3", False), (4, "b8c6", "Nc6", True)])
+
+    def testBoardWidget(self):
+        boardWidget = hichess.BoardWidget(sides=hichess.BOTH_SIDES)
+        boardWidget.model.push(chess.Move.from_uci("e2e4"))
+
+        self.assertIs(boardWidget.board, boardWidget.model.board)
+        self.assertTrue(boardWidget.cellWidgetAtSquare(chess.E4).isPiece())
+        self.assertTrue(boardWidget.cellWidgetAtSquare(chess.E4).justMoved)
+        self.assertTrue(boardWidget.cellWidgetAtSquare(chess.E2).isPlain())
+
+
+class MultiBoardViewTestCase(unittest.TestCase):
+    def setUp(self):
+        self.view = hichess.MultiBoardView(columns=10)
+        self.view.resize(1000, 1000)
+        self.models = [self.view.addBoard() for _ in range(100)]
+
+    def renderFrames(self):
+        frames = 0
+        while self.view._pending:
+            self.view._renderFrame()
+            frames += 1
+        return frames
+
+    def testCellIndexOfSquare(self):
+        boardWidget = hichess.BoardWidget()
+        for flipped in [False, True]:
+            boardWidget.flipped = flipped
+            for square in chess.SQUARES:
+                self.assertEqual(hichess.cellIndexOfSquare(square, flipped), boardWidget.cellIndexOfSquare(square))
+
+    def testRender(self):
+        self.view.frameBudget = 60
+        self.assertEqual(self.renderFrames(), 1)
+        self.assertEqual(self.view.boardSize(), 96)
+        for model in self.models:
+            self.assertEqual(self.view.boardPixmap(model).size(), QSize(96, 96))
+
+        # only the boards whose positions changed are rendered again
+        self.view._renderBoard = Mock(wraps=self.view._renderBoard)
+        emptySquare = self.view.boardPixmap(self.models[3]).toImage().pixel(4 * 12 + 6, 6 * 12 + 6)
+        self.models[3].push(chess.Move.from_uci("e2e4"))
+        self.view.updateBoard(self.models[4])
+        self.renderFrames()
+        self.assertEqual(self.view._renderBoard.call_count, 1)
+        self.assertNotEqual(self.view.boardPixmap(self.models[3]).toImage().pixel(4 * 12 + 6, 6 * 12 + 6),
+                            emptySquare)
+
+        self.view.setFlipped(self.models[3], True)
+        self.renderFrames()
+        self.assertEqual(self.view._renderBoard.call_count, 2)
+        self.assertNotEqual(self.view.boardPixmap(self.models[3]).toImage().pixel(3 * 12 + 6, 1 * 12 + 6),
+                            emptySquare)
+
+    def testFrameBudget(self):
+        self.view.frameBudget = 0
+        self.assertEqual(self.renderFrames(), len(self.models))
+        for model in self.models[:10]:
+            model.push(chess.Move.from_uci("g1f3"))
+        self.assertEqual(len(self.view._pending), 10)
+        self.assertEqual(self.renderFrames(), 10)
+
+    def testBoardAt(self):
+        mockBoardClicked = Mock()
+        self.view.boardClicked.connect(mockBoardClicked)
+        self.view.frameBudget = 60
+        self.renderFrames()
+
+        rect = self.view.boardRect(self.models[12])
+        self.assertEqual(rect, QRect(2 * 100, 1 * 100, 96, 96))
+        self.assertIs(self.view.boardAt(rect.center()), self.models[12])
+        self.assertIsNone(self.view.boardAt(QPoint(98, 10)))
+        self.assertEqual(self.view.squareAt(rect.topLeft() + QPoint(1, 1)), chess.A8)
+        self.view.setFlipped(self.models[12], True)
+        self.assertEqual(self.view.squareAt(rect.topLeft() + QPoint(1, 1)), chess.H1)
+
+        QTest.mouseClick(self.view, Qt.LeftButton, pos=rect.center())
+        mockBoardClicked.assert_called_once_with(self.models[12])
+
+        self.view.removeBoard(self.models[12])
+        self.assertNotIn(self.models[12], self.view.models())
+        with self.assertRaises(ValueError):
+            self.view.updateBoard(self.models[12])
+
+
+def perft(board, depth):
+    if depth == 1:
+        return board.legal_moves.count()
+
+    nodes = 0
+    for move in board.legal_moves:
+        board.push(move)
+        nodes += perft(board, depth - 1)
+        board.pop()
+    return nodes
+
+
+PERFT_POSITIONS = [
+    (chess.STARTING_FEN, 4),
+    ("r3k2r/p1ppqpb1/bn2pnp1/3PN3/1p2P3/2N2Q1p/PPPBBPPP/R3K2R w KQkq - 0 1", 3),
+    ("8/2p5/3p4/KP5r/1R3p1k/8/4P1P1/8 w - - 0 1", 4),
+    ("r3k2r/Pppp1ppp/1b3nbN/nP6/BBP1P3/q4N2/Pp1P2PP/R2Q1RK1 w kq - 0 1", 3),
+    ("rnbq1k1r/pp1Pbppp/2p5/8/2B5/8/PPP1NnPP/RNBQK2R w KQ - 1 8", 3),
+    ("r4rk1/1pp1qppp/p1np1n2/2b1p1B1/2B1P1b1/P1NP1N2/1PP1QPPP/R4RK1 w - - 0 10", 3),
+]
+
+
+class NativeTestCase(unittest.TestCase):
+    @unittest.skipUnless(hichess.native.isAvailable(), "the chessplusplus library is not built")
+    def testPerft(self):
+        nativeBoard = hichess.native.NativeBoard()
+        for fen, depth in PERFT_POSITIONS:
+            with self.subTest(fen=fen):
+                nativeBoard.setFen(fen)
+                self.assertEqual(nativeBoard.perft(depth), perft(chess.Board(fen), depth))
+
+    @unittest.skipUnless(hichess.native.isAvailable(), "the chessplusplus library is not built")
+    def testLegalMoves(self):
+        nativeBoard = hichess.native.NativeBoard()
+        for gameName in sorted(os.listdir("games")):
+            with open(f"games/{gameName}") as pgn:
+                game = chess.pgn.read_game(pgn)
+            board = game.board()
+            for move in game.mainline_moves():
+                nativeBoard.setBoard(board)
+                self.assertSetEqual(set(nativeBoard.legalMoves()), set(board.legal_moves))
+                self.assertEqual(nativeBoard.isCheck(), board.is_check())
+                self.assertEqual(nativeBoard.bitboards(), hichess.native.bitboards(board))
+                board.push(move)
+
+        for fen, _ in PERFT_POSITIONS:
+            nativeBoard.setFen(fen)
+            self.assertDictEqual(nativeBoard.pieceMap(), chess.Board(fen).piece_map())
+            self.assertEqual(nativeBoard.turn(), chess.Board(fen).turn)
+        with self.assertRaises(ValueError):
+            nativeBoard.setFen("rnbqkbnr/pppppppp/9/8/8/8/PPPPPPPP/RNBQKBNR w KQkq - 0 1")
+
+    @unittest.skipUnless(hichess.native.isAvailable(), "the chessplusplus library is not built")
+    @patch("hichess.native._MAX_MOVES", 8)
+    def testMoreMovesThanMaxMoves(self):
+        nativeBoard = hichess.native.NativeBoard()
+        self.assertSetEqual(set(nativeBoard.legalMoves()), set(chess.Board().legal_moves))
+
+    @unittest.skipUnless(hichess.native.isAvailable(), "the chessplusplus library is not built")
+    def testBoardModel(self):
+        model = hichess.BoardModel()
+        model.nativeMoveGeneration = True
+        mockCheckmate = Mock()
+        model.checkmate.connect(mockCheckmate)
+
+        for uci in ["e2e4", "e7e5", "d1h5", "b8c6", "f1c4", "g8f6", "h5f7"]:
+            self.assertSetEqual(set(model.status().legalMoves), set(model.board.legal_moves))
+            for square in chess.SQUARES:
+                self.assertSetEqual(set(model.legalTargets(square)),
+                                    {move.to_square for move in model.board.legal_moves if move.from_square == square})
+            model.push(chess.Move.from_uci(uci))
+        mockCheckmate.assert_called_once_with(chess.WHITE)
+
+    def testFallback(self):
+        model = hichess.BoardModel("rk6/8/8/8/8/8/8/RK6 w Q - 0 1")
+        model.nativeMoveGeneration = True
+        with patch.object(hichess.native, "isAvailable", return_value=False):
+            self.assertSetEqual(set(model.legalTargets(chess.B1)), {chess.B2, chess.C2, chess.C1})
+
+        # Chess960 positions are always left to python-chess
+        model.board = chess.Board("rk6/8/8/8/8/8/8/RK6 w Q - 0 1", chess960=True)
+        self.assertFalse(hichess.native.supports(model.board))
+        self.assertIn(chess.A1, model.legalTargets(chess.B1))
+
+        # so are invalid positions, e.g. without a king
+        model.board = chess.Board("r7/8/8/8/8/8/8/RK6 w - - 0 1")
+        self.assertFalse(hichess.native.supports(model.board))
+        self.assertSetEqual(set(model.legalTargets(chess.B1)), {chess.B2, chess.C2, chess.C1})
+
+        self.assertEqual(hichess.native.changedSquares(hichess.native.bitboards(chess.Board()),
+                                                       hichess.native.bitboards(chess.Board(None))),
+                         chess.BB_RANK_1 | chess.BB_RANK_2 | chess.BB_RANK_7 | chess.BB_RANK_8)
+
+    def testChess960OfTheSamePosition(self):
+        model = hichess.BoardModel("4k3/8/8/8/8/8/8/4K2R w K - 0 1")
+        self.assertIn(chess.G1, model.legalTargets(chess.E1))
+
+        # the castling moves of the same position are encoded differently in Chess960
+        model.board.chess960 = True
+        self.assertIn(chess.H1, model.legalTargets(chess.E1))
+        self.assertNotIn(chess.G1, model.legalTargets(chess.E1))
+
+    @unittest.skipUnless(hichess.native.isAvailable(), "the chessplusplus library is not built")
+    def testSupportsOncePerPosition(self):
+        model = hichess.BoardModel()
+        model.nativeMoveGeneration = True
+        with patch.object(hichess.native, "supports", wraps=hichess.native.supports) as mockSupports:
+            model.legalTargets(chess.E2)
+            model.push(chess.Move.from_uci("e2e4"))
+            model.legalTargets(chess.E7)
+            model.pop()
+            model.legalTargets(chess.E2)
+            model.unpop()
+            model.legalTargets(chess.E7)
+        self.assertEqual(mockSupports.call_count, 2)
+
+
+class InstrumentationTestCase(unittest.TestCase):
+    def setUp(self):
+        self.instrumentation = hichess.hotPaths
+        self.instrumentation.reset()
+
+    def tearDown(self):
+        self.instrumentation.disable()
+        self.instrumentation.reset()
+
+    def testDisabled(self):
+        polish = hichess.CellWidget.__dict__["_polish"]
+        boardWidget = hichess.BoardWidget()
+        boardWidget.push(chess.Move.from_uci("e2e4"))
+
+        self.assertFalse(self.instrumentation.isEnabled())
+        self.assertFalse(self.instrumentation.stats())
+        self.assertIs(hichess.CellWidget.__dict__["_polish"], polish)
+
+        self.instrumentation.enable()
+        self.assertIsNot(hichess.CellWidget.__dict__["_polish"], polish)
+        self.instrumentation.disable()
+        self.assertIs(hichess.CellWidget.__dict__["_polish"], polish)
+
+    def testHeadlessModel(self):
+        # the hot paths of BoardModel are registered by its own module
+        model = hichess.BoardModel()
+        self.instrumentation.enable()
+        model.push(chess.Move.from_uci("e2e4"))
+        self.assertEqual(self.instrumentation.stats()["BoardModel.legalMoveGeneration"].calls, 1)
+        self.assertEqual(self.instrumentation.stats()["BoardModel.statusCheck"].calls, 1)
+
+    def testStats(self):
+        boardWidget = hichess.BoardWidget(sides=hichess.BOTH_SIDES)
+        mockRecorded = Mock()
+        self.instrumentation.recorded.connect(mockRecorded)
+        self.instrumentation.enable()
+
+        for uci in ["f2f3", "e7e5", "g2g4"]:
+            boardWidget.push(chess.Move.from_uci(uci))
+        boardWidget.highlightLegalMoveCellsFor(boardWidget.cellWidgetAtSquare(chess.D8))
+        with self.instrumentation.measure("test"):
+            pass
+
+        stats = self.instrumentation.stats()
+        self.assertEqual(stats["BoardWidget.synchronize"].calls, 3)
+        self.assertEqual(stats["BoardModel.statusCheck"].calls, 3)
+        self.assertEqual(stats["BoardModel.legalMoveGeneration"].calls, 3)
+        self.assertEqual(stats["test"].calls, 1)
+        self.assertGreater(stats["CellWidget.polish"].calls, 0)
+        self.assertGreaterEqual(stats["CellWidget.polish"].totalTime, stats["CellWidget.polish"].maxTime)
+        self.assertEqual(mockRecorded.call_count, sum(s.calls for s in stats.values()))
+
+        self.instrumentation.recorded.disconnect(mockRecorded)
+        self.instrumentation.disable()
+        boardWidget.push(chess.Move.from_uci("d8h4"))
+        self.assertEqual(self.instrumentation.stats()["BoardWidget.synchronize"].calls, 3)
+
+        with self.assertLogs("hichess.instrumentation") as logs:
+            self.instrumentation.logStats()
+        self.assertEqual(len(logs.records), len(stats))
+        self.assertEqual(logs.records[0].stats["calls"], stats[logs.records[0].operation].calls)
+
+    def testChromeTrace(self):
+        self.instrumentation.enable(trace=True)
+        engineWrapper = hichess.EngineWrapper(asynchronous=True)
+        engineWrapper.start(ENGINE, {"Delay": 50})
+        try:
+            future = engineWrapper.playMove(chess.Board(), chess.engine.Limit(time=1))
+            self.assertNotIn("EngineWrapper.playMove", self.instrumentation.stats())
+            future.result(timeout=10)
+            self.assertTrue(waitUntil(lambda: "EngineWrapper.playMove" in self.instrumentation.stats()))
+            self.assertGreaterEqual(self.instrumentation.stats()["EngineWrapper.playMove"].totalTime, 0.05)
+        finally:
+            engineWrapper.quit()
+
+        hichess.BoardWidget().push(chess.Move.from_uci("e2e4"))
+
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "trace.json")
+            self.instrumentation.dumpChromeTrace(path)
+            with open(path) as f:
+                trace = json.load(f)
+
+        events = trace["traceEvents"]
+        self.assertEqual(len(events), sum(s.calls for s in self.instrumentation.stats().values()))
+        self.assertTrue(all(event["ph"] == "X" and event["dur"] >= 0 for event in events))
+        self.assertIn("BoardWidget.synchronize", {event["name"] for event in events})
+
+
+class EngineWrapperTestCase(unittest.TestCase):
+    def setUp(self):
+        self.engineWrapper = hichess.EngineWrapper()
+
+    def tearDown(self):
+        if not self.engineWrapper.null():
+            self.engineWrapper.quit()
+
+    def testSynchronous(self):
+        self.assertTrue(self.engineWrapper.null())
+        self.assertFalse(self.engineWrapper.quit())
+
+        self.assertTrue(self.engineWrapper.start(ENGINE))
+        self.assertFalse(self.engineWrapper.null())
+        self.assertFalse(self.engineWrapper.start(ENGINE))
+
+        result = self.engineWrapper.playMove(chess.Board(), chess.engine.Limit(depth=1))
+        self.assertEqual(result.move, chess.Move.from_uci("a2a3"))
+
+        self.assertTrue(self.engineWrapper.quit())
+        self.assertTrue(self.engineWrapper.null())
+
+    def testAsynchronous(self):
+        self.engineWrapper = hichess.EngineWrapper(asynchronous=True)
+        self.assertTrue(self.engineWrapper.isAsynchronous())
+        self.assertTrue(self.engineWrapper.start(ENGINE, {"Delay": 300}))
+
+        future = self.engineWrapper.playMove(chess.Board(), chess.engine.Limit(time=1))
+        self.assertIsInstance(future, concurrent.futures.Future)
+        self.assertFalse(future.done())
+        self.assertEqual(future.result(timeout=10).move, chess.Move.from_uci("a2a3"))
+
+        self.assertTrue(self.engineWrapper.quit())
+        self.assertIsNone(self.engineWrapper._thread)
+
+    def testFindBestMove(self):
+        boardWidget = hichess.BoardWidget()
+        boardWidget.engineWrapper = self.engineWrapper
+        mockBestMoveFound = Mock()
+        boardWidget.bestMoveFound.connect(mockBestMoveFound)
+
+        self.engineWrapper.start(ENGINE)
+        boardWidget.findBestMove(chess.engine.Limit(depth=1))
+        self.assertEqual(mockBestMoveFound.call_args[0][0].move, chess.Move.from_uci("a2a3"))
+        self.engineWrapper.quit()
+
+        mockBestMoveFound.reset_mock()
+        self.engineWrapper = boardWidget.engineWrapper = hichess.EngineWrapper(asynchronous=True)
+        self.engineWrapper.start(ENGINE, {"Delay": 100})
+        boardWidget.findBestMove(chess.engine.Limit(time=1))
+        mockBestMoveFound.assert_not_called()
+        self.assertTrue(waitUntil(lambda: mockBestMoveFound.called))
+        self.assertEqual(mockBestMoveFound.call_args[0][0].move, chess.Move.from_uci("a2a3"))
+
+        mockBestMoveFound.reset_mock()
+        boardWidget.findBestMove(chess.engine.Limit(time=1))
+        boardWidget.push(chess.Move.from_uci("e2e4"))
+        waitUntil(lambda: mockBestMoveFound.called, timeout=1)
+        mockBestMoveFound.assert_not_called()
+
+
+    def testStreamingAnalysis(self):
+        self.assertFalse(self.engineWrapper.startAnalysis(chess.Board()))
+
+        self.engineWrapper = hichess.EngineWrapper(asynchronous=True)
+        self.engineWrapper.start(ENGINE)
+        self.engineWrapper.analysisInterval = 50
+        updates = []
+        mockAnalysisFinished = Mock()
+        self.engineWrapper.analysisUpdated.connect(updates.append)
+        self.engineWrapper.analysisFinished.connect(mockAnalysisFinished)
+
+        start = time.monotonic()
+        self.assertTrue(self.engineWrapper.startAnalysis(chess.Board(), multipv=2))
+        self.assertTrue(self.engineWrapper.isAnalysing())
+        waitUntil(lambda: False, timeout=0.5)
+        elapsed = time.monotonic() - start
+
+        self.assertTrue(updates)
+        self.assertLessEqual(len(updates), elapsed / 0.05 + 1)
+        lines = updates[-1]
+        self.assertEqual(len(lines), 2)
+        for key in ["depth", "score", "pv", "nps"]:
+            self.assertIn(key, lines[0])
+        self.assertEqual(lines[0]["pv"][0], chess.Move.from_uci("a2a3"))
+        self.assertEqual(lines[1]["pv"][0], chess.Move.from_uci("a2a4"))
+
+        self.assertTrue(self.engineWrapper.stopAnalysis())
+        self.assertFalse(self.engineWrapper.isAnalysing())
+        self.assertFalse(self.engineWrapper.stopAnalysis())
+        mockAnalysisFinished.assert_called_once()
+
+        mockAnalysisFinished.reset_mock()
+        self.engineWrapper.startAnalysis(chess.Board(), limit=chess.engine.Limit(depth=3))
+        self.assertTrue(waitUntil(lambda: mockAnalysisFinished.called))
+        self.assertFalse(self.engineWrapper.isAnalysing())
+
+    def testBoardWidgetAnalysis(self):
+        boardWidget = hichess.BoardWidget()
+        self.engineWrapper = boardWidget.engineWrapper = hichess.EngineWrapper(asynchronous=True)
+        self.engineWrapper.start(ENGINE)
+        updates = []
+        self.engineWrapper.analysisUpdated.connect(updates.append)
+
+        self.assertTrue(boardWidget.startAnalysis())
+        self.assertTrue(waitUntil(lambda: updates and updates[-1][0]["pv"][0] == chess.Move.from_uci("a2a3")))
+
+        boardWidget.push(chess.Move.from_uci("e2e4"))
+        self.assertTrue(waitUntil(lambda: updates[-1][0]["pv"][0] == chess.Move.from_uci("a7a5")))
+
+        boardWidget.pop()
+        self.assertTrue(waitUntil(lambda: updates[-1][0]["pv"][0] == chess.Move.from_uci("a2a3")))
+
+        self.assertTrue(boardWidget.stopAnalysis())
+        self.assertFalse(self.engineWrapper.isAnalysing())
+        boardWidget.push(chess.Move.from_uci("e2e4"))
+        self.assertFalse(self.engineWrapper.isAnalysing())
+
+
+class EngineCacheTestCase(unittest.TestCase):
+    def setUp(self):
+        self.cache = hichess.EngineCache(maxEntries=2)
+        self.limit = chess.engine.Limit(depth=10)
+
+    def makeResult(self, board, score):
+        pv = [min(board.legal_moves, key=chess.Move.uci)]
+        return chess.engine.PlayResult(pv[0], None, {"score": chess.engine.PovScore(score, board.turn), "pv": pv})
+
+    def testGetAndPut(self):
+        board = chess.Board()
+        key = hichess.EngineCache.key(board, self.limit)
+        self.assertIsNone(self.cache.get(key))
+        self.assertNotEqual(key, hichess.EngineCache.key(board, chess.engine.Limit(depth=11)))
+
+        self.cache.put(key, self.makeResult(board, chess.engine.Cp(25)))
+        result = self.cache.get(key)
+        self.assertEqual(result.move, chess.Move.from_uci("a2a3"))
+        self.assertEqual(result.info["score"].white(), chess.engine.Cp(25))
+        self.assertEqual(result.info["pv"], [chess.Move.from_uci("a2a3")])
+        self.assertEqual((self.cache.hits, self.cache.misses), (1, 1))
+
+        transposition = chess.Board()
+        for uci in ["g1f3", "g8f6", "f3g1", "f6g8"]:
+            transposition.push_uci(uci)
+        self.assertIsNotNone(self.cache.get(hichess.EngineCache.key(transposition, self.limit)))
+
+    def testEviction(self):
+        boards = [chess.Board(), chess.Board("4k3/8/8/8/8/8/8/4K3 w - - 0 1"), chess.Board("4k3/8/8/8/8/8/8/4K3 b - - 0 1")]
+        keys = [hichess.EngineCache.key(board, self.limit) for board in boards]
+
+        self.cache.put(keys[0], self.makeResult(boards[0], chess.engine.Cp(0)))
+        self.cache.put(keys[1], self.makeResult(boards[1], chess.engine.Cp(0)))
+        self.cache.get(keys[0])
+        self.cache.put(keys[2], self.makeResult(boards[2], chess.engine.Cp(0)))
+
+        self.assertEqual(len(self.cache), 2)
+        self.assertIsNotNone(self.cache.get(keys[0]))
+        self.assertIsNone(self.cache.get(keys[1]))
+        self.assertIsNotNone(self.cache.get(keys[2]))
+
+    def testPersistence(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "cache.json")
+            cache = hichess.EngineCache(path=path)
+
+            scores = [chess.engine.Cp(-40), chess.engine.Mate(3), chess.engine.Mate(-2), chess.engine.MateGiven]
+            boards = [chess.Board(), chess.Board("4k3/8/8/8/8/8/8/4K3 w - - 0 1"),
+                      chess.Board("4k3/8/8/8/8/8/8/4K3 b - - 0 1"), chess.Board("4k3/8/8/8/8/8/8/R3K3 w - - 0 1")]
+            for board, score in zip(boards, scores):
+                cache.put(hichess.EngineCache.key(board, self.limit), self.makeResult(board, score))
+            cache.save()
+
+            loaded = hichess.EngineCache(path=path)
+            self.assertEqual(len(loaded), len(boards))
+            for board, score in zip(boards, scores):
+                result = loaded.get(hichess.EngineCache.key(board, self.limit))
+                self.assertEqual(result.info["score"].pov(board.turn), score)
+
+    def testClockId(self):
+        board = chess.Board()
+        limit = chess.engine.Limit(white_clock=60, black_clock=60, clock_id=object())
+        key = hichess.EngineCache.key(board, limit)
+        self.assertEqual(key, hichess.EngineCache.key(board, chess.engine.Limit(white_clock=60, black_clock=60)))
+
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "cache.json")
+            cache = hichess.EngineCache(path=path)
+            cache.put(key, self.makeResult(board, chess.engine.Cp(30)))
+            cache.save()
+
+            loaded = hichess.EngineCache(path=path)
+            self.assertEqual(loaded.get(hichess.EngineCache.key(board, limit)).move, chess.Move.from_uci("a2a3"))
+
+    def testEngineWrapper(self):
+        engineWrapper = hichess.EngineWrapper(cache=self.cache)
+        engineWrapper.start(ENGINE)
+        board = chess.Board()
+
+        result = engineWrapper.playMove(board, self.limit)
+        self.assertEqual(len(self.cache), 1)
+        self.assertIn("score", result.info)
+        with patch.object(engineWrapper.engine, "play") as mockPlay:
+            cached = engineWrapper.playMove(board, self.limit)
+            mockPlay.assert_not_called()
+        self.assertEqual(cached.move, result.move)
+        self.assertEqual(cached.info["score"], result.info["score"])
+        engineWrapper.quit()
+
+        engineWrapper = hichess.EngineWrapper(asynchronous=True, cache=self.cache)
+        engineWrapper.start(ENGINE)
+        future = engineWrapper.playMove(board, self.limit)
+        self.assertTrue(future.done())
+        self.assertEqual(future.result().move, result.move)
+
+        board.push_uci("e2e4")
+        engineWrapper.playMove(board, self.limit).result(timeout=10)
+        self.assertTrue(waitUntil(lambda: len(self.cache) == 2))
+        engineWrapper.quit()
+
+
+class EnginePoolTestCase(unittest.TestCase):
+    def setUp(self):
+        self.pool = hichess.EnginePool(ENGINE, size=2, options={"Delay": 50})
+
+    def tearDown(self):
+        if self.pool.isRunning():
+            self.pool.quit()
+
+    def testStartAndQuit(self):
+        self.assertFalse(self.pool.isRunning())
+        self.assertFalse(self.pool.quit())
+        with self.assertRaises(RuntimeError):
+            self.pool.play(chess.Board(), chess.engine.Limit(depth=1))
+
+        self.assertTrue(self.pool.start())
+        self.assertTrue(self.pool.isRunning())
+        self.assertFalse(self.pool.start())
+        self.assertEqual(len(self.pool._engines), self.pool.size())
+
+        self.assertTrue(self.pool.quit())
+        self.assertFalse(self.pool.isRunning())
+
+    def testPlayAndAnalyse(self):
+        self.pool.start()
+
+        boards = [chess.Board(), chess.Board("4k3/8/8/8/8/8/8/4K2R w K - 0 1")] * 3
+        futures = [self.pool.play(board, chess.engine.Limit(time=1)) for board in boards]
+        for board, future in zip(boards, futures):
+            self.assertEqual(future.result(timeout=10).move, min(board.legal_moves, key=chess.Move.uci))
+        self.assertEqual(len(self.pool._engines), 2)
+
+        infos = self.pool.analyse(chess.Board(), chess.engine.Limit(depth=2), multipv=2).result(timeout=10)
+        self.assertEqual(len(infos), 2)
+        self.assertEqual(infos[0]["pv"][0], chess.Move.from_uci("a2a3"))
+
+    def testRestartsTerminatedEngines(self):
+        self.pool.start()
+
+        for transport, engine in self.pool._engines:
+            transport.kill()
+        self.assertTrue(waitUntil(lambda: all(engine.returncode.done() for _, engine in self.pool._engines)))
+
+        result = self.pool.play(chess.Board(), chess.engine.Limit(depth=1)).result(timeout=10)
+        self.assertEqual(result.move, chess.Move.from_uci("a2a3"))
+        self.assertGreaterEqual(self.pool.restarts, 1)
+
+    def testEngineWrapper(self):
+        self.pool.start()
+
+        engineWrapper = hichess.EngineWrapper(pool=self.pool)
+        self.assertFalse(engineWrapper.null())
+        self.assertFalse(engineWrapper.start(ENGINE))
+        self.assertEqual(engineWrapper.playMove(chess.Board(), chess.engine.Limit(depth=1)).move,
+                         chess.Move.from_uci("a2a3"))
+
+        asyncWrapper = hichess.EngineWrapper(asynchronous=True, pool=self.pool)
+        future = asyncWrapper.playMove(chess.Board(), chess.engine.Limit(depth=1))
+        self.assertEqual(future.result(timeout=10).move, chess.Move.from_uci("a2a3"))
+
+        self.assertTrue(engineWrapper.quit())
+        self.assertTrue(engineWrapper.null())
+        self.assertTrue(self.pool.isRunning())
+
+
+
+class LazyImportTestCase(unittest.TestCase):
+    def loadedModules(self, statement):
+        # the modules loaded in a new interpreter after importing hichess and executing statement
+        root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+        code = (f"import sys; sys.path.insert(0, {root!r}); import hichess; {statement}; "
+                "print(' '.join(sys.modules))")
+        return set(subprocess.run([sys.executable, "-c", code], check=True, capture_output=True,
+                                  text=True).stdout.split())
+
+    def testImport(self):
+        modules = self.loadedModules("hichess.__version__")
+        self.assertNotIn("hichess.hichess", modules)
+        self.assertNotIn("PySide2.QtCore", modules)
+        self.assertNotIn("chess", modules)
+
+        modules = self.loadedModules("hichess.BoardModel().push(hichess.BoardModel().board.parse_san('e4'))")
+        self.assertIn("hichess.boardmodel", modules)
+        self.assertNotIn("PySide2.QtCore", modules)
+        self.assertNotIn("chess.engine", modules)
+
+        # probing unknown names, e.g. by introspection tools, doesn't import anything
+        modules = self.loadedModules("hasattr(hichess, '__wrapped__'); hasattr(hichess, 'QtWidgets')")
+        self.assertNotIn("hichess.hichess", modules)
+        self.assertNotIn("PySide2.QtCore", modules)
+
+        modules = self.loadedModules("hichess.callback.Callback().emit()")
+        self.assertIn("hichess.callback", modules)
+        self.assertNotIn("chess", modules)
+
+        modules = self.loadedModules("hichess.EngineWrapper")
+        self.assertIn("hichess.engine", modules)
+        self.assertNotIn("PySide2.QtWidgets", modules)
+        self.assertNotIn("PySide2.QtGui", modules)
+
+    def testPublicNames(self):
+        for name in hichess.__all__:
+            self.assertIs(getattr(hichess, name), getattr(hichess.hichess, name))
+        self.assertIs(hichess.engine.EngineWrapper, hichess.EngineWrapper)
+        self.assertIs(hichess.callback.Callback, hichess.Callback)
+        self.assertIs(hichess.native, hichess.hichess.native)
+        self.assertIn("BoardWidget", dir(hichess))
+        with self.assertRaises(AttributeError):
+            hichess.notAName
+
 if __name__ == "__main__":
     app = QApplication(sys.argv)
     unittest.main()